@@ -0,0 +1,93 @@
+"""
+Benchmark of the browsers with Xvfb (the default) and with the headless mode of Firefox (--headless): for every mode it
+starts BrowserMob and a number of workers, loads a page several times in every worker and measures
+
+    startup_seconds   time to start the display, BrowserMob and all the workers
+    page_seconds      median time of a page load, new HarFile and reset of the worker included
+    rss_bytes         resident memory of the browsers (geckodriver and Firefox processes), Xvfb and BrowserMob
+
+It needs BrowserMob, geckodriver, Firefox and, for the default mode, Xvfb.
+
+    python benchmarks/bench_headless.py --workers 4 --pages 20 --url https://www.example.com/
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_size_check.browser import BrowserWorker, start_server_display  # noqa: E402
+from page_size_check.procinfo import tree_rss  # noqa: E402
+
+
+def bench_mode(headless, args):
+    start = time.perf_counter()
+    display, server = start_server_display(args.browsermob_server_path, args.browsermob_server_port,
+                                           headless=headless)
+    workers = []
+    try:
+        for _ in range(args.workers):
+            workers.append(BrowserWorker(server, args.firefox_driver_path, headless))
+        startup_seconds = time.perf_counter() - start
+
+        page_times = []
+        for _ in range(args.pages):
+            for worker in workers:
+                page_start = time.perf_counter()
+                worker.new_page()
+                worker.driver.get(args.url)
+                worker.proxy.har
+                worker.reset()
+                page_times.append(time.perf_counter() - page_start)
+
+        browsers_rss = tree_rss(*[worker.driver.service.process.pid for worker in workers])
+        display_rss = tree_rss(display.proc.pid) if display else 0
+        server_rss = tree_rss(server.process.pid)
+    finally:
+        for worker in workers:
+            worker.quit()
+        server.stop()
+        if display:
+            display.stop()
+    return {
+        'mode': 'headless' if headless else 'xvfb',
+        'workers': args.workers,
+        'startup_seconds': round(startup_seconds, 3),
+        'page_seconds': round(statistics.median(page_times), 4),
+        'rss_bytes': browsers_rss + display_rss + server_rss,
+        'browsers_rss_bytes': browsers_rss,
+        'display_rss_bytes': display_rss,
+        'browsermob_rss_bytes': server_rss,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--browsermob_server_path', default=os.environ.get(
+        'BROWSERMOB_SERVER_PATH', './browsermob-proxy-2.1.4/bin/browsermob-proxy'))
+    arg_parser.add_argument('--browsermob_server_port', type=int, default=8090)
+    arg_parser.add_argument('--firefox_driver_path', default=os.environ.get('FIREFOX_DRIVER_PATH', './geckodriver'))
+    arg_parser.add_argument('--workers', type=int, default=4, help='Number of browsers.')
+    arg_parser.add_argument('--pages', type=int, default=10, help='Page loads of every browser.')
+    arg_parser.add_argument('--url', default='about:blank', help='Page loaded by the browsers.')
+    arg_parser.add_argument('--mode', nargs='+', default=['xvfb', 'headless'], choices=['xvfb', 'headless'])
+    arg_parser.add_argument('--output', help='JSON file for the results. Printed to stdout if not given.')
+    args = arg_parser.parse_args()
+
+    results = []
+    for mode in args.mode:
+        results.append(bench_mode(mode == 'headless', args))
+        print("{mode:<9} workers={workers:<3} startup={startup_seconds:>7.3f} s page={page_seconds:>7.4f} s "
+              "rss={rss_bytes} bytes".format(**results[-1]), file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Micro-benchmark of the conversion of the HarFile startedDateTime values, comparing the strptime based conversion
+used before with iso_to_epoch_ms on HarFiles of 10k entries.
+
+    python benchmarks/bench_timestamps.py [--entries 10000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import isoformat_ms  # noqa: E402
+from page_size_check.parser import iso_to_epoch_ms  # noqa: E402
+
+
+def generate_timestamps(num_entries, seed=0):
+    """
+    startedDateTime values of a page load: a few seconds of requests with a +02:00 offset
+    """
+    rng = random.Random(seed)
+    start = datetime(2018, 10, 18, 17, 16, 16, tzinfo=timezone(timedelta(hours=2)))
+    return [isoformat_ms(start + timedelta(milliseconds=rng.randint(0, 30000))) for _ in range(num_entries)]
+
+
+def strptime_conversion(timestamps):
+    return [datetime.strptime(value.rsplit("+", 1)[0], "%Y-%m-%dT%H:%M:%S.%f") for value in timestamps]
+
+
+def iso_conversion(timestamps):
+    return [iso_to_epoch_ms(value) for value in timestamps]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--entries', type=int, default=10000)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    timestamps = generate_timestamps(args.entries)
+    results = {}
+    for name, conversion in (('strptime', strptime_conversion), ('iso_to_epoch_ms', iso_conversion)):
+        results[name] = min(timeit.repeat(lambda: conversion(timestamps), number=1, repeat=args.repeat))
+        print("{:<16} {:>8.2f} ms per {} entries".format(name, results[name] * 1000, args.entries))
+    print("speedup          {:>8.1f}x".format(results['strptime'] / results['iso_to_epoch_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Benchmarks of the parser and of the reports on synthetic HarFiles: for every combination of pages, entries per page and
+mime mix it measures the wall time and the peak memory (tracemalloc) of
+
+    parse         HarFileParser.parse of every page
+    parse_stream  HarFileParser.parse_stream of every page, from the JSON text
+    aggregate     summary and mimetype rows, the summary totals and the percentiles of all the pages
+    report        writing the three CSV reports with CsvResultSink
+    dedup         indexing the resources of all the pages with ResourceIndex, where only --shared_ratio of the
+                  resources of a page are shared with the other pages
+
+Results are written as JSON. With --baseline, the results are compared with a previous execution and the exit code is
+1 if any benchmark got slower or used more memory than the threshold.
+
+    python benchmarks/run_benchmarks.py --pages 1 100 1000 --entries 50 200 --output bench.json
+    python benchmarks/run_benchmarks.py --pages 1 100 1000 --entries 50 200 --baseline bench.json
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import MIME_MIXES, generate_har, page_har  # noqa: E402
+from page_size_check import __version__  # noqa: E402
+from page_size_check.dedup import ResourceIndex  # noqa: E402
+from page_size_check.parser import HarFileParser, SummaryTotals  # noqa: E402
+from page_size_check.sink import CsvResultSink  # noqa: E402
+from page_size_check.stats import PageStatistics  # noqa: E402
+
+SITEMAP_URL = 'https://www.example.com/sitemap.xml'
+
+
+def bench_parse(context):
+    parser = HarFileParser()
+    context['results'] = [parser.parse(context['har'], 'https://www.example.com/{}/'.format(page), SITEMAP_URL)
+                          for page in range(context['pages'])]
+
+
+def bench_parse_stream(context):
+    parser = HarFileParser()
+    for page in range(context['pages']):
+        parser.parse_stream(io.StringIO(context['har_text']), 'https://www.example.com/{}/'.format(page), SITEMAP_URL)
+
+
+def bench_aggregate(context):
+    totals = SummaryTotals()
+    statistics = PageStatistics()
+    for result in context['results']:
+        totals.add(HarFileParser.summary_row(result))
+        statistics.add(result)
+        for _ in HarFileParser.mimetype_rows(result):
+            pass
+    totals.row()
+    statistics.rows()
+
+
+def bench_report(context):
+    with tempfile.TemporaryDirectory() as report_dir:
+        cwd = os.getcwd()
+        os.chdir(report_dir)
+        try:
+            sink = CsvResultSink()
+            for result in context['results']:
+                sink.add(result)
+            sink.close()
+        finally:
+            os.chdir(cwd)
+
+
+def page_results(context):
+    """
+    Parsed pages with their own urls for the resources that are not shared, so the index sees new resources too
+    """
+    parser = HarFileParser()
+    results = []
+    for page in range(context['pages']):
+        page_url = 'https://www.example.com/{}/'.format(page)
+        har = page_har(context['har'], page_url, context['shared_ratio'], context['seed'])
+        results.append(parser.parse(har, page_url, SITEMAP_URL))
+    return results
+
+
+def bench_dedup(context):
+    index = ResourceIndex()
+    for result in context['page_results']:
+        index.add(result)
+    index.summary_row()
+
+
+BENCHMARKS = [
+    ('parse', bench_parse),
+    ('parse_stream', bench_parse_stream),
+    ('aggregate', bench_aggregate),
+    ('report', bench_report),
+    ('dedup', bench_dedup),
+]
+
+
+def measure(function, context, memory):
+    """
+    Wall time of the function and, if memory is true, its peak of allocated memory measured in a second run (tracing
+    allocations slows the code down)
+
+    :return tuple: seconds, peak memory in bytes or None
+    """
+    gc.collect()
+    start = time.perf_counter()
+    function(context)
+    seconds = time.perf_counter() - start
+    if not memory:
+        return seconds, None
+    gc.collect()
+    tracemalloc.start()
+    function(context)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def run_scenario(pages, entries, mime_mix, seed, memory, selected, shared_ratio=1.0):
+    har = generate_har(entries, mime_mix, seed)
+    context = {'pages': pages, 'har': har, 'har_text': json.dumps(har), 'seed': seed, 'shared_ratio': shared_ratio}
+    if 'dedup' in selected:
+        context['page_results'] = page_results(context)
+    results = []
+    for name, function in BENCHMARKS:
+        if name not in selected and name != 'parse':  # parse builds the results used by the other benchmarks
+            continue
+        seconds, peak = measure(function, context, memory)
+        if name not in selected:
+            continue
+        results.append({
+            'benchmark': name, 'pages': pages, 'entries': entries, 'mime_mix': mime_mix, 'seed': seed,
+            'shared_ratio': shared_ratio,
+            'seconds': round(seconds, 6), 'ms_per_page': round(seconds * 1000 / pages, 4),
+            'peak_memory_bytes': peak,
+        })
+        print("{benchmark:<13} pages={pages:<7} entries={entries:<5} mix={mime_mix:<8} {seconds:>10.4f} s "
+              "{ms_per_page:>9.4f} ms/page peak={peak_memory_bytes}".format(**results[-1]), file=sys.stderr)
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Compare the results with a baseline, printing the regressions
+
+    :return bool: True if there is any regression
+    """
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    def key(result):
+        return (result['benchmark'], result['pages'], result['entries'], result['mime_mix'], result['seed'],
+                result.get('shared_ratio', 1.0))
+
+    baseline_results = {key(result): result for result in baseline['results']}
+    regressions = False
+    for result in results:
+        previous = baseline_results.get(key(result))
+        if previous is None:
+            continue
+        for metric in ('seconds', 'peak_memory_bytes'):
+            if not result[metric] or not previous[metric]:
+                continue
+            ratio = result[metric] / previous[metric]
+            if ratio > 1 + threshold:
+                regressions = True
+                print("REGRESSION {} {}: {} -> {} ({:+.1%})".format(
+                    '/'.join(str(part) for part in key(result)), metric, previous[metric], result[metric],
+                    ratio - 1), file=sys.stderr)
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--pages', type=int, nargs='+', default=[1, 100, 1000],
+                            help='Number of pages of every scenario (up to 100000).')
+    arg_parser.add_argument('--entries', type=int, nargs='+', default=[50, 200], help='Entries per page.')
+    arg_parser.add_argument('--mime_mix', nargs='+', default=['typical'], choices=sorted(MIME_MIXES))
+    arg_parser.add_argument('--benchmark', nargs='+', default=[name for name, _ in BENCHMARKS],
+                            choices=[name for name, _ in BENCHMARKS])
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--shared_ratio', type=float, default=0.5,
+                            help='Fraction of the resources of a page shared with the other pages in dedup.')
+    arg_parser.add_argument('--no_memory', action='store_true', help='Do not measure the peak memory.')
+    arg_parser.add_argument('--output', help='JSON file for the results. Printed to stdout if not given.')
+    arg_parser.add_argument('--baseline', help='JSON file of a previous execution to compare with.')
+    arg_parser.add_argument('--threshold', type=float, default=0.2, help='Allowed regression ratio.')
+    args = arg_parser.parse_args()
+
+    results = []
+    for mime_mix in args.mime_mix:
+        for entries in args.entries:
+            for pages in args.pages:
+                results.extend(run_scenario(pages, entries, mime_mix, args.seed, not args.no_memory,
+                                            args.benchmark, args.shared_ratio))
+    document = {
+        'metadata': {'version': __version__, 'python': platform.python_version(),
+                     'implementation': platform.python_implementation(), 'machine': platform.machine(),
+                     'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(document, output_file, indent=2)
+    else:
+        print(json.dumps(document, indent=2))
+    if args.baseline and compare(results, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Seeded generator of synthetic HarFiles with the structure written by BrowserMob, used by the benchmarks
+"""
+import random
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+# Weights of the mime types of the resources (the first entry is always the text/html document)
+MIME_MIXES = {
+    'typical': {'text/html': 2, 'text/css': 8, 'application/javascript': 20, 'image/png': 15, 'image/jpeg': 20,
+                'image/svg+xml': 5, 'font/woff2': 5, 'application/json': 10, 'text/plain': 5},
+    'images': {'text/html': 1, 'text/css': 2, 'application/javascript': 5, 'image/png': 30, 'image/jpeg': 50,
+               'image/webp': 12},
+    'scripts': {'text/html': 1, 'text/css': 4, 'application/javascript': 70, 'application/json': 20,
+                'image/png': 5},
+}
+# Median body size in bytes of every mime type
+MEDIAN_SIZES = {
+    'text/html': 30000, 'text/css': 15000, 'application/javascript': 40000, 'image/png': 20000,
+    'image/jpeg': 60000, 'image/webp': 30000, 'image/svg+xml': 3000, 'font/woff2': 25000,
+    'application/json': 2000, 'text/plain': 500,
+}
+PAGE_START = datetime(2018, 10, 18, 17, 16, 16, tzinfo=timezone(timedelta(hours=2)))
+
+
+def isoformat_ms(value):
+    """
+    ISO 8601 format with milliseconds of an aware datetime, 2018-10-18T17:16:16.123+02:00 (isoformat(timespec) is
+    not available before Python 3.6)
+    """
+    offset = value.strftime('%z')
+    return '{}.{:03d}{}:{}'.format(value.strftime('%Y-%m-%dT%H:%M:%S'), value.microsecond // 1000, offset[:3],
+                                   offset[3:])
+
+
+def _started_date_time(offset_ms):
+    return isoformat_ms(PAGE_START + timedelta(milliseconds=offset_ms))
+
+
+def weighted_choice(rng, population, cum_weights):
+    """
+    Item of the population picked with the cumulative weights, as rng.choices (not available before Python 3.6)
+    """
+    return population[bisect(cum_weights, rng.random() * cum_weights[-1], 0, len(population) - 1)]
+
+
+def generate_entry(rng, page_url, mime_type, offset_ms, index, body_text_size=0):
+    """
+    Entry of a HarFile for a resource of the page
+    """
+    body_size = int(rng.lognormvariate(0, 0.8) * MEDIAN_SIZES.get(mime_type, 10000))
+    time = rng.randint(1, 800)
+    content = {'mimeType': '{}; charset=utf-8'.format(mime_type), 'size': body_size, 'comment': ''}
+    if body_text_size:
+        content['text'] = 'x' * body_text_size
+    url = page_url if index == 0 else '{}static/{}/{}'.format(page_url, mime_type.split('/')[1], index)
+    return {
+        'pageref': 'Page 0',
+        'startedDateTime': _started_date_time(offset_ms),
+        'request': {'method': 'GET', 'url': url, 'httpVersion': 'HTTP/1.1', 'cookies': [], 'headers': [],
+                    'queryString': [], 'headersSize': rng.randint(300, 700), 'bodySize': 0, 'comment': ''},
+        'response': {'status': 200 if rng.random() > 0.02 else 404, 'statusText': 'OK', 'httpVersion': 'HTTP/1.1',
+                     'cookies': [], 'headers': [{'name': 'Content-Type', 'value': mime_type}],
+                     'content': content, 'redirectURL': '', 'headersSize': rng.randint(150, 450),
+                     'bodySize': body_size, 'comment': ''},
+        'cache': {},
+        'timings': {'blocked': -1, 'dns': -1, 'connect': -1, 'ssl': -1, 'send': 0, 'wait': time - 1, 'receive': 1,
+                    'comment': ''},
+        'serverIPAddress': '127.0.0.1',
+        'time': time,
+        'comment': '',
+    }
+
+
+def generate_har(num_entries, mime_mix='typical', seed=0, page_url='https://www.example.com/',
+                 body_text_size=0):
+    """
+    Generate a synthetic HarFile
+
+    :param int num_entries: number of resources of the page
+    :param str mime_mix: key of MIME_MIXES
+    :param int seed: seed of the random generator, the same seed gives the same HarFile
+    :param str page_url: url of the page, ending with /
+    :param int body_text_size: characters of the response bodies embedded in content.text, 0 to leave them out
+    :return dict:
+    """
+    rng = random.Random(seed)
+    mime_types, weights = zip(*sorted(MIME_MIXES[mime_mix].items()))
+    cum_weights = list(accumulate(weights))
+    entries = []
+    offset_ms = 0
+    for index in range(num_entries):
+        mime_type = 'text/html' if index == 0 else weighted_choice(rng, mime_types, cum_weights)
+        entries.append(generate_entry(rng, page_url, mime_type, offset_ms, index, body_text_size))
+        offset_ms += rng.randint(0, 40)
+    return {'log': {
+        'version': '1.2',
+        'creator': {'name': 'BrowserMob Proxy', 'version': '2.1.4', 'comment': ''},
+        'pages': [{'id': 'Page 0', 'title': 'Page 0', 'startedDateTime': _started_date_time(0),
+                   'pageTimings': {'comment': ''}, 'comment': ''}],
+        'entries': entries,
+        'comment': '',
+    }}
+
+
+def page_har(har, page_url, shared_ratio=1.0, seed=0):
+    """
+    HarFile of another page of the same site, from a HarFile made by generate_har: the document and the resources
+    that are not shared between pages are moved under the url of the page. The same resources are shared in every
+    page made with the same seed.
+
+    :param dict har: HarFile made by generate_har
+    :param str page_url: url of the page, ending with /
+    :param float shared_ratio: fraction of the resources shared with the other pages, 1 shares every resource
+    :param int seed: seed of the choice of the shared resources
+    :return dict: copy of the HarFile that shares everything but the urls with it
+    """
+    rng = random.Random(seed)
+    entries = har['log']['entries']
+    har_page_url = entries[0]['request']['url']
+    page_entries = []
+    for index, entry in enumerate(entries):
+        shared = rng.random() < shared_ratio and index > 0
+        url = entry['request']['url']
+        if not shared and url.startswith(har_page_url):
+            entry = dict(entry, request=dict(entry['request'], url=page_url + url[len(har_page_url):]))
+        page_entries.append(entry)
+    return {'log': dict(har['log'], entries=page_entries)}
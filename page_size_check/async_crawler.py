@@ -0,0 +1,679 @@
+import asyncio
+import json
+import logging
+import socket
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from page_size_check.autoscale import max_threads, start_controller
+from page_size_check.async_http import AsyncHttpClient, HttpError
+from page_size_check.browser import NO_CACHE_PREFERENCES, recycle_reason, start_server_display
+from page_size_check.cache import PageCache, get_document_validators
+from page_size_check.metrics import get_metrics
+from page_size_check.parser import PAGE_TIMING_SCRIPT, HarFileParser
+from page_size_check.procinfo import kill_tree, tree_rss
+from page_size_check.resource_timing import PAGE_RESOURCE_TIMING_SCRIPT, resource_timing_har
+from page_size_check.retry import RetryPolicy, describe_error, report_failure
+from page_size_check.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Default seconds to wait for a page before giving up on it, and seconds for geckodriver to accept connections
+PAGE_TIMEOUT = 120
+DRIVER_START_TIMEOUT = 30
+# Threads that parse the HarFiles, read the sitemap and write the reports: the browsers do not need any
+EXECUTOR_THREADS = 4
+CLEAR_STORAGE_SCRIPT = 'window.localStorage.clear(); window.sessionStorage.clear();'
+
+
+def free_port():
+    """
+    :return int: a TCP port that is free right now
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class WebDriverError(Exception):
+    """
+    Error returned by geckodriver, with the WebDriver error code (timeout, no such window...)
+    """
+
+    def __init__(self, error, message):
+        super().__init__("{}: {}".format(error, message))
+        self.error = error
+
+
+class BrowserMobClient:
+    """
+    Async client of the REST API of a BrowserMob server
+    """
+
+    def __init__(self, http):
+        """
+        :param AsyncHttpClient http: client connected to the BrowserMob server
+        """
+        self.http = http
+
+    async def create_proxy(self):
+        """
+        :return int: port of the new proxy
+        """
+        return (await self.http.request_json('POST', '/proxy'))['port']
+
+    async def new_har(self, port, capture_headers=False):
+        """
+        Start a new HarFile on the proxy
+
+        :param int port: port of the proxy
+        :param bool capture_headers: If true the headers are recorded in the HarFile
+        :return bytes: the previous HarFile as JSON, None if there was none
+        """
+        form = {'captureHeaders': 'true'} if capture_headers else {}
+        path = '/proxy/{}/har'.format(port)
+        status, body = await self.http.request('PUT', path, form=form)
+        if status >= 400:
+            raise HttpError('PUT', path, status, body.decode('utf-8', 'replace'))
+        return body if status == 200 and body else None
+
+    async def close_proxy(self, port):
+        await self.http.request('DELETE', '/proxy/{}'.format(port))
+
+
+class AsyncWebDriver:
+    """
+    Firefox session driven with the WebDriver protocol through its own geckodriver process
+    """
+
+    def __init__(self, firefox_driver_path, proxy_address, headless=False):
+        """
+        :param str firefox_driver_path: path of geckodriver
+        :param str proxy_address: host:port of the proxy of the browser, None to load the pages without proxy
+        :param bool headless: If true Firefox runs in its headless mode, without any display
+        """
+        self.firefox_driver_path = firefox_driver_path
+        self.proxy_address = proxy_address
+        self.headless = headless
+        self.process = None
+        self.http = None
+        self.session_id = None
+
+    def capabilities(self):
+        capabilities = {
+            'browserName': 'firefox',
+            'acceptInsecureCerts': True,
+            'moz:firefoxOptions': {'prefs': NO_CACHE_PREFERENCES, 'args': ['-headless'] if self.headless else []},
+        }
+        if self.proxy_address:
+            capabilities['proxy'] = {'proxyType': 'manual', 'httpProxy': self.proxy_address,
+                                     'sslProxy': self.proxy_address}
+        return capabilities
+
+    async def start(self):
+        port = free_port()
+        self.process = await asyncio.create_subprocess_exec(
+            self.firefox_driver_path, '--port', str(port), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.http = AsyncHttpClient('127.0.0.1', port, max_connections=2)
+        await self._wait_ready(port)
+        value = await self._command('POST', '/session', {'capabilities': {'alwaysMatch': self.capabilities()}})
+        self.session_id = value['sessionId']
+
+    async def _wait_ready(self, port):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + DRIVER_START_TIMEOUT
+        while True:
+            try:
+                writer = (await asyncio.open_connection('127.0.0.1', port))[1]
+                writer.close()
+                return
+            except OSError:
+                if self.process.returncode is not None or loop.time() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+    async def _command(self, method, path, body=None, timeout=None):
+        """
+        Send a WebDriver command
+
+        :return: value of the response
+        :raises WebDriverError:
+        """
+        if body is None and method == 'POST':
+            body = {}
+        try:
+            response = await self.http.request_json(method, path, body, timeout=timeout)
+        except HttpError as ex:
+            try:
+                value = json.loads(ex.body)['value']
+            except (ValueError, KeyError, TypeError):
+                raise ex
+            raise WebDriverError(value.get('error'), value.get('message'))
+        return response['value'] if response else None
+
+    def _session_path(self, command):
+        return '/session/{}/{}'.format(self.session_id, command)
+
+    async def set_page_load_timeout(self, seconds):
+        await self._command('POST', self._session_path('timeouts'), {'pageLoad': int(seconds * 1000)})
+
+    async def get(self, url, timeout=None):
+        """
+        Load a page, waiting for its load event
+        """
+        await self._command('POST', self._session_path('url'), {'url': url}, timeout=timeout)
+
+    async def execute_script(self, script):
+        return await self._command('POST', self._session_path('execute/sync'), {'script': script, 'args': []})
+
+    async def execute_async_script(self, script):
+        """
+        Run a script that calls its last argument with the result
+        """
+        return await self._command('POST', self._session_path('execute/async'), {'script': script, 'args': []})
+
+    async def delete_all_cookies(self):
+        await self._command('DELETE', self._session_path('cookie'))
+
+    def kill(self):
+        """
+        Kill geckodriver and Firefox of a hung session, the session is not closed
+        """
+        if self.process and self.process.returncode is None:
+            kill_tree(self.process.pid)
+
+    async def quit(self):
+        """
+        Close the session and stop geckodriver
+        """
+        try:
+            if self.session_id:
+                await self._command('DELETE', '/session/{}'.format(self.session_id))
+        finally:
+            if self.http:
+                self.http.close()
+            if self.process and self.process.returncode is None:
+                self.process.terminate()
+                await self.process.wait()
+
+
+class AsyncBrowserWorker:
+    """
+    Long-lived pair of BrowserMob proxy and Firefox session that loads one page after another, the counterpart of
+    BrowserWorker for the asyncio engine. Without BrowserMob, the pages are captured with the Resource Timing API.
+    """
+
+    def __init__(self, browsermob, firefox_driver_path, capture_headers=False, headless=False,
+                 page_timeout=PAGE_TIMEOUT):
+        """
+        :param BrowserMobClient browsermob: None to capture the pages without proxy
+        :param str firefox_driver_path: path of geckodriver
+        :param bool capture_headers: If true the headers are recorded in the HarFiles
+        :param bool headless: If true Firefox runs in its headless mode
+        :param float page_timeout: seconds Firefox waits for a page
+        """
+        self.browsermob = browsermob
+        self.firefox_driver_path = firefox_driver_path
+        self.capture_headers = capture_headers
+        self.headless = headless
+        self.page_timeout = page_timeout
+        self.proxy_port = None
+        self.driver = None
+        self.pages = 0
+        self.busy_since = None
+        self.resource_timing = None
+
+    async def start(self):
+        proxy_address = None
+        if self.browsermob:
+            with span('proxy_create'):
+                self.proxy_port = await self.browsermob.create_proxy()
+            proxy_address = 'localhost:{}'.format(self.proxy_port)
+        self.driver = AsyncWebDriver(self.firefox_driver_path, proxy_address, self.headless)
+        with span('firefox_start'):
+            await self.driver.start()
+        await self.driver.set_page_load_timeout(self.page_timeout)
+
+    def rss(self):
+        """
+        Resident memory of geckodriver and Firefox
+
+        :return int: bytes
+        """
+        return tree_rss(self.driver.process.pid) if self.driver and self.driver.process else 0
+
+    async def new_page(self):
+        """
+        Start a fresh HarFile before loading the next page, dropping the requests made while the browser was idle
+        """
+        if self.browsermob:
+            await self.browsermob.new_har(self.proxy_port, self.capture_headers)
+        self.pages += 1
+
+    async def page_timings(self):
+        """
+        Navigation and paint timings of the page just loaded. Without proxy, its resources are read from the Resource
+        Timing API in the same call and kept for `take_har`.
+
+        :return dict: ms by field of PAGE_TIMING_FIELDS
+        """
+        if self.browsermob:
+            return await self.driver.execute_async_script(PAGE_TIMING_SCRIPT)
+        timings = await self.driver.execute_async_script(PAGE_RESOURCE_TIMING_SCRIPT)
+        self.resource_timing = timings.pop('resource_timing')
+        return timings
+
+    async def take_har(self):
+        """
+        HarFile of the page just loaded. It is taken by starting the next HarFile, which returns the current one, so
+        it is transferred once. Without proxy, it is built from the Resource Timing API read by `page_timings`.
+
+        :return: the HarFile as JSON (bytes) or, without proxy, as dict
+        """
+        if not self.browsermob:
+            return resource_timing_har(self.resource_timing)
+        return await self.browsermob.new_har(self.proxy_port, self.capture_headers)
+
+    async def reset(self):
+        """
+        Clear the browser state left by the last page so it does not leak into the next one
+        """
+        with span('reset'):
+            try:
+                await self.driver.execute_script(CLEAR_STORAGE_SCRIPT)
+            except WebDriverError:  # Pages without storage access (about:blank, sandboxed frames...)
+                pass
+            await self.driver.delete_all_cookies()
+            await self.driver.get('about:blank')
+
+    async def quit(self):
+        """
+        Close the session and the proxy, logging instead of raising so a broken worker can always be discarded
+        """
+        for phase, close in (('driver_quit', self.driver.quit if self.driver else None),
+                             ('proxy_close', self._close_proxy)):
+            if close is None:
+                continue
+            try:
+                with span(phase):
+                    await close()
+            except Exception as ex:
+                logger.warning("Error closing worker: {}".format(ex))
+
+    async def _close_proxy(self):
+        if self.proxy_port is not None:
+            await self.browsermob.close_proxy(self.proxy_port)
+
+
+class AsyncBrowserPool:
+    """
+    Pool of AsyncBrowserWorker, started lazily up to `size` workers and shared by the pages of the event loop. Like
+    BrowserPool, it can be resized while in use, keeps the seconds every worker spent on its last pages and restarts
+    the workers after `recycle_pages` pages or when their browser uses more than `max_rss` bytes.
+    """
+
+    worker_class = AsyncBrowserWorker
+
+    def __init__(self, browsermob, firefox_driver_path, size, capture_headers=False, headless=False,
+                 page_timeout=PAGE_TIMEOUT, recycle_pages=None, max_rss=None):
+        self.browsermob = browsermob
+        self.firefox_driver_path = firefox_driver_path
+        self.size = size
+        self.capture_headers = capture_headers
+        self.headless = headless
+        self.page_timeout = page_timeout
+        self.recycle_pages = recycle_pages
+        self.max_rss = max_rss
+        self.recycled = 0
+        self.restart_seconds = 0.0
+        self.latencies = deque(maxlen=1000)
+        self._idle = asyncio.Queue()
+        self._workers = set()
+        self._started = 0
+
+    async def _start_worker(self):
+        """
+        Start a new worker if the pool is not full yet. Several workers boot at the same time while others wait.
+
+        :return AsyncBrowserWorker: the new worker or None when the pool is full
+        """
+        if self._started >= self.size:
+            return None
+        self._started += 1
+        worker = self.worker_class(self.browsermob, self.firefox_driver_path, self.capture_headers, self.headless,
+                                   self.page_timeout)
+        try:
+            await worker.start()
+        except BaseException:
+            self._started -= 1
+            await worker.quit()
+            raise
+        self._workers.add(worker)
+        return worker
+
+    async def acquire(self):
+        """
+        Get an idle worker, starting a new one if there is room in the pool, or wait for one to be released.
+        A None in the idle queue means a discarded worker freed its slot.
+
+        :return AsyncBrowserWorker:
+        """
+        while True:
+            if not self._idle.empty():
+                worker = self._idle.get_nowait()
+            else:
+                worker = await self._start_worker() or await self._idle.get()
+            if worker is not None:
+                worker.busy_since = time.monotonic()
+                return worker
+
+    async def release(self, worker):
+        """
+        Give back a healthy worker to the pool, or close it if the pool was shrunk while it was in use
+        """
+        self.latencies.append(time.monotonic() - worker.busy_since)
+        if self._started > self.size:
+            await self.discard(worker)
+            return
+        reason = recycle_reason(worker, self.recycle_pages, self.max_rss)
+        if reason:
+            await self.recycle(worker, reason)
+            return
+        try:
+            await worker.reset()
+        except Exception as ex:
+            logger.warning("Error resetting worker, discarding it: {}".format(ex))
+            await self.discard(worker)
+            return
+        worker.busy_since = None
+        self._idle.put_nowait(worker)
+
+    async def discard(self, worker):
+        """
+        Close a broken worker and free its slot so a new one is started on demand
+        """
+        worker.busy_since = None
+        await worker.quit()
+        self._workers.discard(worker)
+        self._started -= 1
+        self._idle.put_nowait(None)
+
+    async def recycle(self, worker, reason):
+        """
+        Replace a worker with a new one in the same slot, logging what the restart cost
+        """
+        start = time.monotonic()
+        worker.busy_since = None
+        await worker.quit()
+        self._workers.discard(worker)
+        new_worker = self.worker_class(self.browsermob, self.firefox_driver_path, self.capture_headers, self.headless,
+                                       self.page_timeout)
+        try:
+            await new_worker.start()
+        except Exception as ex:
+            logger.warning("Error restarting worker: {}".format(ex))
+            await new_worker.quit()
+            self._started -= 1
+            self._idle.put_nowait(None)
+            return
+        seconds = time.monotonic() - start
+        self._workers.add(new_worker)
+        self.recycled += 1
+        self.restart_seconds += seconds
+        logger.info("Worker recycled after {} pages ({}), restart took {:.1f} s".format(worker.pages, reason, seconds))
+        self._idle.put_nowait(new_worker)
+
+    def busy(self):
+        """
+        :return int: number of workers lent right now, it can be read from other threads
+        """
+        return sum(1 for worker in list(self._workers) if worker.busy_since is not None)
+
+    def resize(self, size):
+        """
+        Change the maximum number of workers. The idle workers above it are closed in the background and the busy
+        ones when they are released; the pages waiting for a worker are woken up when the pool grows.
+
+        :param int size:
+        """
+        grown, self.size = size - self.size, size
+        for _ in range(grown):
+            self._idle.put_nowait(None)
+        surplus = []
+        while self._started - len(surplus) > self.size and not self._idle.empty():
+            worker = self._idle.get_nowait()
+            if worker is not None:
+                surplus.append(worker)
+        for worker in surplus:
+            asyncio.ensure_future(self.discard(worker))
+
+    async def close(self):
+        """
+        Stop every worker of the pool
+        """
+        workers, self._workers = self._workers, set()
+        self._started = 0
+        await asyncio.gather(*(worker.quit() for worker in workers), return_exceptions=True)
+        if self.recycled:
+            logger.info("Workers recycled: {}, {:.1f} s restarting them".format(self.recycled, self.restart_seconds))
+
+
+class AsyncCrawler:
+    """
+    Scheduler of the asyncio engine: the pages are loaded concurrently from one event loop, with up to max_pending
+    pages in flight, while the blocking work (reading the sitemap, the cache, parsing and writing the reports) runs in
+    a small pool of threads. A page that fails is tried again as allowed by the retry policy.
+    """
+
+    def __init__(self, sink, pool, executor, cache=None, max_pending=16, page_timeout=PAGE_TIMEOUT,
+                 retry_policy=None):
+        """
+        :param sink: Sink where the parsed data is written
+        :param AsyncBrowserPool pool:
+        :param executor: Executor of the blocking work
+        :param PageCache cache: cache of the pages parsed in previous executions, if any
+        :param int max_pending: maximum number of pages in flight
+        :param float page_timeout: seconds to wait for a page
+        :param RetryPolicy retry_policy: retries of the pages that fail, no retries if None
+        """
+        self.sink = sink
+        self.pool = pool
+        self.executor = executor
+        self.cache = cache
+        self.max_pending = max_pending
+        self.page_timeout = page_timeout
+        self.retry_policy = retry_policy or RetryPolicy(retries=0)
+
+    def _run_blocking(self, function, *args):
+        return asyncio.get_event_loop().run_in_executor(self.executor, function, *args)
+
+    async def crawl(self, url_infos):
+        """
+        Load and parse the pages of url_infos, consuming the urls as there is room for them. Cancelling the crawl
+        cancels the pages in flight.
+        """
+        iterator = iter(url_infos)
+        semaphore = asyncio.Semaphore(self.max_pending)
+        pending = set()
+        try:
+            while True:
+                await semaphore.acquire()
+                url_info = await self._run_blocking(next, iterator, None)
+                if url_info is None:
+                    break
+                task = asyncio.ensure_future(self.process(url_info))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                task.add_done_callback(lambda _: semaphore.release())
+            if pending:
+                await asyncio.wait(pending)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+
+    async def process(self, url_info):
+        """
+        Process a page: take it from the cache or load it, trying the browser again after an error as allowed by the
+        retry policy, and parse it and write it once, so a page is never added twice to the sink. Pages that fail are
+        reported to the sink.
+        """
+        page_url = url_info['page_url']
+        start = time.monotonic()
+        attempt = 0
+        with span('page', page_url):
+            try:
+                if await self.take_from_cache(url_info):
+                    return
+                while True:
+                    attempt += 1
+                    try:
+                        har, page_timings = await self.load(page_url)
+                        break
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as ex:
+                        delay = self.retry_policy.delay(attempt, time.monotonic() - start, ex)
+                        if delay is None:
+                            raise
+                        logger.warning("Error processing \"{}\" url ({}), retrying in {:.1f} s".format(
+                            page_url, describe_error(ex), delay))
+                        await asyncio.sleep(delay)
+                await self._run_blocking(self.store, url_info, har, page_timings)
+                logger.info("\"{}\" parsed!".format(page_url))
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                await self._run_blocking(report_failure, self.sink, url_info, max(attempt, 1), ex,
+                                         time.monotonic() - start)
+
+    async def take_from_cache(self, url_info):
+        """
+        Add the page to the sink from the cache if it did not change since it was cached
+
+        :return bool: True if the page was taken from the cache
+        """
+        if not self.cache:
+            return False
+        page_url = url_info['page_url']
+        with span('cache_validate', page_url):
+            cached_har_file_data = await self._run_blocking(self.cache.validate, page_url, url_info.get('lastmod'))
+        if cached_har_file_data is None:
+            return False
+        await self._run_blocking(self.sink.add, cached_har_file_data)
+        logger.info("\"{}\" not modified, taken from the cache".format(page_url))
+        return True
+
+    async def load(self, page_url):
+        """
+        Load a page in a worker of the pool, discarding the worker if anything fails
+
+        :return tuple: HarFile as JSON and page timings
+        """
+        with span('worker_wait', page_url):
+            worker = await self.pool.acquire()
+        try:
+            with span('new_har', page_url):
+                await worker.new_page()
+            logger.info("Processing \"{}\"".format(page_url))
+            # Firefox gives up on the page after page_timeout, past the margin geckodriver is hung and the worker is
+            # discarded, which kills it
+            with span('driver_get', page_url):
+                await worker.driver.get(page_url, timeout=self.page_timeout + 10)
+            with span('page_timings', page_url):
+                page_timings = await worker.page_timings()
+            with span('har_fetch', page_url):
+                har = await worker.take_har()
+        except BaseException as ex:
+            if isinstance(ex, asyncio.TimeoutError) and worker.driver:
+                worker.driver.kill()  # geckodriver does not answer, it would not close the session either
+            await asyncio.shield(self.pool.discard(worker))
+            raise
+        await self.pool.release(worker)
+        return har, page_timings
+
+    def store(self, url_info, har, page_timings):
+        """
+        Parse the HarFile and write it to the sink and the cache. Runs in the executor.
+        """
+        page_url = url_info['page_url']
+        with span('parse', page_url):
+            har_file = har if isinstance(har, dict) else json.loads(har.decode('utf-8'))
+            har_file_data = HarFileParser().parse(har_file, page_url, url_info['sitemap_url'])
+            har_file_data.set_page_timings(page_timings)
+        with span('sink_add', page_url):
+            self.sink.add(har_file_data)
+        if self.cache:
+            with span('cache_put', page_url):
+                self.cache.put(har_file_data, url_info.get('lastmod'), *get_document_validators(har_file, page_url))
+
+
+async def _crawl(sink, url_infos, options, server, executor, cache):
+    threads = options['threads']
+    http = AsyncHttpClient(server.host, server.port, max_connections=max_threads(options)) if server else None
+    page_timeout = options.get('page_timeout') or PAGE_TIMEOUT
+    pool = AsyncBrowserPool(BrowserMobClient(http) if http else None, options['firefox_driver_path'], threads,
+                            capture_headers=bool(cache), headless=options.get('headless', False),
+                            page_timeout=page_timeout, recycle_pages=options.get('recycle_pages'),
+                            max_rss=(options.get('max_browser_rss') or 0) * 1024 * 1024)
+    retry_policy = RetryPolicy(options.get('retries', 0), options.get('retry_backoff', 2.0),
+                               options.get('page_deadline'))
+    crawler = AsyncCrawler(sink, pool, executor, cache, max_pending=max_threads(options) * 2,
+                           page_timeout=page_timeout, retry_policy=retry_policy)
+    loop = asyncio.get_event_loop()
+    controller = start_controller(pool, options, lambda size: loop.call_soon_threadsafe(pool.resize, size))
+    get_metrics().set_gauge('page_size_check_active_workers', 'Browsers loading a page.', pool.busy)
+    get_metrics().set_gauge('page_size_check_workers', 'Size of the pool of browsers.', lambda: pool.size)
+    try:
+        await crawler.crawl(url_infos)
+    finally:
+        if controller:
+            controller.stop()
+        await asyncio.shield(pool.close())
+        if http:
+            http.close()
+
+
+def crawl_async(sink, url_infos, options, proxy_port_range=None):
+    """
+    Method to crawl the pages like crawl, but with the asyncio engine: --threads is the number of browsers, all of
+    them driven from one event loop
+    :param sink: Sink where the parsed data is written
+    :param url_infos: Information of the urls to be analyzed
+    :param options: options of crawl
+    :param proxy_port_range: (first, last) ports of the proxies, BrowserMob default range if not given
+    :return:
+    """
+    display, server = start_server_display(options['browsermob_server_path'], options['browsermob_server_port'],
+                                           proxy_port_range, options.get('headless', False),
+                                           options.get('capture', 'har') == 'har')
+    cache = None
+    if options.get('cache_path'):
+        cache = PageCache(options['cache_path'], options['cache_max_size'] * 1024 * 1024,
+                          pool_size=max_threads(options))
+    executor = ThreadPoolExecutor(max_workers=EXECUTOR_THREADS)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    main = loop.create_task(_crawl(sink, url_infos, options, server, executor, cache))
+    try:
+        loop.run_until_complete(main)
+    except KeyboardInterrupt:
+        main.cancel()
+        try:
+            loop.run_until_complete(main)
+        except asyncio.CancelledError:
+            pass
+        raise
+    finally:
+        loop.close()
+        executor.shutdown()
+        if cache:
+            cache.close()
+        logger.info("Stopping BrowserMob server...")
+        if server:
+            server.stop()
+        if display:
+            display.stop()
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+REQUEST_HEAD = ('{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: keep-alive\r\n'
+                'Accept: application/json\r\nContent-Type: {content_type}\r\nContent-Length: {length}\r\n\r\n')
+
+
+class HttpError(Exception):
+    """
+    Error status returned by the server
+    """
+
+    def __init__(self, method, path, status, body):
+        super().__init__("{} {} returned {}: {}".format(method, path, status, body[:512]))
+        self.status = status
+        self.body = body
+
+
+class AsyncHttpClient:
+    """
+    Minimal asyncio HTTP/1.1 client for the local JSON APIs of BrowserMob and geckodriver. Connections are kept alive
+    and reused, up to max_connections at the same time; a request waits for a free connection when all are busy.
+    """
+
+    def __init__(self, host, port, max_connections=10, timeout=60):
+        """
+        :param str host:
+        :param int port:
+        :param int max_connections: maximum number of open connections
+        :param float timeout: default timeout in seconds of a request, connection included
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._idle = []
+
+    async def request(self, method, path, json_body=None, form=None, timeout=None):
+        """
+        Send a request and read the whole response
+
+        :param str method:
+        :param str path: path and query string
+        :param json_body: value sent as JSON
+        :param dict form: fields sent as application/x-www-form-urlencoded, if there is no json_body
+        :param float timeout: timeout in seconds, the timeout of the client if not given
+        :return tuple: status and body (bytes)
+        """
+        if json_body is not None:
+            body, content_type = json.dumps(json_body).encode('utf-8'), 'application/json; charset=utf-8'
+        else:
+            body, content_type = urlencode(form or {}).encode('ascii'), 'application/x-www-form-urlencoded'
+        head = REQUEST_HEAD.format(method=method, path=path, host=self.host, port=self.port,
+                                   content_type=content_type, length=len(body))
+        async with self._semaphore:
+            return await asyncio.wait_for(self._exchange(head.encode('latin-1') + body, method == 'HEAD'),
+                                          timeout or self.timeout)
+
+    async def request_json(self, method, path, json_body=None, form=None, timeout=None):
+        """
+        Send a request and decode its JSON response
+
+        :return: decoded body, None if the body is empty
+        :raises HttpError: if the status is 400 or more
+        """
+        status, body = await self.request(method, path, json_body, form, timeout)
+        if status >= 400:
+            raise HttpError(method, path, status, body.decode('utf-8', 'replace'))
+        return json.loads(body.decode('utf-8')) if body else None
+
+    async def _exchange(self, data, head_only):
+        """
+        Write the request on an idle connection, or on a new one, and read the response. A kept alive connection
+        closed by the server is detected on the status line and the request is sent again on a new connection.
+        """
+        while True:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await asyncio.open_connection(self.host, self.port)
+            try:
+                writer.write(data)
+                status, headers, body = await self._read_response(reader, head_only)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if headers.get('connection', '').lower() == 'close' or reader.at_eof():
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+            return status, body
+
+    async def _read_response(self, reader, head_only):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if head_only or status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            body = await self._read_chunked(reader)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            headers['connection'] = 'close'
+        return status, headers, body
+
+    @staticmethod
+    async def _read_chunked(reader):
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):  # trailers
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    def close(self):
+        """
+        Close the idle connections
+        """
+        while self._idle:
+            self._idle.pop()[1].close()
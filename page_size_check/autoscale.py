@@ -0,0 +1,128 @@
+import logging
+import statistics
+import threading
+
+from page_size_check.procinfo import cpu_times, memory_available
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyController:
+    """
+    Thread that resizes a browser pool between min_size and max_size. Every `interval` seconds it looks at the CPU
+    used by the host, the memory available and the median time of the pages finished since the last check, and
+
+    - shrinks the pool by a quarter when the CPU is saturated, the memory is running out or the pages got slower than
+      `latency_factor` times the best median seen, since the load times would be inflated by our own contention
+    - grows the pool by one browser when the CPU has room and the memory is not low
+    """
+
+    def __init__(self, pool, min_size, max_size, interval=10, cpu_high=0.9, cpu_low=0.7, min_memory=0.15,
+                 latency_factor=1.5, resize=None):
+        """
+        :param pool: BrowserPool or AsyncBrowserPool, with its `size` and `latencies`
+        :param int min_size: minimum number of browsers
+        :param int max_size: maximum number of browsers
+        :param float interval: seconds between checks
+        :param float cpu_high: fraction of CPU above which the pool shrinks
+        :param float cpu_low: fraction of CPU below which the pool may grow
+        :param float min_memory: fraction of memory available below which the pool shrinks
+        :param float latency_factor: how much slower than the best median the pages may get before the pool shrinks
+        :param resize: function called with the new size, pool.resize if not given (it must be thread-safe)
+        """
+        self.pool = pool
+        self.min_size = min_size
+        self.max_size = max_size
+        self.interval = interval
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.min_memory = min_memory
+        self.latency_factor = latency_factor
+        self.resize = resize or pool.resize
+        self.baseline = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def decide(self, size, cpu, memory, latency):
+        """
+        New size of the pool
+
+        :param int size: current size
+        :param float cpu: fraction of CPU used since the last check
+        :param float memory: fraction of memory available
+        :param float latency: median seconds of the pages finished since the last check, None if none finished
+        :return int:
+        """
+        if latency is not None:
+            # The best median is forgotten slowly, so a few fast pages do not keep the pool small forever
+            self.baseline = latency if self.baseline is None else min(self.baseline * 1.05, latency)
+        slow = latency is not None and latency > self.baseline * self.latency_factor
+        if cpu > self.cpu_high or memory < self.min_memory or slow:
+            return max(self.min_size, size - max(1, size // 4))
+        if cpu < self.cpu_low and memory >= self.min_memory * 2:
+            return min(self.max_size, size + 1)
+        return size
+
+    def _recent_latency(self):
+        latencies = []
+        while True:
+            try:
+                latencies.append(self.pool.latencies.popleft())
+            except IndexError:
+                break
+        return statistics.median(latencies) if latencies else None
+
+    def _run(self):
+        last_busy, last_total = cpu_times()
+        while not self._stop.wait(self.interval):
+            busy, total = cpu_times()
+            cpu = (busy - last_busy) / (total - last_total) if total > last_total else 0
+            last_busy, last_total = busy, total
+            memory, latency = memory_available(), self._recent_latency()
+            size = self.pool.size
+            new_size = self.decide(size, cpu, memory, latency)
+            if new_size != size:
+                logger.info("Browsers {} -> {} (CPU {:.0%}, memory available {:.0%}, median page {})".format(
+                    size, new_size, cpu, memory, '{:.1f} s'.format(latency) if latency is not None else '-'))
+                self.resize(new_size)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='concurrency-controller')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+def max_threads(options):
+    """
+    Maximum number of browsers of a crawl: --threads, or --max_threads (twice --threads if not given) with --adaptive
+
+    :param dict options: options of crawl
+    :return int:
+    """
+    threads = options['threads']
+    if not options.get('adaptive'):
+        return threads
+    return max(threads, options.get('max_threads') or threads * 2)
+
+
+def start_controller(pool, options, resize=None):
+    """
+    Start the ConcurrencyController of a pool if the crawl is --adaptive
+
+    :param pool: BrowserPool or AsyncBrowserPool, created with --threads browsers
+    :param dict options: options of crawl
+    :param resize: thread-safe function called with the new size, pool.resize if not given
+    :return ConcurrencyController: None if the crawl is not adaptive
+    """
+    if not options.get('adaptive'):
+        return None
+    min_threads = min(options.get('min_threads') or 1, options['threads'])
+    controller = ConcurrencyController(pool, min_threads, max_threads(options), resize=resize)
+    controller.start()
+    logger.info("Adaptive concurrency between {} and {} browsers".format(min_threads, controller.max_size))
+    return controller
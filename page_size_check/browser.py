@@ -0,0 +1,406 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from browsermobproxy import Server
+from selenium import webdriver
+from xvfbwrapper import Xvfb
+
+from page_size_check.parser import PAGE_TIMING_SCRIPT
+from page_size_check.procinfo import kill_tree, tree_rss
+from page_size_check.resource_timing import PAGE_RESOURCE_TIMING_SCRIPT, resource_timing_har
+from page_size_check.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Pooled browsers are reused between pages, so the cache must be off or the second page of the sitemap would be
+# measured without the resources it shares with the first one.
+NO_CACHE_PREFERENCES = {
+    'browser.cache.disk.enable': False,
+    'browser.cache.memory.enable': False,
+    'browser.cache.offline.enable': False,
+    'network.http.use-cache': False,
+}
+
+
+def start_server_display(browsermob_server_path, browsermob_server_port, proxy_port_range=None, headless=False,
+                         with_proxy=True):
+    """
+    Method to start the virtual screen where the browsers are going to be displayed and to start the Browsermob Server
+    :param browsermob_server_path: Path of the browsermob server
+    :param browsermob_server_port: Port where the browsermob server will be launched
+    :param proxy_port_range: (first, last) ports of the proxies, BrowserMob default range if not given
+    :param headless: If true the browsers run headless and no virtual screen is started (display is None)
+    :param with_proxy: If false the pages are captured without proxy and no server is started (server is None)
+    :return:
+    """
+    display = None
+    if not headless:
+        display = Xvfb()
+        with span('display_start'):
+            display.start()
+    if not with_proxy:
+        return display, None
+
+    logger.info("Running BrowserMob server...")
+    server = Server(path=browsermob_server_path, options={'port': browsermob_server_port})
+    if proxy_port_range:
+        server.command += ['--proxyPortRange', '{}-{}'.format(*proxy_port_range)]
+    with span('browsermob_start'):
+        server.start()
+    return display, server
+
+
+def recycle_reason(worker, recycle_pages=None, max_rss=None):
+    """
+    Method to check if a worker must be restarted, to bound the memory leaked by long-lived browsers
+    :param worker: BrowserWorker or AsyncBrowserWorker
+    :param recycle_pages: Pages after which the worker is restarted, never if None
+    :param max_rss: Bytes of resident memory of the browser above which the worker is restarted, never if None
+    :return: why the worker must be restarted, None if it can go on
+    """
+    if recycle_pages and worker.pages >= recycle_pages:
+        return 'page limit'
+    if max_rss:
+        rss = worker.rss()
+        if rss > max_rss:
+            return 'RSS {:.0f} MB above {:.0f} MB'.format(rss / 2 ** 20, max_rss / 2 ** 20)
+    return None
+
+
+def start_proxy_driver(server, firefox_driver_path, headless=False):
+    """
+    Method to start the proxy where we are going to read the HarFile and the driver to open the urls
+    :param server: Browsermob server, None to load the pages without proxy (proxy is None)
+    :param firefox_driver_path: Path of the geckodriver of firefox
+    :param headless: If true Firefox runs in its headless mode, without any display
+    :return:
+    """
+    with span('proxy_create'):
+        proxy = server.create_proxy() if server else None
+
+    profile = webdriver.FirefoxProfile()
+    for preference, value in NO_CACHE_PREFERENCES.items():
+        profile.set_preference(preference, value)
+    if proxy:
+        profile.set_proxy(proxy.selenium_proxy())
+    options = webdriver.FirefoxOptions()
+    options.headless = headless
+    with span('firefox_start'):
+        driver = webdriver.Firefox(firefox_profile=profile, executable_path=firefox_driver_path, options=options)
+
+    return proxy, driver
+
+
+class BrowserWorker:
+    """
+    Long-lived pair of BrowserMob proxy and Firefox driver that loads one page after another. Without server, the
+    pages are captured with the Resource Timing API of the browser instead of the proxy.
+    """
+
+    def __init__(self, server, firefox_driver_path, headless=False, page_timeout=None):
+        """
+        :param page_timeout: Seconds to load a page before the driver raises TimeoutException, no limit if None
+        """
+        self.proxy, self.driver = start_proxy_driver(server, firefox_driver_path, headless)
+        if page_timeout:
+            self.driver.set_page_load_timeout(page_timeout)
+        self.pages = 0
+        self.busy_since = None
+        self.killed = False
+        self.resource_timing = None
+
+    def new_page(self, capture_headers=False):
+        """
+        Start a fresh HarFile on the proxy before loading the next page
+
+        :param bool capture_headers: If true the headers of the requests and responses are recorded in the HarFile
+        """
+        if self.proxy:
+            self.proxy.new_har(options={'captureHeaders': True} if capture_headers else None)
+        self.pages += 1
+
+    def page_timings(self):
+        """
+        Navigation and paint timings of the page loaded. Without proxy, its resources are read from the Resource
+        Timing API in the same call and kept for `har`.
+
+        :return dict: ms by field of PAGE_TIMING_FIELDS
+        """
+        if self.proxy:
+            return self.driver.execute_async_script(PAGE_TIMING_SCRIPT)
+        timings = self.driver.execute_async_script(PAGE_RESOURCE_TIMING_SCRIPT)
+        self.resource_timing = timings.pop('resource_timing')
+        return timings
+
+    def har(self):
+        """
+        HarFile of the page loaded: the one recorded by the proxy or, without proxy, one built from the Resource
+        Timing API read by `page_timings` (no headers, mime types guessed)
+
+        :return dict:
+        """
+        if self.proxy:
+            return self.proxy.har
+        return resource_timing_har(self.resource_timing)
+
+    def reset(self):
+        """
+        Clear the browser state left by the last page so it does not leak into the next one
+        """
+        with span('reset'):
+            try:
+                self.driver.execute_script('window.localStorage.clear(); window.sessionStorage.clear();')
+            except Exception:  # Pages without storage access (about:blank, sandboxed frames...)
+                pass
+            self.driver.delete_all_cookies()
+            self.driver.get('about:blank')
+
+    def rss(self):
+        """
+        Resident memory of geckodriver and Firefox. The proxy runs in the BrowserMob server, shared by all the workers.
+
+        :return int: bytes
+        """
+        return tree_rss(self.driver.service.process.pid)
+
+    def kill(self):
+        """
+        Kill geckodriver and Firefox of a hung worker, so the calls blocked on its driver fail instead of hanging
+        """
+        self.killed = True
+        kill_tree(self.driver.service.process.pid)
+
+    def quit(self):
+        """
+        Close the driver and the proxy, logging instead of raising so a broken worker can always be discarded
+        """
+        for phase, close in (('driver_quit', self.driver.quit),
+                             ('proxy_close', self.proxy.close if self.proxy else None)):
+            if close is None:
+                continue
+            try:
+                with span(phase):
+                    close()
+            except Exception as ex:
+                logger.warning("Error closing worker: {}".format(ex))
+
+
+class BrowserPool:
+    """
+    Pool of BrowserWorker, started lazily up to `size` workers and shared by the executor threads. An optional watchdog
+    kills the workers that stay too long on a page, so they are discarded and replaced. The size can be changed while
+    the pool is in use, and the seconds every worker spent on its last pages are kept in `latencies`. Workers are
+    restarted after `recycle_pages` pages or when their browser uses more than `max_rss` bytes.
+    """
+
+    worker_class = BrowserWorker
+
+    def __init__(self, server, firefox_driver_path, size, headless=False, page_timeout=None, recycle_pages=None,
+                 max_rss=None):
+        self.server = server
+        self.firefox_driver_path = firefox_driver_path
+        self.size = size
+        self.headless = headless
+        self.page_timeout = page_timeout
+        self.recycle_pages = recycle_pages
+        self.max_rss = max_rss
+        self.recycled = 0
+        self.restart_seconds = 0.0
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._watchdog_stop = threading.Event()
+        self.latencies = deque(maxlen=1000)
+
+    def _start_worker(self):
+        """
+        Start a new worker if the pool is not full yet. The slot is reserved under the lock but Firefox is launched
+        outside of it so several workers can boot at the same time.
+
+        :return BrowserWorker: the new worker or None when the pool is full
+        """
+        with self._lock:
+            if self._started >= self.size:
+                return None
+            self._started += 1
+        try:
+            worker = self.worker_class(self.server, self.firefox_driver_path, self.headless, self.page_timeout)
+        except Exception:
+            with self._lock:
+                self._started -= 1
+            raise
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def acquire(self):
+        """
+        Get an idle worker, starting a new one if there is room in the pool, or wait for one to be released.
+        A None in the idle queue means a discarded worker freed its slot.
+
+        :return BrowserWorker:
+        """
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = self._start_worker() or self._idle.get()
+            if worker is not None:
+                worker.busy_since = time.monotonic()
+                return worker
+
+    def release(self, worker):
+        """
+        Give back a healthy worker to the pool, or close it if the pool was shrunk while it was in use
+
+        :param BrowserWorker worker:
+        """
+        if worker.busy_since is not None:
+            self.latencies.append(time.monotonic() - worker.busy_since)
+        with self._lock:
+            surplus = self._started > self.size
+        if surplus:
+            self.discard(worker)
+            return
+        reason = recycle_reason(worker, self.recycle_pages, self.max_rss)
+        if reason:
+            self.recycle(worker, reason)
+            return
+        try:
+            worker.reset()
+        except Exception as ex:
+            logger.warning("Error resetting worker, discarding it: {}".format(ex))
+            self.discard(worker)
+            return
+        worker.busy_since = None
+        self._idle.put(worker)
+
+    def discard(self, worker):
+        """
+        Close a broken worker and free its slot so a new one is started on demand
+
+        :param BrowserWorker worker:
+        """
+        worker.busy_since = None
+        worker.quit()
+        with self._lock:
+            self._workers.discard(worker)
+            self._started -= 1
+        self._idle.put(None)
+
+    def recycle(self, worker, reason):
+        """
+        Replace a worker with a new one in the same slot, logging what the restart cost. It runs in the thread that
+        released the worker, between two pages, so no url is lost.
+
+        :param BrowserWorker worker:
+        :param str reason: why the worker is restarted
+        """
+        start = time.monotonic()
+        worker.busy_since = None
+        worker.quit()
+        with self._lock:
+            self._workers.discard(worker)
+        try:
+            new_worker = self.worker_class(self.server, self.firefox_driver_path, self.headless, self.page_timeout)
+        except Exception as ex:
+            logger.warning("Error restarting worker: {}".format(ex))
+            with self._lock:
+                self._started -= 1
+            self._idle.put(None)
+            return
+        seconds = time.monotonic() - start
+        with self._lock:
+            self._workers.add(new_worker)
+            self.recycled += 1
+            self.restart_seconds += seconds
+        logger.info("Worker recycled after {} pages ({}), restart took {:.1f} s".format(worker.pages, reason, seconds))
+        self._idle.put(new_worker)
+
+    def busy(self):
+        """
+        :return int: number of workers lent right now
+        """
+        with self._lock:
+            return sum(1 for worker in self._workers if worker.busy_since is not None)
+
+    def resize(self, size):
+        """
+        Change the maximum number of workers. The idle workers above it are closed at once and the busy ones when
+        they are released; the threads waiting for a worker are woken up when the pool grows.
+
+        :param int size:
+        """
+        with self._lock:
+            grown = size - self.size
+            self.size = size
+        for _ in range(grown):
+            self._idle.put(None)
+        while True:
+            with self._lock:
+                if self._started <= self.size:
+                    return
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if worker is not None:
+                self.discard(worker)
+
+    @contextmanager
+    def worker(self):
+        """
+        Context manager that lends a worker, discarding it if the block raises
+        """
+        with span('worker_wait'):
+            worker = self.acquire()
+        try:
+            yield worker
+        except BaseException:
+            self.discard(worker)
+            raise
+        self.release(worker)
+
+    def start_watchdog(self, max_busy_seconds, interval=1):
+        """
+        Start a thread that kills the workers busy with the same page for more than max_busy_seconds. The thread that
+        was loading the page gets an error and discards the worker, and a new one is started on demand.
+
+        :param float max_busy_seconds:
+        :param float interval: seconds between checks
+        """
+        thread = threading.Thread(target=self._watch, args=(max_busy_seconds, interval), name='browser-watchdog')
+        thread.daemon = True
+        thread.start()
+
+    def _watch(self, max_busy_seconds, interval):
+        while not self._watchdog_stop.wait(interval):
+            now = time.monotonic()
+            with self._lock:
+                workers = list(self._workers)
+            for worker in workers:
+                busy_since = worker.busy_since
+                if busy_since is None or worker.killed or now - busy_since <= max_busy_seconds:
+                    continue
+                logger.warning("Worker stuck on a page for {:.0f} s, killing it".format(now - busy_since))
+                try:
+                    worker.kill()
+                except Exception as ex:
+                    logger.warning("Error killing worker: {}".format(ex))
+
+    def close(self):
+        """
+        Stop the watchdog and every worker of the pool
+        """
+        self._watchdog_stop.set()
+        with self._lock:
+            workers, self._workers = self._workers, set()
+            self._started = 0
+        for worker in workers:
+            worker.quit()
+        if self.recycled:
+            logger.info("Workers recycled: {}, {:.1f} s restarting them".format(self.recycled, self.restart_seconds))
@@ -0,0 +1,165 @@
+import json
+import logging
+import threading
+from collections import namedtuple
+from fnmatch import fnmatchcase
+from numbers import Number
+
+import click
+
+from page_size_check.sink import CsvReport
+
+logger = logging.getLogger(__name__)
+
+VIOLATIONS_FILE_PATH = '{}-budget-violations.csv'
+VIOLATIONS_FIELD_NAMES = ['page_url', 'budget', 'metric', 'limit', 'value']
+
+# Limit of a budget exceeded by a page
+BudgetViolation = namedtuple('BudgetViolation', ['page_url', 'budget', 'metric', 'limit', 'value'])
+
+BUDGET_LIMITS = ('max_total_bytes', 'max_requests', 'max_load_time', 'max_mime_bytes')
+
+
+class Budget:
+    """
+    Limits of the pages whose url matches a glob pattern: total bytes of the resources, number of requests, load time
+    in ms and bytes of the resources of some mime types
+    """
+
+    def __init__(self, match='*', max_total_bytes=None, max_requests=None, max_load_time=None, max_mime_bytes=None):
+        """
+        :param str match: glob pattern of the page urls (https://example.com/blog/*), every page by default
+        :param int max_total_bytes: bytes of all the resources, headers included
+        :param int max_requests: number of resources
+        :param float max_load_time: total load time in ms
+        :param dict max_mime_bytes: bytes of the resources by mime type ({"application/javascript": 500000})
+        """
+        self.match = match
+        self.max_total_bytes = max_total_bytes
+        self.max_requests = max_requests
+        self.max_load_time = max_load_time
+        self.max_mime_bytes = max_mime_bytes or {}
+
+    def matches(self, page_url):
+        return fnmatchcase(page_url, self.match)
+
+    def check(self, har_file_data):
+        """
+        :param HarFileData har_file_data:
+        :return list: BudgetViolation of every limit exceeded by the page
+        """
+        page_url = har_file_data.page_url
+        values = [('total_bytes', self.max_total_bytes, round(har_file_data.total_page_size * 1024 * 1024)),
+                  ('requests', self.max_requests, har_file_data.num_entries),
+                  ('load_time (ms)', self.max_load_time, har_file_data.load_time)]
+        mime_types = set(har_file_data.mime_types)
+        for mime_type, limit in sorted(self.max_mime_bytes.items()):
+            total_size = har_file_data.mime_resume(mime_type)[1] if mime_type in mime_types else 0
+            values.append(('{} bytes'.format(mime_type), limit, round(total_size * 1024)))
+        return [BudgetViolation(page_url, self.match, metric, limit, value)
+                for metric, limit, value in values if limit is not None and value > limit]
+
+
+def _is_limit(value):
+    return value is None or (isinstance(value, Number) and not isinstance(value, bool) and value >= 0)
+
+
+def _check_budget(path, definition):
+    """
+    :raise click.BadParameter: naming the first key of the budget with a wrong value
+    """
+    def bad_value(key, value, expected):
+        return click.BadParameter("\"{}\" of a budget of \"{}\" must be {}, not {}".format(
+            key, path, expected, json.dumps(value)), param_hint='--budget')
+
+    if not isinstance(definition, dict):
+        raise click.BadParameter("Every budget of the budget file \"{}\" must be an object".format(path),
+                                 param_hint='--budget')
+    unknown = set(definition) - set(BUDGET_LIMITS) - {'match'}
+    if unknown:
+        raise click.BadParameter("Unknown limits in the budget file \"{}\": {}".format(
+            path, ', '.join(sorted(unknown))), param_hint='--budget')
+    if not isinstance(definition.get('match', ''), str):
+        raise bad_value('match', definition['match'], 'a glob pattern')
+    for key in ('max_total_bytes', 'max_requests', 'max_load_time'):
+        if not _is_limit(definition.get(key)):
+            raise bad_value(key, definition[key], 'a number >= 0')
+    max_mime_bytes = definition.get('max_mime_bytes')
+    if max_mime_bytes is not None and not isinstance(max_mime_bytes, dict):
+        raise bad_value('max_mime_bytes', max_mime_bytes, 'an object of bytes by mime type')
+    for mime_type, limit in sorted((max_mime_bytes or {}).items()):
+        if not _is_limit(limit):
+            raise bad_value('max_mime_bytes.{}'.format(mime_type), limit, 'a number >= 0')
+
+
+def load_budgets(path):
+    """
+    Read a budget file: a JSON list of budgets, every one with a "match" glob pattern of the page urls and its limits
+
+        [{"match": "*", "max_total_bytes": 3000000, "max_requests": 120},
+         {"match": "https://example.com/blog/*", "max_load_time": 4000,
+          "max_mime_bytes": {"application/javascript": 500000}}]
+
+    :param str path:
+    :return list: Budget
+    :raise click.BadParameter: if a budget has an unknown limit or a limit that is not a number
+    """
+    with open(path) as budget_file:
+        definitions = json.load(budget_file)
+    if not isinstance(definitions, list):
+        raise click.BadParameter("The budget file \"{}\" must have a list of budgets".format(path),
+                                 param_hint='--budget')
+    budgets = []
+    for definition in definitions:
+        _check_budget(path, definition)
+        budgets.append(Budget(**definition))
+    return budgets
+
+
+class BudgetSink:
+    """
+    Thread-safe sink that checks every page against the budgets whose pattern matches its url as soon as it is
+    parsed, writing the violations to their own report
+    """
+
+    def __init__(self, budgets):
+        """
+        :param list budgets: Budget
+        """
+        self.budgets = budgets
+        self.report = None
+        self.num_violations = 0
+        self.pages_over_budget = 0
+        self._lock = threading.Lock()
+
+    def add(self, har_file_data):
+        violations = []
+        for budget in self.budgets:
+            if budget.matches(har_file_data.page_url):
+                violations.extend(budget.check(har_file_data))
+        if not violations:
+            return
+        for violation in violations:
+            logger.warning("\"{}\" over budget: {} {} > {}".format(violation.page_url, violation.metric,
+                                                                   violation.value, violation.limit))
+        with self._lock:
+            if self.report is None:
+                self.report = CsvReport(VIOLATIONS_FILE_PATH.format(har_file_data.sitemap_domain),
+                                        VIOLATIONS_FIELD_NAMES, 'w')
+            self.report.rows.extend(violation._asdict() for violation in violations)
+            self.report.flush()
+            self.num_violations += len(violations)
+            self.pages_over_budget += 1
+
+    @property
+    def failed(self):
+        return self.num_violations > 0
+
+    def close(self):
+        with self._lock:
+            if self.report is None:
+                logger.info("Every page is within its budgets")
+                return
+            self.report.close()
+        logger.warning("Pages over budget: {}, violations: {}, see \"{}\"".format(
+            self.pages_over_budget, self.num_violations, self.report.file_path))
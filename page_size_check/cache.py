@@ -0,0 +1,173 @@
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+CacheEntry = namedtuple('CacheEntry', ['lastmod', 'etag', 'last_modified', 'har_file_data'])
+
+
+def get_document_validators(har_file, page_url):
+    """
+    ETag and Last-Modified headers of the response of the page in the HarFile: the request of the page url or, if it
+    was redirected, the first HTML document loaded successfully
+
+    :param dict har_file:
+    :param str page_url:
+    :return tuple: etag and last_modified, None when the header is missing
+    """
+    document = None
+    for entry in har_file['log']['entries']:
+        response = entry['response']
+        if not 200 <= response['status'] < 300:
+            continue
+        if entry['request']['url'] == page_url:
+            document = response
+            break
+        if document is None and response['content'].get('mimeType', '').startswith('text/html'):
+            document = response
+    if document is None:
+        return None, None
+    headers = {header['name'].lower(): header['value'] for header in document.get('headers', [])}
+    return headers.get('etag'), headers.get('last-modified')
+
+
+class PageCache:
+    """
+    Persistent SQLite cache of parsed pages keyed by url. A cached page is reused while it has not changed, according
+    to the <lastmod> of the sitemap or, without it, to a conditional request (If-None-Match / If-Modified-Since). The
+    least recently used pages are evicted when the cache is bigger than max_size bytes.
+    """
+
+    def __init__(self, path, max_size=512 * 1024 * 1024, pool_size=10, timeout=30):
+        """
+        :param str path: path of the SQLite file, created if it does not exist
+        :param int max_size: maximum size in bytes of the cached pages
+        :param int pool_size: connections kept alive per host for the conditional requests
+        :param int timeout: timeout in seconds of the conditional requests
+        """
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS pages ('
+                                'page_url TEXT PRIMARY KEY, lastmod TEXT, etag TEXT, last_modified TEXT, '
+                                'size INTEGER NOT NULL, accessed_at REAL NOT NULL, data BLOB NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)')
+        self.connection.commit()
+        self.size = self._total_size()
+        self.hits = self.misses = 0
+
+    def _total_size(self):
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def get(self, page_url):
+        """
+        :param str page_url:
+        :return CacheEntry: cached page or None
+        """
+        with self._lock:
+            row = self.connection.execute('SELECT lastmod, etag, last_modified, data FROM pages WHERE page_url = ?',
+                                          (page_url,)).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(row[0], row[1], row[2], pickle.loads(row[3]))
+
+    def put(self, har_file_data, lastmod=None, etag=None, last_modified=None):
+        """
+        Store a parsed page with its validators, evicting the least recently used pages if the cache is full
+
+        :param HarFileData har_file_data:
+        :param str lastmod: <lastmod> of the page in the sitemap
+        :param str etag: ETag header of the page
+        :param str last_modified: Last-Modified header of the page
+        """
+        data = pickle.dumps(har_file_data, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self.connection.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                    (har_file_data.page_url, lastmod, etag, last_modified, len(data), time.time(),
+                                     data))
+            # Read from the file instead of counted, the cache may be shared by several processes
+            self.size = self._total_size()
+            self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        while self.size > self.max_size:
+            rows = self.connection.execute('SELECT page_url, size FROM pages ORDER BY accessed_at LIMIT 100').fetchall()
+            if not rows:
+                self.size = 0
+                return
+            for page_url, size in rows:
+                self.connection.execute('DELETE FROM pages WHERE page_url = ?', (page_url,))
+                self.size -= size
+                if self.size <= self.max_size:
+                    break
+            logger.info("Page cache evicted pages, size: {} bytes".format(self.size))
+
+    def _touch(self, page_url):
+        with self._lock:
+            self.connection.execute('UPDATE pages SET accessed_at = ? WHERE page_url = ?', (time.time(), page_url))
+            self.connection.commit()
+
+    def _is_modified(self, page_url, entry):
+        """
+        Conditional request with the validators of the cached page
+
+        :return bool: False only if the server answers 304 Not Modified
+        """
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        if not headers:
+            return True
+        try:
+            response = self.session.get(page_url, headers=headers, stream=True, timeout=self.timeout)
+            response.close()
+        except requests.RequestException as ex:
+            logger.warning("Conditional request of \"{}\" failed: {}".format(page_url, ex))
+            return True
+        return response.status_code != 304
+
+    def validate(self, page_url, lastmod=None):
+        """
+        Get the cached page if it has not changed since it was cached
+
+        :param str page_url:
+        :param str lastmod: <lastmod> of the page in the sitemap
+        :return HarFileData: the cached page or None if it is not cached or it has changed
+        """
+        entry = self.get(page_url)
+        if entry is None:
+            unchanged = False
+        elif lastmod and entry.lastmod:
+            unchanged = lastmod == entry.lastmod
+        else:
+            unchanged = not self._is_modified(page_url, entry)
+        with self._lock:
+            if not unchanged:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._touch(page_url)
+        return entry.har_file_data
+
+    def close(self):
+        logger.info("Page cache hits: {}, misses: {}".format(self.hits, self.misses))
+        self.session.close()
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,78 @@
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    """
+    SQLite store of the pages already parsed in a crawl, indexed by url, so an interrupted crawl can be resumed
+    skipping them and the reports can be rebuilt from it. It is a sink: pages are recorded with `add`.
+
+    The HarFileData are stored pickled, the file is meant to be read only by this tool.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: path of the SQLite file, created if it does not exist
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS pages ('
+                                'page_url TEXT PRIMARY KEY, finished_at REAL NOT NULL, data BLOB NOT NULL)')
+        self.connection.commit()
+
+    def __contains__(self, page_url):
+        with self._lock:
+            row = self.connection.execute('SELECT 1 FROM pages WHERE page_url = ?', (page_url,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def add(self, har_file_data):
+        """
+        Record a parsed page. Every page is committed, so a crash never loses a finished page.
+
+        :param HarFileData har_file_data:
+        """
+        data = pickle.dumps(har_file_data, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self.connection.execute('INSERT OR REPLACE INTO pages (page_url, finished_at, data) VALUES (?, ?, ?)',
+                                    (har_file_data.page_url, time.time(), data))
+            self.connection.commit()
+
+    def iter_results(self, batch_size=500):
+        """
+        Parsed pages in the order they were finished, read in batches
+
+        :return: generator of HarFileData
+        """
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self.connection.execute('SELECT rowid, data FROM pages WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                                               (last_rowid, batch_size)).fetchall()
+            if not rows:
+                return
+            for last_rowid, data in rows:
+                yield pickle.loads(data)
+
+    def clear(self):
+        """
+        Forget all the pages, to start a new crawl
+        """
+        with self._lock:
+            self.connection.execute('DELETE FROM pages')
+            self.connection.commit()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
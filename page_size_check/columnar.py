@@ -0,0 +1,209 @@
+import logging
+import re
+import threading
+
+from page_size_check.parser import HarFileParser, SUMMARY_FIELD_NAMES
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional dependency: pip install page-size-check[columnar]
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+# Arrow is written in the IPC stream format, the file format does not allow a new dictionary in every batch
+FILE_EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrows'}
+COLUMNAR_FILE_PATHS = {
+    'summary': '{}-resume-urls.{}',
+    'resources': '{}-resources-list.{}',
+    'mimetype': '{}-mimetype-resources.{}',
+}
+# Columns with few distinct values repeated in many rows, dictionary encoded
+DICTIONARY_COLUMNS = ('page_url', 'host', 'mime_type')
+MIMETYPE_COLUMNS = (('page_url', 'page_url'), ('mime_type', 'mime_type'), ('n_entries', 'n_entries'),
+                    ('total_size_kb', 'total_size'), ('average_size_kb', 'average_size'),
+                    ('percentage_size', 'percentage_size'), ('total_time_ms', 'total_time'),
+                    ('average_time_ms', 'average_time'))
+
+
+def column_name(field_name):
+    """
+    Column of a field of the CSV reports: 'page_size (KB)' -> 'page_size_kb'
+    """
+    return field_name.replace(' (', '_').replace(')', '').lower()
+
+
+# Column and field of the resume urls CSV
+SUMMARY_COLUMNS = tuple((column_name(field_name), field_name) for field_name in SUMMARY_FIELD_NAMES)
+
+
+# Host of an absolute url, without user info and port. Faster than urlsplit, that is the bottleneck with millions
+# of resources.
+HOST_RE = re.compile(r'[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^@/?#]*@)?(\[[^\]/?#]*\]|[^:/?#]*)')
+
+
+def resource_host(url):
+    """
+    :param str url:
+    :return str: lowercase host of the url, empty for data URIs
+    """
+    match = HOST_RE.match(url)
+    return match.group(1).strip('[]').lower() if match else ''
+
+
+def _schemas():
+    dictionary = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+
+    def column_type(name, default):
+        return dictionary if name in DICTIONARY_COLUMNS else default
+
+    return {
+        'summary': pyarrow.schema(
+            [(name, column_type(name, pyarrow.int64() if name == 'num_entries' else pyarrow.float64()))
+             for name, _ in SUMMARY_COLUMNS]),
+        'resources': pyarrow.schema([
+            ('page_url', dictionary), ('host', dictionary), ('mime_type', dictionary),
+            ('resource_url', pyarrow.string()), ('status', pyarrow.int32()), ('size_kb', pyarrow.float64()),
+            ('time_ms', pyarrow.float64())]),
+        'mimetype': pyarrow.schema(
+            [(name, column_type(name, pyarrow.int64() if name == 'n_entries' else pyarrow.float64()))
+             for name, _ in MIMETYPE_COLUMNS]),
+    }
+
+
+class ColumnarTable:
+    """
+    Parquet or Arrow file of a report, written in batches of row_group_size rows. The columns are buffered as lists
+    and converted to Arrow arrays once per batch.
+    """
+
+    def __init__(self, file_path, schema, file_format, row_group_size):
+        self.file_path = file_path
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.columns = {name: [] for name in schema.names}
+        self.num_rows = 0
+        if file_format == 'parquet':
+            dictionary_columns = [name for name in schema.names if name in DICTIONARY_COLUMNS]
+            self.writer = pyarrow.parquet.ParquetWriter(file_path, schema, use_dictionary=dictionary_columns,
+                                                        compression='snappy')
+        else:
+            self.writer = pyarrow.ipc.new_stream(file_path, schema)
+
+    def extend(self, columns, num_rows):
+        """
+        :param dict columns: list of values by column
+        :param int num_rows: length of the lists
+        """
+        for name, values in columns.items():
+            self.columns[name].extend(values)
+        self.num_rows += num_rows
+        if self.num_rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.num_rows:
+            return
+        arrays = []
+        for field in self.schema:
+            if field.name in DICTIONARY_COLUMNS:
+                arrays.append(pyarrow.array(self.columns[field.name], type=pyarrow.string()).dictionary_encode())
+            else:
+                arrays.append(pyarrow.array(self.columns[field.name], type=field.type))
+            self.columns[field.name] = []
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        self.num_rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def resource_columns(har_file_data):
+    """
+    Columns of the resources table for a page, in the order of the entries, built from the arrays of the page
+
+    :param HarFileData har_file_data:
+    :return dict:
+    """
+    urls, mime_types = har_file_data.urls, har_file_data.mime_types
+    hosts = [resource_host(url) for url in urls]
+    resource_urls = [urls[url_id] for url_id in har_file_data.url_ids]
+    return {
+        'page_url': [har_file_data.page_url] * len(resource_urls),
+        'host': [hosts[url_id] for url_id in har_file_data.url_ids],
+        'mime_type': [mime_types[mime_id] for mime_id in har_file_data.mime_ids],
+        'resource_url': resource_urls,
+        'status': list(har_file_data.statuses),
+        'size_kb': [body_size / 1024 + headers_size / 1024
+                    for body_size, headers_size in zip(har_file_data.body_sizes, har_file_data.headers_sizes)],
+        'time_ms': list(har_file_data.times),
+    }
+
+
+def row_columns(rows, columns):
+    """
+    :param list rows: dicts of the CSV report
+    :param tuple columns: column and field of the CSV report
+    :return dict: list of values by column
+    """
+    return {name: [row[field_name] for row in rows] for name, field_name in columns}
+
+
+class ColumnarSink:
+    """
+    Thread-safe sink that writes the resume urls, resources list and mimetype resources tables as Parquet or Arrow
+    files while the crawl runs, with the page url, host and mime type columns dictionary encoded. The files are
+    rewritten on every execution, a Parquet file can be read once the sink is closed.
+    """
+
+    def __init__(self, file_format='parquet', row_group_size=100000, generate_extra_csv=True):
+        """
+        :param str file_format: 'parquet' or 'arrow' (Arrow IPC stream)
+        :param int row_group_size: rows of a table buffered before writing them as a row group / record batch
+        :param bool generate_extra_csv: If true the resources and mimetype tables are written too
+        """
+        if pyarrow is None:
+            raise RuntimeError("The {} output needs pyarrow: pip install page-size-check[columnar]".format(
+                file_format))
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+        self.generate_extra_csv = generate_extra_csv
+        self.tables = {}
+        self._lock = threading.Lock()
+
+    def _open_tables(self, sitemap_domain):
+        names = ('summary', 'resources', 'mimetype') if self.generate_extra_csv else ('summary',)
+        extension = FILE_EXTENSIONS[self.file_format]
+        schemas = _schemas()
+        for name in names:
+            self.tables[name] = ColumnarTable(COLUMNAR_FILE_PATHS[name].format(sitemap_domain, extension),
+                                              schemas[name], self.file_format, self.row_group_size)
+
+    def add(self, har_file_data):
+        """
+        Add the rows of a parsed page to the tables
+
+        :param HarFileData har_file_data:
+        """
+        columns = {'summary': (row_columns([HarFileParser.summary_row(har_file_data)], SUMMARY_COLUMNS), 1)}
+        if self.generate_extra_csv:
+            columns['resources'] = (resource_columns(har_file_data), har_file_data.num_entries)
+            mimetype_rows = list(HarFileParser.mimetype_rows(har_file_data))
+            columns['mimetype'] = (row_columns(mimetype_rows, MIMETYPE_COLUMNS), len(mimetype_rows))
+        with self._lock:
+            if not self.tables:
+                self._open_tables(har_file_data.sitemap_domain)
+            for name, (table_columns, num_rows) in columns.items():
+                self.tables[name].extend(table_columns, num_rows)
+
+    def close(self):
+        with self._lock:
+            for table in self.tables.values():
+                table.close()
+        if self.tables:
+            logger.info("Columnar reports written: {}".format(
+                ', '.join('"{}"'.format(table.file_path) for table in self.tables.values())))
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from page_size_check.async_crawler import crawl_async
+from page_size_check.autoscale import max_threads, start_controller
+from page_size_check.browser import BrowserPool, start_server_display
+from page_size_check.cache import PageCache, get_document_validators
+from page_size_check.metrics import get_metrics
+from page_size_check.parser import HarFileParser
+from page_size_check.retry import RetryPolicy, describe_error, report_failure
+from page_size_check.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Seconds a browser may stay on a page after its page load timeout before the watchdog kills it
+WATCHDOG_GRACE = 30
+
+
+def map_bounded(executor, fn, iterable, max_pending):
+    """
+    Method to submit the items of a (maybe endless) iterable to the executor, blocking while there are max_pending
+    items waiting, so the iterable is consumed at the pace of the executor instead of all at once like executor.map
+    :param executor: Executor where fn is run
+    :param fn: Function called with every item
+    :param iterable: Items to be processed
+    :param max_pending: Maximum number of submitted items not finished yet
+    :return:
+    """
+    semaphore = threading.BoundedSemaphore(max_pending)
+    for item in iterable:
+        semaphore.acquire()
+        future = executor.submit(fn, item)
+        future.add_done_callback(lambda _: semaphore.release())
+
+
+def take_from_cache(sink, url_info):
+    """
+    Method to add the page to the sink from the cache if it did not change since it was cached
+    :param sink: Sink where the parsed data is written
+    :param url_info: Information of the url to be analyzed
+    :return: True if the page was taken from the cache
+    """
+    page_url, cache = url_info['page_url'], url_info.get('cache')
+    if not cache:
+        return False
+    with span('cache_validate', page_url):
+        cached_har_file_data = cache.validate(page_url, url_info.get('lastmod'))
+    if cached_har_file_data is None:
+        return False
+    sink.add(cached_har_file_data)
+    logger.info("\"{}\" not modified, taken from the cache".format(page_url))
+    return True
+
+
+def load_page(url_info):
+    """
+    Method to load the page on a browser of the pool and get its HarFile and page timings
+    :param url_info: Information of the url to be analyzed
+    :return: tuple of the HarFile and the page timings
+    """
+    page_url, pool = url_info['page_url'], url_info['pool']
+    # A worker that raises is discarded by the pool, so a driver left broken by a timeout is never reused
+    with pool.worker() as worker:
+        with span('new_har', page_url):
+            # the cache needs the ETag and Last-Modified headers
+            worker.new_page(capture_headers=bool(url_info.get('cache')))
+        logger.info("Processing \"{}\"".format(page_url))
+        with span('driver_get', page_url):
+            worker.driver.get(page_url)
+        with span('page_timings', page_url):
+            page_timings = worker.page_timings()
+        with span('har_fetch', page_url):
+            har_file = worker.har()
+    return har_file, page_timings
+
+
+def store_page(sink, url_info, har_file, page_timings):
+    """
+    Method to parse the HarFile of a page and write it to the sink and the cache
+    :param sink: Sink where the parsed data is written
+    :param url_info: Information of the url to be analyzed
+    :param har_file: HarFile of the page
+    :param page_timings: Page timings read from the browser
+    :return:
+    """
+    page_url, cache = url_info['page_url'], url_info.get('cache')
+    with span('parse', page_url):
+        har_file_data = HarFileParser().parse(har_file, page_url, url_info['sitemap_url'])
+        har_file_data.set_page_timings(page_timings)
+    with span('sink_add', page_url):
+        sink.add(har_file_data)
+    if cache:
+        with span('cache_put', page_url):
+            cache.put(har_file_data, url_info.get('lastmod'), *get_document_validators(har_file, page_url))
+    logger.info("\"{}\" parsed!".format(page_url))
+
+
+def execute_parser(sink, url_info):
+    """
+    Method to process a page: take it from the cache or load it, trying the browser again after an error as allowed
+    by the RetryPolicy of url_info (no retries if there is none), and parse it and write it once, so a page is never
+    added twice to the sink. Pages that fail are reported to the sink.
+    :param sink: Sink where the parsed data is written
+    :param url_info: Information of the url to be analyzed
+    :return:
+    """
+    page_url = url_info['page_url']
+    retry_policy = url_info.get('retry_policy') or RetryPolicy(retries=0)
+    start = time.monotonic()
+    attempt = 0
+    with span('page', page_url):
+        try:
+            if take_from_cache(sink, url_info):
+                return
+            while True:
+                attempt += 1
+                try:
+                    har_file, page_timings = load_page(url_info)
+                    break
+                except Exception as ex:
+                    delay = retry_policy.delay(attempt, time.monotonic() - start, ex)
+                    if delay is None:
+                        raise
+                    logger.warning("Error processing \"{}\" url ({}), retrying in {:.1f} s".format(
+                        page_url, describe_error(ex), delay))
+                    time.sleep(delay)
+            store_page(sink, url_info, har_file, page_timings)
+        except Exception as ex:
+            report_failure(sink, url_info, max(attempt, 1), ex, time.monotonic() - start)
+
+
+def crawl_urls(sink, url_infos, threads):
+    """
+    Method to load and parse the pages of url_infos with a pool of threads, consuming the urls as they are needed
+    :param sink: Sink where the parsed data is written
+    :param url_infos: Information of the urls to be analyzed, with the BrowserPool that loads them
+    :param threads: Number of threads
+    :return:
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        map_bounded(executor, partial(execute_parser, sink), url_infos, threads * 2)
+
+
+def crawl(sink, url_infos, options, proxy_port_range=None):
+    """
+    Method to start the virtual screen, the BrowserMob server and the pool of browsers, load and parse the pages of
+    url_infos and stop everything
+    :param sink: Sink where the parsed data is written
+    :param url_infos: Information of the urls to be analyzed
+    :param options: dict with browsermob_server_path, browsermob_server_port, firefox_driver_path, threads and
+        optionally cache_path, cache_max_size (MB), engine ('threads' or 'asyncio'), headless, capture ('har' or
+        'resource_timing'), page_timeout (seconds to load a page), retries, retry_backoff (seconds), page_deadline
+        (seconds to give up on a page), adaptive, min_threads, max_threads, recycle_pages and max_browser_rss (MB)
+    :param proxy_port_range: (first, last) ports of the proxies, BrowserMob default range if not given
+    :return:
+    """
+    if options.get('engine') == 'asyncio':
+        return crawl_async(sink, url_infos, options, proxy_port_range)
+    threads = options['threads']
+    headless = options.get('headless', False)
+    display, server = start_server_display(options['browsermob_server_path'], options['browsermob_server_port'],
+                                           proxy_port_range, headless, options.get('capture', 'har') == 'har')
+    page_timeout = options.get('page_timeout')
+    pool = BrowserPool(server, options['firefox_driver_path'], threads, headless, page_timeout,
+                       options.get('recycle_pages'), (options.get('max_browser_rss') or 0) * 1024 * 1024)
+    if page_timeout:
+        pool.start_watchdog(page_timeout + WATCHDOG_GRACE)
+    retry_policy = RetryPolicy(options.get('retries', 0), options.get('retry_backoff', 2.0),
+                               options.get('page_deadline'))
+    cache = None
+    if options.get('cache_path'):
+        cache = PageCache(options['cache_path'], options['cache_max_size'] * 1024 * 1024,
+                          pool_size=max_threads(options))
+    controller = start_controller(pool, options)
+    get_metrics().set_gauge('page_size_check_active_workers', 'Browsers loading a page.', pool.busy)
+    get_metrics().set_gauge('page_size_check_workers', 'Size of the pool of browsers.', lambda: pool.size)
+    try:
+        url_infos = (dict(url_info, pool=pool, cache=cache, retry_policy=retry_policy) for url_info in url_infos)
+        # With --adaptive there is a thread for every browser the pool may grow to, the pool limits the active ones
+        crawl_urls(sink, url_infos, max_threads(options))
+    finally:
+        if controller:
+            controller.stop()
+        if cache:
+            cache.close()
+        logger.info("Stopping BrowserMob server...")
+        pool.close()
+        if server:
+            server.stop()
+        if display:
+            display.stop()
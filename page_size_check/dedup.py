@@ -0,0 +1,264 @@
+import csv
+import hashlib
+import heapq
+import logging
+import re
+import threading
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from prettytable import PrettyTable
+
+logger = logging.getLogger(__name__)
+
+SHARED_RESOURCES_FILE_PATH = '{}-shared-resources.csv'
+SHARED_RESOURCES_FIELD_NAMES = ['resource_url', 'mime_type', 'size', 'pages', 'max_overcount', 'total_size']
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# Query parameters that only change with the version of a file (app.js?v=3), and values that look like a hash or a
+# timestamp (?h=3f2a9c8e, ?1539875776)
+CACHE_BUSTING_PARAMS = frozenset(('v', 'ver', 'version', 'rev', 'cb', 'cachebuster', '_'))
+HASH_LIKE_RE = re.compile(r'(?:[0-9a-f]{8,}|[0-9]{10,})\Z', re.IGNORECASE)
+HASH_RANGE = 2 ** 64
+
+
+def normalize_resource_url(url):
+    """
+    Normalized url of a resource: lowercase scheme and host, without default port and fragment and with the query
+    string sorted, so the same resource is always written the same way
+
+    :param str url:
+    :return str:
+    """
+    if url.startswith('data:'):
+        return url
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = '{}:{}'.format(netloc, parts.port)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+
+def is_cache_busting(name, value):
+    """
+    :return bool: True if a query parameter only busts the cache of the browsers
+    """
+    return name.lower() in CACHE_BUSTING_PARAMS or bool(HASH_LIKE_RE.match(value or name))
+
+
+@lru_cache(maxsize=2 ** 16)  # shared resources repeat in every page, urlsplit is slow
+def resource_key(url, body_size):
+    """
+    Key that identifies a resource across pages: its normalized url. Cache busting parameters (?v=123, a hash or a
+    timestamp) are left out of the key and replaced by the content length, so the versions of the same file are
+    matched while resources that differ in any other parameter (?id=1, ?page=2) are kept apart. Data URIs are keyed by
+    a hash of their content.
+
+    :param str url:
+    :param float body_size: size of the body in bytes
+    :return str:
+    """
+    if url.startswith('data:'):
+        return 'data:{}'.format(hashlib.md5(url.encode('utf-8')).hexdigest())
+    normalized = normalize_resource_url(url)
+    path, _, query = normalized.partition('?')
+    if not query:
+        return normalized
+    params = parse_qsl(query, keep_blank_values=True)
+    kept = [(name, value) for name, value in params if not is_cache_busting(name, value)]
+    if len(kept) == len(params):
+        return normalized
+    return '{}#{:.0f}'.format('{}?{}'.format(path, urlencode(kept)) if kept else path, body_size)
+
+
+def hash_key(key):
+    """
+    :return int: 64-bit hash of a key, stable across executions and processes
+    """
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class SpaceSaving:
+    """
+    Space-Saving counter of the most frequent keys of a stream with a fixed number of counters. Every count is an
+    upper bound of the real one, with an error of at most `error` of the counter.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}  # key -> [count, error, value]
+        self._heap = []  # (count, key), with stale items of counters that changed since they were pushed
+
+    def _min_key(self):
+        while True:
+            count, key = self._heap[0]
+            counter = self.counters.get(key)
+            if counter is not None and counter[0] == count:
+                return key
+            heapq.heappop(self._heap)
+
+    def add(self, key, value):
+        """
+        Count a key
+
+        :param key:
+        :param value: data kept with the counter of the key
+        """
+        counter = self.counters.get(key)
+        if counter is None:
+            if len(self.counters) < self.capacity:
+                counter = self.counters[key] = [0, 0, value]
+            else:
+                min_count = self.counters.pop(self._min_key())[0]
+                counter = self.counters[key] = [min_count, min_count, value]
+        counter[0] += 1
+        heapq.heappush(self._heap, (counter[0], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(counter[0], key) for key, counter in self.counters.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n=None):
+        """
+        :return list: (key, count, error, value) of the most frequent keys
+        """
+        items = sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))[:n]
+        return [(key, count, error, value) for key, (count, error, value) in items]
+
+
+class UniqueSizeSketch:
+    """
+    Bottom-k sketch of the sizes of the distinct keys of a stream: the keys with the smallest hashes are kept, so the
+    total size is exact while there are less than k distinct keys and estimated from the sample afterwards.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.sizes = {}  # hash -> size
+        self._heap = []  # -hash, the biggest hash of the sample first
+
+    def add(self, key_hash, size):
+        if key_hash in self.sizes:
+            return
+        if len(self.sizes) < self.k:
+            heapq.heappush(self._heap, -key_hash)
+        elif key_hash < -self._heap[0]:
+            del self.sizes[-heapq.heapreplace(self._heap, -key_hash)]
+        else:
+            return
+        self.sizes[key_hash] = size
+
+    @property
+    def exact(self):
+        return len(self.sizes) < self.k
+
+    def count(self):
+        """
+        :return float: number of distinct keys
+        """
+        if self.exact:
+            return len(self.sizes)
+        return (self.k - 1) * HASH_RANGE / -self._heap[0]
+
+    def total_size(self):
+        """
+        :return float: sum of the sizes of the distinct keys
+        """
+        if not self.sizes:
+            return 0
+        if self.exact:
+            return sum(self.sizes.values())
+        return self.count() * sum(self.sizes.values()) / len(self.sizes)
+
+
+class ResourceIndex:
+    """
+    Thread-safe sink that indexes the resources of every page across the whole site, to know the bytes that a visitor
+    really downloads (every shared resource counted once) and which resources are reused by more pages. Memory is
+    bounded: the unique size is estimated with a sample of max_sample resources and only the max_counters most
+    reused resources are tracked. The shared resources CSV is written when the sink is closed.
+    """
+
+    def __init__(self, display_summary=False, top=1000, max_counters=10000, max_sample=2 ** 16):
+        """
+        :param bool display_summary: If true displays the unique size to the stdout when the sink is closed
+        :param int top: number of shared resources written to the CSV
+        :param int max_counters: number of resources whose reuse is tracked
+        :param int max_sample: number of resources sampled to estimate the unique size
+        """
+        self.display_summary = display_summary
+        self.top = top
+        self.shared = SpaceSaving(max_counters)
+        self.unique = UniqueSizeSketch(max_sample)
+        self.sitemap_domain = None
+        self.num_pages = 0
+        self.total_size = 0
+        self._lock = threading.Lock()
+
+    def add(self, har_file_data):
+        """
+        Index the resources of a parsed page. A resource loaded several times by the same page is counted once.
+
+        :param HarFileData har_file_data:
+        """
+        resources = {}
+        for index in range(har_file_data.num_entries):
+            url = har_file_data.urls[har_file_data.url_ids[index]]
+            key = resource_key(url, har_file_data.body_sizes[index])
+            if key not in resources:
+                mime_type = har_file_data.mime_types[har_file_data.mime_ids[index]]
+                resources[key] = (url, mime_type, har_file_data.resource_size(index))
+        hashes = [(key, hash_key(key)) for key in resources]
+        with self._lock:
+            if self.sitemap_domain is None:
+                self.sitemap_domain = har_file_data.sitemap_domain
+            self.num_pages += 1
+            for key, key_hash in hashes:
+                value = resources[key]
+                self.total_size += value[2]
+                self.unique.add(key_hash, value[2])
+                self.shared.add(key, value)
+
+    def rows(self):
+        """
+        Rows of the shared resources CSV, the most reused resources first
+
+        :return: generator of dict
+        """
+        for _, pages, error, (url, mime_type, size) in self.shared.top(self.top):
+            yield {
+                'resource_url': url,
+                'mime_type': mime_type,
+                'size': round(size, 3),
+                'pages': pages,
+                'max_overcount': error,
+                'total_size': round(size * pages, 3),
+            }
+
+    def summary_row(self):
+        """
+        :return list: total_size_sum (MB), unique_size (MB), unique_resources, exact
+        """
+        return [round(self.total_size / 1024, 3), round(self.unique.total_size() / 1024, 3),
+                int(round(self.unique.count())), self.unique.exact]
+
+    def close(self):
+        """
+        Write the shared resources CSV and print the unique size if display_summary is true
+        """
+        with self._lock:
+            if self.sitemap_domain is None:
+                return
+            with open(SHARED_RESOURCES_FILE_PATH.format(self.sitemap_domain), 'w', newline='') as csv_file:
+                writer = csv.DictWriter(csv_file, fieldnames=SHARED_RESOURCES_FIELD_NAMES)
+                writer.writeheader()
+                writer.writerows(self.rows())
+            summary = self.summary_row()
+        logger.info("Resources size: {} MB, unique: {} MB in {} resources{}".format(
+            summary[0], summary[1], summary[2], '' if summary[3] else ' (estimated)'))
+        if self.display_summary:
+            table = PrettyTable()
+            table.field_names = ["total_size_sum (MB)", "unique_size (MB)", "unique_resources", "exact"]
+            table.add_row(summary)
+            print(table)
@@ -0,0 +1,246 @@
+import io
+import json
+import re
+
+WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+STRUCTURE_RE = re.compile(r'["{}\[\]]')
+# Characters that may follow the part of a number decoded so far when the number is cut (12345. or 1.5e)
+NUMBER_TAIL_RE = re.compile(r'[0-9.eE+-]*')
+
+# Values never read from the entries: the bodies of the responses and requests, that can take several MB each
+ENTRY_SKIPPED_KEYS = {
+    'response': {'content': {'text': None}},
+    'request': {'postData': {'text': None}},
+}
+
+
+class JsonStream:
+    """
+    Minimal pull parser over a text file: the structure is walked in Python while every value that is read is decoded
+    by the C decoder of the json module. Values can be skipped without being decoded and the consumed text is dropped
+    from the buffer, so memory depends on the biggest value read instead of on the size of the document.
+    """
+
+    def __init__(self, fp, chunk_size=64 * 1024):
+        if isinstance(fp, (io.RawIOBase, io.BufferedIOBase)):
+            fp = io.TextIOWrapper(fp, encoding='utf-8')
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size=None):
+        """
+        Read the next chunk of the file, dropping the consumed part of the buffer
+
+        :return bool: False at the end of the file
+        """
+        chunk = self.fp.read(size or self.chunk_size)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def peek(self):
+        """
+        Skip the whitespace and return the next character, '' at the end of the file
+        """
+        while True:
+            self.pos = WHITESPACE_RE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError("Expected '{}' but found '{}' in the JSON document".format(char, found))
+        self.pos += 1
+
+    def read_value(self):
+        """
+        Decode the next value. When the value is cut by the end of the buffer more text is read, doubling the amount
+        every time so big values are decoded in linear time.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if not self._fill(max(self.chunk_size, len(self.buffer))):
+                    raise
+                continue
+            # A number cut by the end of the buffer is decoded short (12345 of 12345.) and continues in the next chunk
+            if (isinstance(value, (int, float)) and not self.eof and
+                    NUMBER_TAIL_RE.match(self.buffer, end).end() == len(self.buffer) and self._fill()):
+                continue
+            self.pos = end
+            return value
+
+    def _skip_string(self):
+        # str.find is much faster than a regex to jump over long strings
+        self.pos += 1  # opening quote
+        while True:
+            quote = self.buffer.find('"', self.pos)
+            backslash = self.buffer.find('\\', self.pos, len(self.buffer) if quote == -1 else quote)
+            if backslash != -1:
+                if backslash + 1 < len(self.buffer):
+                    self.pos = backslash + 2  # escaped character
+                    continue
+                self.pos = backslash
+            elif quote != -1:
+                self.pos = quote + 1
+                return
+            else:
+                self.pos = len(self.buffer)
+            if not self._fill():
+                raise ValueError("Unterminated string in the JSON document")
+
+    def _skip_container(self):
+        depth = 0
+        while True:
+            match = STRUCTURE_RE.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self._fill():
+                    raise ValueError("Unterminated object or array in the JSON document")
+                continue
+            self.pos = match.start()
+            char = match.group()
+            if char == '"':
+                self._skip_string()
+                continue
+            self.pos += 1
+            depth += 1 if char in '{[' else -1
+            if depth == 0:
+                return
+
+    def skip_value(self):
+        """
+        Move past the next value without decoding it
+        """
+        char = self.peek()
+        if char == '"':
+            self._skip_string()
+        elif char in ('{', '['):
+            self._skip_container()
+        else:
+            self.read_value()
+
+    def iter_object(self):
+        """
+        Iterate over the keys of the next object. The value of every key must be read or skipped before the next one.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError("Expected ',' or '}}' but found '{}' in the JSON document".format(char))
+
+    def iter_array(self):
+        """
+        Iterate over the items of the next array. Every item must be read or skipped before the next one.
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError("Expected ',' or ']' but found '{}' in the JSON document".format(char))
+
+    def read_object(self, skipped_keys):
+        """
+        Read the next object leaving out the keys in skipped_keys
+
+        :param dict skipped_keys: keys to leave out (with None) or nested dicts of keys to leave out of their values
+        :return dict:
+        """
+        obj = {}
+        for key in self.iter_object():
+            skipped = skipped_keys.get(key, False)
+            if skipped is None:
+                self.skip_value()
+            elif skipped and self.peek() == '{':
+                obj[key] = self.read_object(skipped)
+            else:
+                obj[key] = self.read_value()
+        return obj
+
+    def read_small_object(self, skipped_keys):
+        """
+        Read the next object like read_object, but decoding it at once with the C decoder when it is already in the
+        buffer (its skipped values are small by definition and are dropped after decoding). Objects that do not fit
+        in the buffer are walked key by key and their skipped values are never decoded.
+
+        :param dict skipped_keys: see read_object
+        :return dict:
+        """
+        if len(self.buffer) - self.pos < self.chunk_size // 2 and not self.eof:
+            self._fill()
+        self.peek()
+        try:
+            obj, end = self._decoder.raw_decode(self.buffer, self.pos)
+        except ValueError:
+            return self.read_object(skipped_keys)
+        self.pos = end
+        _drop_keys(obj, skipped_keys)
+        return obj
+
+
+def _drop_keys(obj, skipped_keys):
+    for key, skipped in skipped_keys.items():
+        if skipped is None:
+            obj.pop(key, None)
+        elif isinstance(obj.get(key), dict):
+            _drop_keys(obj[key], skipped)
+
+
+class HarStreamReader:
+    """
+    Streaming reader of a HarFile that yields the entries of `log.entries` one at a time, without the bodies of the
+    responses. The pages of the HarFile are available in `pages` once the entries have been read.
+    """
+
+    def __init__(self, har_fp, chunk_size=64 * 1024):
+        """
+        :param har_fp: HarFile opened in text mode (binary files are decoded as UTF-8)
+        :param int chunk_size: number of characters read at once
+        """
+        self.stream = JsonStream(har_fp, chunk_size)
+        self.pages = []
+
+    def iter_entries(self):
+        """
+        :return: generator of entries (dict)
+        """
+        stream = self.stream
+        for key in stream.iter_object():
+            if key != 'log':
+                stream.skip_value()
+                continue
+            for log_key in stream.iter_object():
+                if log_key == 'entries':
+                    for _ in stream.iter_array():
+                        yield stream.read_small_object(ENTRY_SKIPPED_KEYS)
+                elif log_key == 'pages':
+                    self.pages = stream.read_value()
+                else:
+                    stream.skip_value()
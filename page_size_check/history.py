@@ -0,0 +1,213 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from prettytable import PrettyTable
+
+logger = logging.getLogger(__name__)
+
+# Metrics of a page compared between two runs, column of the pages table and label
+DIFF_METRICS = (('total_size', 'total_size (MB)'), ('num_entries', 'num_entries'),
+                ('load_time', 'total_load_time (ms)'))
+
+Run = namedtuple('Run', ['run_id', 'sitemap_domain', 'label', 'started_at', 'finished_at', 'num_pages'])
+
+# Metric of a page that grew more than the threshold since the baseline run
+PageRegression = namedtuple('PageRegression', ['page_url', 'metric', 'baseline', 'current'])
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS runs ('
+    'run_id INTEGER PRIMARY KEY, sitemap_domain TEXT, label TEXT, started_at REAL NOT NULL, finished_at REAL, '
+    'num_pages INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX IF NOT EXISTS runs_sitemap_domain ON runs (sitemap_domain, run_id)',
+    # Keyed by run and url, so the pages of a run are stored together and a diff is a join on the primary key
+    'CREATE TABLE IF NOT EXISTS pages ('
+    'run_id INTEGER NOT NULL, page_url TEXT NOT NULL, num_entries INTEGER NOT NULL, total_size REAL NOT NULL, '
+    'load_time REAL NOT NULL, finish_time REAL NOT NULL, dom_load_time REAL, '
+    'PRIMARY KEY (run_id, page_url)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS mime_types ('
+    'run_id INTEGER NOT NULL, page_url TEXT NOT NULL, mime_type TEXT NOT NULL, n_entries INTEGER NOT NULL, '
+    'total_size REAL NOT NULL, total_time REAL NOT NULL, '
+    'PRIMARY KEY (run_id, page_url, mime_type)) WITHOUT ROWID',
+)
+
+
+class HistoryStore:
+    """
+    SQLite store of the aggregates of every run: per page its number of entries, size and load times, and per page
+    and mime type the number of entries, size and time of its resources. It is a sink: once a run is started the
+    pages are recorded in it with `add`, in batches. Runs are compared with `diff`.
+    """
+
+    def __init__(self, path, batch_size=50):
+        """
+        :param str path: path of the SQLite file, created if it does not exist
+        :param int batch_size: number of pages buffered before writing them
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pages = []
+        self._mime_types = []
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+        self.run_id = None
+        self.num_pages = 0  # distinct pages of the run written to the file
+        self._sitemap_domain = None
+
+    def start_run(self, label=None):
+        """
+        Open a new run where the pages added are recorded
+
+        :param str label: name of the run (a release, a commit...)
+        :return int: run_id of the new run
+        """
+        with self._lock:
+            self.run_id = self.connection.execute('INSERT INTO runs (label, started_at) VALUES (?, ?)',
+                                                  (label, time.time())).lastrowid
+            self.connection.commit()
+        return self.run_id
+
+    def add(self, har_file_data):
+        """
+        Record the aggregates of a parsed page in the run
+
+        :param HarFileData har_file_data:
+        """
+        page_url = har_file_data.page_url
+        page = (self.run_id, page_url, har_file_data.num_entries, har_file_data.total_page_size,
+                har_file_data.load_time, har_file_data.finish_time, har_file_data.dom_content_loaded)
+        mime_types = []
+        for mime_type, indexes in har_file_data.mime_resources():
+            _, total_size, total_time = har_file_data.mime_resume(mime_type)
+            mime_types.append((self.run_id, page_url, mime_type, len(indexes), total_size, total_time))
+        with self._lock:
+            if self._sitemap_domain is None:
+                self._sitemap_domain = har_file_data.sitemap_domain
+                self.connection.execute('UPDATE runs SET sitemap_domain = ? WHERE run_id = ?',
+                                        (self._sitemap_domain, self.run_id))
+            self._pages.append(page)
+            self._mime_types.extend(mime_types)
+            if len(self._pages) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        # A page parsed twice in a run (retried after a worker was discarded...) keeps its last aggregates. The number
+        # of distinct pages is updated in the same transaction, so a run interrupted after this flush can be compared.
+        self.connection.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)', self._pages)
+        self.connection.executemany('INSERT OR REPLACE INTO mime_types VALUES (?, ?, ?, ?, ?, ?)', self._mime_types)
+        self.num_pages = self.connection.execute('SELECT COUNT(*) FROM pages WHERE run_id = ?',
+                                                 (self.run_id,)).fetchone()[0]
+        self.connection.execute('UPDATE runs SET num_pages = ? WHERE run_id = ?', (self.num_pages, self.run_id))
+        self.connection.commit()
+        self._pages = []
+        self._mime_types = []
+
+    def runs(self, sitemap_domain=None):
+        """
+        :param str sitemap_domain: only the runs of this domain, all if None
+        :return list: Run, the oldest first
+        """
+        query = 'SELECT run_id, sitemap_domain, label, started_at, finished_at, num_pages FROM runs'
+        params = ()
+        if sitemap_domain:
+            query += ' WHERE sitemap_domain = ?'
+            params = (sitemap_domain,)
+        with self._lock:
+            return [Run(*row) for row in self.connection.execute(query + ' ORDER BY run_id', params)]
+
+    def previous_run(self, run_id):
+        """
+        :param int run_id:
+        :return int: the last run before run_id of the same domain, None if there is none
+        """
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT previous.run_id FROM runs AS previous JOIN runs AS run ON run.run_id = ? '
+                'WHERE previous.sitemap_domain = run.sitemap_domain AND previous.run_id < run.run_id '
+                'AND previous.num_pages > 0 ORDER BY previous.run_id DESC LIMIT 1', (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def last_run(self):
+        """
+        :return int: the last run with pages, None if there is none
+        """
+        with self._lock:
+            row = self.connection.execute('SELECT MAX(run_id) FROM runs WHERE num_pages > 0').fetchone()
+        return row[0]
+
+    def diff(self, baseline_run, run, threshold=0.1):
+        """
+        Pages of both runs whose total size, number of entries or load time grew more than the threshold
+
+        :param int baseline_run: run_id of the baseline
+        :param int run: run_id of the run compared with the baseline
+        :param float threshold: fraction of the baseline value a metric may grow, 0.1 is 10 %
+        :return list: PageRegression, by page url and metric
+        """
+        columns = ', '.join('baseline.{0}, current.{0}'.format(column) for column, _ in DIFF_METRICS)
+        grown = ' OR '.join('current.{0} > baseline.{0} * ?'.format(column) for column, _ in DIFF_METRICS)
+        factor = 1 + threshold
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT current.page_url, {} FROM pages AS current '
+                'JOIN pages AS baseline ON baseline.run_id = ? AND baseline.page_url = current.page_url '
+                'WHERE current.run_id = ? AND ({}) ORDER BY current.page_url'.format(columns, grown),
+                (baseline_run, run) + (factor,) * len(DIFF_METRICS)).fetchall()
+        regressions = []
+        for row in rows:
+            for index, (_, metric) in enumerate(DIFF_METRICS):
+                baseline, current = row[1 + index * 2], row[2 + index * 2]
+                if current > baseline * factor:
+                    regressions.append(PageRegression(row[0], metric, baseline, current))
+        return regressions
+
+    def count_changed_pages(self, baseline_run, run):
+        """
+        :return tuple: number of pages only in the run (new) and only in the baseline (removed)
+        """
+        query = ('SELECT COUNT(*) FROM pages AS a WHERE a.run_id = ? AND NOT EXISTS '
+                 '(SELECT 1 FROM pages AS b WHERE b.run_id = ? AND b.page_url = a.page_url)')
+        with self._lock:
+            new = self.connection.execute(query, (run, baseline_run)).fetchone()[0]
+            removed = self.connection.execute(query, (baseline_run, run)).fetchone()[0]
+        return new, removed
+
+    def close(self):
+        """
+        Write the pending pages and finish the run
+        """
+        with self._lock:
+            if self.run_id is not None:
+                self._flush()
+                self.connection.execute('UPDATE runs SET finished_at = ? WHERE run_id = ?', (time.time(), self.run_id))
+                self.connection.commit()
+                logger.info("Run {} recorded in \"{}\": {} pages".format(self.run_id, self.path, self.num_pages))
+            self.connection.close()
+
+
+def print_regressions(regressions, baseline_run, run, threshold):
+    """
+    Print the pages that grew since the baseline run to the stdout in table format
+
+    :param list regressions: PageRegression
+    :param int baseline_run:
+    :param int run:
+    :param float threshold:
+    """
+    if not regressions:
+        print("No page grew more than {:.0%} between runs {} and {}".format(threshold, baseline_run, run))
+        return
+    table = PrettyTable()
+    table.field_names = ['page_url', 'metric', 'run {}'.format(baseline_run), 'run {}'.format(run), 'change (%)']
+    for regression in regressions:
+        change = (regression.current / regression.baseline - 1) * 100 if regression.baseline else float('inf')
+        table.add_row([regression.page_url, regression.metric, round(regression.baseline, 3),
+                       round(regression.current, 3), round(change, 1)])
+    print(table)
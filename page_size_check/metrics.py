@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the buckets of the phase latency histograms
+PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus format
+    """
+
+    def __init__(self, buckets=PHASE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        """
+        :return list: the _bucket, _sum and _count samples
+        """
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative))
+        lines.append('{}_sum{{{}}} {}'.format(name, labels, round(self.sum, 6)))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, self.count))
+        return lines
+
+
+class Metrics:
+    """
+    Thread-safe metrics of the crawl, updated live by the sink, the tracer and the pools and rendered in the
+    Prometheus text format. Gauges owned by other objects (the active workers of a pool...) are registered as
+    functions read on every scrape.
+    """
+
+    def __init__(self):
+        self.pages_completed = 0
+        self.pages_failed = 0
+        self.bytes_captured = 0
+        self.urls_read = 0
+        self.phases = {}
+        self.gauges = {}
+        self._completed_times = deque()
+        self._lock = threading.Lock()
+
+    def track_urls(self, url_infos):
+        """
+        Count the urls read from the sitemap as they are consumed, for the queue depth
+
+        :param url_infos: iterable of url information
+        :return: generator of the same url information
+        """
+        for url_info in url_infos:
+            with self._lock:
+                self.urls_read += 1
+            yield url_info
+
+    def page_completed(self, har_file_data):
+        now = time.monotonic()
+        with self._lock:
+            self.pages_completed += 1
+            self.bytes_captured += round(har_file_data.total_page_size * 1024 * 1024)
+            self._completed_times.append(now)
+            self._forget_completed(now)
+
+    def page_failed(self):
+        with self._lock:
+            self.pages_failed += 1
+
+    def observe_phase(self, phase, duration):
+        """
+        Observer of the tracer: add a span to the latency histogram of its phase
+        """
+        with self._lock:
+            histogram = self.phases.get(phase)
+            if histogram is None:
+                histogram = self.phases[phase] = Histogram()
+            histogram.observe(duration)
+
+    def set_gauge(self, name, help_text, function):
+        """
+        Register a gauge whose value is function(), read on every scrape
+
+        :param str name: metric name
+        :param str help_text:
+        :param function: function without arguments that returns a number
+        """
+        with self._lock:
+            self.gauges[name] = (help_text, function)
+
+    def _forget_completed(self, now):
+        while self._completed_times and self._completed_times[0] < now - 60:
+            self._completed_times.popleft()
+
+    def render(self):
+        """
+        :return str: the metrics in the Prometheus text format
+        """
+        with self._lock:
+            self._forget_completed(time.monotonic())
+            finished = self.pages_completed + self.pages_failed
+            urls_read, pages_per_minute = self.urls_read, len(self._completed_times)
+            lines = sample_lines('page_size_check_pages_completed_total', 'counter',
+                                 'Pages parsed or taken from the cache.', self.pages_completed)
+            lines += sample_lines('page_size_check_pages_failed_total', 'counter',
+                                  'Pages that failed on every attempt.', self.pages_failed)
+            lines += sample_lines('page_size_check_bytes_captured_total', 'counter',
+                                  'Bytes of the resources of the pages completed.', self.bytes_captured)
+            lines += ['# HELP page_size_check_phase_seconds Duration of the phases of the crawl.',
+                      '# TYPE page_size_check_phase_seconds histogram']
+            for phase, histogram in sorted(self.phases.items()):
+                lines += histogram.lines('page_size_check_phase_seconds', 'phase="{}"'.format(phase))
+            gauges = sorted(self.gauges.items())
+        lines += sample_lines('page_size_check_pages_per_minute', 'gauge', 'Pages completed in the last minute.',
+                              pages_per_minute)
+        # The gauge functions are called out of the lock, they may take the locks of their owners
+        values = {name: function() for name, (help_text, function) in gauges}
+        for name, (help_text, _) in gauges:
+            lines += sample_lines(name, 'gauge', help_text, values[name])
+        queue_depth = max(0, urls_read - finished - values.get('page_size_check_active_workers', 0))
+        lines += sample_lines('page_size_check_queue_depth', 'gauge',
+                              'Urls read from the sitemap that are not finished nor being loaded.', queue_depth)
+        return '\n'.join(lines) + '\n'
+
+
+def sample_lines(name, metric_type, help_text, value):
+    """
+    :return list: the HELP, TYPE and sample lines of a metric without labels
+    """
+    return ['# HELP {} {}'.format(name, help_text), '# TYPE {} {}'.format(name, metric_type),
+            '{} {}'.format(name, value)]
+
+
+class MetricsSink:
+    """
+    Sink that counts the pages completed and failed
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def add(self, har_file_data):
+        self.metrics.page_completed(har_file_data)
+
+    def add_failure(self, failure):
+        self.metrics.page_failed()
+
+    def close(self):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class MetricsServer:
+    """
+    HTTP endpoint of the metrics, served by a daemon thread
+    """
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        """
+        :param Metrics metrics:
+        :param int port: 0 to take a free port
+        :param str host: address to listen on, only local connections by default
+        """
+        self.httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.httpd.metrics = metrics
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-server')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        logger.info("Metrics served on http://{}:{}/metrics".format(*self.httpd.server_address[:2]))
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """
+    :return Metrics: the metrics of this process
+    """
+    return _metrics
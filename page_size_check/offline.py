@@ -0,0 +1,85 @@
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from urllib.parse import urlparse
+
+from page_size_check.harstream import HarStreamReader
+from page_size_check.parser import HarFileParser
+
+logger = logging.getLogger(__name__)
+
+
+def find_har_files(paths):
+    """
+    Expand the directories and glob patterns given by the user to the list of HarFiles to be parsed
+
+    :param list paths: files, directories or glob patterns
+    :return list: sorted paths of the .har files found
+    """
+    har_paths = set()
+    for path in paths:
+        if os.path.isdir(path):
+            har_paths.update(glob.glob(os.path.join(path, '**', '*.har'), recursive=True))
+        else:
+            har_paths.update(found for found in glob.glob(path, recursive=True) if os.path.isfile(found))
+    return sorted(har_paths)
+
+
+def get_har_page_url(pages, har_file_data):
+    """
+    Guess the url of the page captured in a HarFile: the title of the page when the capturing tool stores the url
+    there, the url of the first HTML document that is not a redirection or of the first request otherwise
+
+    :param list pages: pages of the HarFile
+    :param HarFileData har_file_data: data parsed from the HarFile
+    :return str:
+    """
+    title = (pages or [{}])[0].get('title', '')
+    if title.startswith(('http://', 'https://')):
+        return title
+    html_id = har_file_data.mime_types.index('text/html') if 'text/html' in har_file_data.mime_types else None
+    for index, mime_id in enumerate(har_file_data.mime_ids):
+        if mime_id == html_id and 200 <= har_file_data.statuses[index] < 300:
+            return har_file_data.urls[har_file_data.url_ids[index]]
+    return har_file_data.urls[har_file_data.url_ids[0]] if har_file_data.num_entries else title
+
+
+def parse_har_file(har_path, sitemap_url=None):
+    """
+    Parse a HarFile from disk, streaming its entries. Meant to be run on the workers of a process pool.
+
+    :param str har_path: path of the .har file
+    :param str sitemap_url: url used to name the reports, the url of the page if not given
+    :return HarFileData: parsed data or None if the file could not be parsed
+    """
+    try:
+        with open(har_path, encoding='utf-8') as har_fp:
+            reader = HarStreamReader(har_fp)
+            har_file_data = HarFileParser().parse_entries(reader.iter_entries(), lambda: reader.pages, None,
+                                                          sitemap_url or '')
+        har_file_data.page_url = get_har_page_url(reader.pages, har_file_data)
+        har_file_data.load_time  # ValueError here rather than in the reports if the HarFile has no page
+        if not sitemap_url:
+            har_file_data.sitemap_domain = urlparse(har_file_data.page_url).netloc
+        return har_file_data
+    except Exception as ex:
+        logger.error("Error parsing \"{}\": {}".format(har_path, ex))
+        return None
+
+
+def parse_har_files(har_paths, sitemap_url=None, processes=None):
+    """
+    Parse the HarFiles spread across a pool of processes
+
+    :param list har_paths: paths of the .har files
+    :param str sitemap_url: url used to name the reports
+    :param int processes: number of processes, the number of CPUs if not given
+    :return: generator of HarFileData, in the same order as har_paths and without the files that failed
+    """
+    chunksize = max(1, len(har_paths) // ((processes or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for result in executor.map(parse_har_file, har_paths, repeat(sitemap_url), chunksize=chunksize):
+            if result is not None:
+                yield result
@@ -1,112 +1,160 @@
 import logging
+import sys
+from datetime import datetime
+
 import click
-import requests
-from itertools import repeat
-from concurrent.futures import ThreadPoolExecutor
-from browsermobproxy import Server
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
-from xvfbwrapper import Xvfb
+from prettytable import PrettyTable
 
-from page_size_check.parser import HarFileParser
+from page_size_check.budget import BudgetSink, load_budgets
+from page_size_check.checkpoint import CheckpointStore
+from page_size_check.columnar import COLUMNAR_FORMATS, ColumnarSink
+from page_size_check.crawler import crawl
+from page_size_check.dedup import ResourceIndex
+from page_size_check.history import HistoryStore, print_regressions
+from page_size_check.metrics import MetricsServer, MetricsSink, get_metrics
+from page_size_check.offline import find_har_files, parse_har_files
+from page_size_check.shard import crawl_sharded
+from page_size_check.sink import CsvResultSink, MultiSink
+from page_size_check.sitemap import iter_sitemap_urls
+from page_size_check.tracing import TRACE_FORMATS, span, start_tracing
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-def start_server_display(browsermob_server_path, browsermob_server_port):
+def get_sitemap_urls(sitemap_url):
     """
-    Method to start the virtual screen where the browsers are going to be displayed and to start the Browsermob Server
-    :param browsermob_server_path: Path of the browsermob server
-    :param browsermob_server_port: Port where the browsermob server will be launched
+    Method that gets the urls to be parsed. The sitemap is streamed, so the urls are yielded as soon as they are read
+    :param sitemap_url: The url of the sitemap of the web that is going to be analized
     :return:
     """
-    logger.info("Running BrowserMob server...")
-    display = Xvfb()
-    display.start()
-
-    server = Server(path=browsermob_server_path, options={'port': browsermob_server_port})
-    server.start()
-    return display, server
+    logger.info("Getting sitemap entries for \"{}\"".format(sitemap_url))
+    if not sitemap_url:
+        return
+    num_urls = 0
+    for entry in iter_sitemap_urls(sitemap_url):
+        num_urls += 1
+        yield {
+            'page_url': entry.loc,
+            'lastmod': entry.lastmod,
+            'sitemap_url': sitemap_url,
+        }
+    logger.info("Urls parsed: {}".format(num_urls))
 
 
-def start_proxy_driver(server, firefox_driver_path):
+def skip_finished_urls(sitemap_urls, checkpoint):
     """
-    Method to start the proxy where we are going to read the HarFile and the driver to open the urls
-    :param server: Browsermob server
-    :param firefox_driver_path: Path of the geckodriver of firefox
+    Method to leave out the urls already parsed in a previous execution
+    :param sitemap_urls: Urls to be analyzed
+    :param checkpoint: CheckpointStore of the previous execution
     :return:
     """
-    proxy = server.create_proxy()
+    num_skipped = 0
+    for url_info in sitemap_urls:
+        if url_info['page_url'] in checkpoint:
+            num_skipped += 1
+            continue
+        yield url_info
+    logger.info("Urls skipped, already parsed: {}".format(num_skipped))
 
-    profile = webdriver.FirefoxProfile()
-    selenium_proxy = proxy.selenium_proxy()
-    profile.set_proxy(selenium_proxy)
-    driver = webdriver.Firefox(firefox_profile=profile, executable_path=firefox_driver_path)
 
-    return proxy, driver
+def open_sinks(generate_extra_csv, display_summary, checkpoint_path, resume, extra_sinks=()):
+    """
+    Method to create the sink where the parsed pages are written: the CSV reports, the shared resources index, the
+    extra sinks and the checkpoint if any. When resuming, the reports are rebuilt from the pages of the checkpoint.
+    :param generate_extra_csv: If true generates extra information in CSVs
+    :param display_summary: If true displays the results summary to the stdout
+    :param checkpoint_path: Path of the SQLite checkpoint, None to not record the parsed pages
+    :param resume: If true the pages of the checkpoint are kept, otherwise the checkpoint is cleared
+    :param extra_sinks: Other sinks of the pages (history, budgets...), None when they are not used
+    :return: sink and checkpoint
+    """
+    checkpoint = CheckpointStore(checkpoint_path) if checkpoint_path else None
+    csv_sink = CsvResultSink(generate_extra_csv, display_summary, append=not resume)
+    reports = MultiSink(csv_sink, ResourceIndex(display_summary) if generate_extra_csv else None, *extra_sinks)
+    if checkpoint is not None and resume:
+        for har_file_data in checkpoint.iter_results():
+            reports.add(har_file_data)
+        logger.info("Pages restored from \"{}\": {}".format(checkpoint_path, csv_sink.num_pages))
+    elif checkpoint is not None:
+        checkpoint.clear()
+    return MultiSink(reports, checkpoint), checkpoint
 
 
-def get_sitemap_urls(sitemap_url, server, firefox_driver_path):
+def open_budget(budget_path):
     """
-    Method that gets the urls to be parsed
-    :param sitemap_url: The url of the sitemap of the web that is going to be analized
-    :param server: Browsermob server
-    :param firefox_driver_path: Path of the geckodriver of firefox
-    :return:
+    Method to create the sink that checks the pages against the budget file
+    :param budget_path: Path of the JSON budget file, None to not check any budget
+    :return: BudgetSink or None
     """
-    logger.info("Getting sitemap entries for \"{}\"".format(sitemap_url))
-    if not sitemap_url:
-        return []
-    # Get the sitemap and parse it to get the urls
-    urls = []
-    sitemap_xml = requests.get(sitemap_url).text
-    soup = BeautifulSoup(sitemap_xml)
-    for loc in soup.findAll("loc"):
-        urls.append({
-            'page_url': loc.text,
-            'server': server,
-            'firefox_driver_path': firefox_driver_path,
-            'sitemap_url': sitemap_url,
-        })
-    logger.info("Urls parsed: {}".format(len(urls)))
-    return urls
+    if not budget_path:
+        return None
+    try:
+        return BudgetSink(load_budgets(budget_path))
+    except (OSError, ValueError) as ex:
+        raise click.BadParameter(str(ex), param_hint='--budget')
 
 
-def execute_parser(results, url_info):
+def open_columnar(columnar, generate_extra_csv):
     """
-    Method to load the page on the browser, get the HarFile and parse its data
-    :param results: Array where the parsed data is stored
-    :param url_info: Information of the url to be analyzed
-    :return:
+    Method to create the sink that writes the reports as Parquet or Arrow files
+    :param columnar: 'parquet' or 'arrow', None to only write the CSV reports
+    :param generate_extra_csv: If true the resources and mimetype tables are written too
+    :return: ColumnarSink or None
     """
-    page_url, server = url_info['page_url'], url_info['server']
-    firefox_driver_path, sitemap_url = url_info['firefox_driver_path'], url_info['sitemap_url']
-
-    try:
-        proxy, driver = start_proxy_driver(server, firefox_driver_path)
-        proxy.new_har()
-    except Exception as ex:
-        logger.exception(ex)
+    if not columnar:
+        return None
     try:
-        logger.info("Processing \"{}\"".format(page_url))
-        driver.get(page_url)
-    except TimeoutException:  # TODO: change with retry policy
-        driver.quit()
-        logger.error("Error processing \"{}\" url".format(page_url))
+        return ColumnarSink(columnar, generate_extra_csv=generate_extra_csv)
+    except RuntimeError as ex:
+        raise click.UsageError(str(ex))
 
-    try:
-        har_file_parser = HarFileParser()
-        har_file_data = har_file_parser.parse(proxy.har, page_url, sitemap_url, driver)
-        results.append(har_file_data)
-        logger.info("\"{}\" parsed!".format(page_url))
-    except Exception as ex:
-        logger.exception(ex)
-    driver.quit()
+
+def exit_if_over_budget(budget_sink):
+    """
+    Method to end with exit code 1 when a page exceeded its budget, so the execution fails a CI pipeline
+    :param budget_sink: BudgetSink or None
+    """
+    if budget_sink is not None and budget_sink.failed:
+        sys.exit(1)
+
+
+def serve_metrics(metrics_port, tracer, sink, sitemap_urls):
+    """
+    Method to start the metrics endpoint and feed it with the spans of the tracer, the pages of the sink and the urls
+    read from the sitemap
+    :param metrics_port: Port of the endpoint
+    :param tracer: Tracer of the crawl
+    :param sink: Sink where the parsed data is written
+    :param sitemap_urls: Urls to be analyzed
+    :return: metrics server, sink and urls that update the metrics
+    """
+    metrics = get_metrics()
+    tracer.add_observer(metrics.observe_phase)
+    server = MetricsServer(metrics, metrics_port)
+    server.start()
+    return server, MultiSink(sink, MetricsSink(metrics)), metrics.track_urls(sitemap_urls)
 
 
-@click.command()
+class DefaultGroup(click.Group):
+    """
+    Group of commands that falls back to the `run` command, so `page_size_check --sitemap_url=...` keeps working
+    """
+
+    default_command = 'run'
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args.insert(0, self.default_command)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultGroup)
+def cli():
+    pass
+
+
+@cli.command()
 @click.option('--browsermob_server_path', default='./browsermob-proxy-2.1.4/bin/browsermob-proxy',
               help='BrowserMob server path.', envvar='BROWSERMOB_SERVER_PATH')
 @click.option('--browsermob_server_port', default=8090, help='BrowserMob server port.')
@@ -116,26 +164,184 @@ def execute_parser(results, url_info):
 @click.option('--threads', default=8, help='Number of threads.')
 @click.option('--display_summary', default=True, help='If true displays the results summary to the stdout.')
 @click.option('--generate_extra_csv', default=True, help='If true generates extra information in CSVs')
+@click.option('--checkpoint', 'checkpoint_path', default=None,
+              help='SQLite file where the parsed pages are recorded to resume the execution.')
+@click.option('--resume', is_flag=True, help='Skip the pages recorded in the checkpoint and rebuild the reports.')
+@click.option('--cache', 'cache_path', default=None,
+              help='SQLite file where the parsed pages are cached and reused while they do not change.')
+@click.option('--cache_max_size', default=512, help='Maximum size in MB of the cached pages.')
+@click.option('--processes', default=1,
+              help='Number of processes, each one with its own display, BrowserMob server and --threads browsers.')
+@click.option('--engine', default='threads', type=click.Choice(['threads', 'asyncio']),
+              help='threads: a thread per browser. asyncio: all the browsers driven from one event loop.')
+@click.option('--headless', is_flag=True, help='Run Firefox in its headless mode, without starting Xvfb.')
+@click.option('--capture', default='har', type=click.Choice(['har', 'resource_timing']),
+              help='har: full HarFiles recorded by BrowserMob. resource_timing: faster, without proxy, from the '
+                   'Resource Timing API of the browser, up to 250 resources per page.')
+@click.option('--page_timeout', default=60, help='Seconds to load a page before the attempt fails.')
+@click.option('--page_deadline', default=300,
+              help='Seconds since the first attempt of a page after which it is not tried again.')
+@click.option('--retries', default=2, help='Attempts after the first one of a page that fails.')
+@click.option('--retry_backoff', default=2.0, help='Seconds to wait before the first retry, doubled on every retry.')
+@click.option('--adaptive', is_flag=True,
+              help='Grow or shrink the number of browsers, starting at --threads, with the CPU, memory and page times.')
+@click.option('--min_threads', default=1, help='Minimum number of browsers with --adaptive.')
+@click.option('--max_threads', default=None, type=int,
+              help='Maximum number of browsers with --adaptive. Twice --threads if not given.')
+@click.option('--recycle_pages', default=200, help='Pages after which a browser is restarted, 0 to never restart it.')
+@click.option('--max_browser_rss', default=0,
+              help='Resident memory in MB of a browser above which it is restarted, 0 for no limit.')
+@click.option('--trace', 'trace_path', default=None,
+              help='File where the duration of every phase of every page is written, with a summary at the end.')
+@click.option('--trace_format', default='jsonl', type=click.Choice(TRACE_FORMATS),
+              help='jsonl: one phase per line. chrome: Trace Event Format, for chrome://tracing or Perfetto.')
+@click.option('--metrics_port', default=None, type=int,
+              help='Serve live metrics of the crawl in the Prometheus format on http://127.0.0.1:PORT/metrics.')
+@click.option('--history', 'history_path', default=None,
+              help='SQLite file where the aggregates of the pages of every run are recorded, for the diff command.')
+@click.option('--run_label', default=None, help='Name of the run in the --history file (a release, a commit...).')
+@click.option('--budget', 'budget_path', default=None,
+              help='JSON file with limits of the pages. If any page exceeds them the exit code is 1.')
+@click.option('--columnar', default=None, type=click.Choice(COLUMNAR_FORMATS),
+              help='Write the reports as Parquet or Arrow files too. Needs pyarrow.')
 def run(sitemap_url, browsermob_server_path, browsermob_server_port, firefox_driver_path, threads,
-        display_summary, generate_extra_csv):
-    display, server = start_server_display(browsermob_server_path, browsermob_server_port)
-    sitemap_urls = get_sitemap_urls(sitemap_url, server, firefox_driver_path)
-    results = []
+        display_summary, generate_extra_csv, checkpoint_path, resume, cache_path, cache_max_size, processes, engine,
+        headless, capture, page_timeout, page_deadline, retries, retry_backoff, adaptive, min_threads, max_threads,
+        recycle_pages, max_browser_rss, trace_path, trace_format, metrics_port, history_path, run_label,
+        budget_path, columnar):
+    """
+    Load the pages of a sitemap in Firefox and parse their HarFiles
+    """
+    if resume and not checkpoint_path:
+        raise click.UsageError("--resume needs a --checkpoint file")
+    options = {
+        'browsermob_server_path': browsermob_server_path,
+        'browsermob_server_port': browsermob_server_port,
+        'firefox_driver_path': firefox_driver_path,
+        'threads': threads,
+        'cache_path': cache_path,
+        'cache_max_size': cache_max_size,
+        'engine': engine,
+        'headless': headless,
+        'capture': capture,
+        'page_timeout': page_timeout,
+        'page_deadline': page_deadline,
+        'retries': retries,
+        'retry_backoff': retry_backoff,
+        'adaptive': adaptive,
+        'min_threads': min_threads,
+        'max_threads': max_threads,
+        'recycle_pages': recycle_pages,
+        'max_browser_rss': max_browser_rss,
+        'trace_path': trace_path,
+        'trace_format': trace_format,
+    }
+    tracer = start_tracing(trace_path, trace_format)
+    budget_sink = open_budget(budget_path)
+    columnar_sink = open_columnar(columnar, generate_extra_csv)
+    history = None
+    if history_path:
+        history = HistoryStore(history_path)
+        logger.info("Recording run {} in \"{}\"".format(history.start_run(run_label), history_path))
+    sink, checkpoint = open_sinks(generate_extra_csv, display_summary, checkpoint_path, resume,
+                                  (columnar_sink, history, budget_sink))
+    sitemap_urls = get_sitemap_urls(sitemap_url)
+    if checkpoint is not None and resume:
+        sitemap_urls = skip_finished_urls(sitemap_urls, checkpoint)
+    metrics_server = None
+    if metrics_port:
+        metrics_server, sink, sitemap_urls = serve_metrics(metrics_port, tracer, sink, sitemap_urls)
     try:
-        with ThreadPoolExecutor(max_workers=threads) as executor:
-            executor.map(execute_parser, repeat(results), sitemap_urls)
-        logger.info("URLs processed: {}".format(len(results)))
-        if results:
-            har_file_parser = HarFileParser()
-            har_file_parser.get_summary(results, display_summary)
-            if generate_extra_csv:
-                har_file_parser.resources_to_csv(results)
-                har_file_parser.mimetype_resources_to_csv(results)
+        with span('crawl'):
+            if processes > 1:
+                crawl_sharded(sink, sitemap_urls, processes, options)
+            else:
+                crawl(sink, sitemap_urls, options)
     except KeyboardInterrupt:
-        logger.info("Stopping BrowserMob server...")
-        server.stop()
-        display.stop()
+        logger.info("Interrupted, stopping...")
+    finally:
+        with span('reports_close'):
+            sink.close()
+        tracer.close()
+        if metrics_server:
+            metrics_server.stop()
+    exit_if_over_budget(budget_sink)
+
+
+@cli.command('parse_har')
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--sitemap_url', help='Url used to name the reports. The url of the first page if not given.')
+@click.option('--processes', default=None, type=int, help='Number of processes. The number of CPUs if not given.')
+@click.option('--display_summary', default=True, help='If true displays the results summary to the stdout.')
+@click.option('--generate_extra_csv', default=True, help='If true generates extra information in CSVs')
+@click.option('--budget', 'budget_path', default=None,
+              help='JSON file with limits of the pages. If any page exceeds them the exit code is 1.')
+@click.option('--columnar', default=None, type=click.Choice(COLUMNAR_FORMATS),
+              help='Write the reports as Parquet or Arrow files too. Needs pyarrow.')
+def parse_har(paths, sitemap_url, processes, display_summary, generate_extra_csv, budget_path, columnar):
+    """
+    Parse HarFiles already captured (files, directories or glob patterns) without opening any browser
+    """
+    budget_sink = open_budget(budget_path)
+    columnar_sink = open_columnar(columnar, generate_extra_csv)
+    har_paths = find_har_files(paths)
+    logger.info("HarFiles found: {}".format(len(har_paths)))
+    sink = MultiSink(CsvResultSink(generate_extra_csv, display_summary),
+                     ResourceIndex(display_summary) if generate_extra_csv else None, columnar_sink, budget_sink)
+    try:
+        for har_file_data in parse_har_files(har_paths, sitemap_url, processes):
+            try:
+                sink.add(har_file_data)
+            except Exception as ex:
+                logger.error("Error writing \"{}\" to the reports, skipped: {}".format(har_file_data.page_url, ex))
+    finally:
+        sink.close()
+    exit_if_over_budget(budget_sink)
+
+
+@cli.command()
+@click.option('--history', 'history_path', required=True, help='SQLite file of the runs, recorded by run --history.')
+@click.option('--domain', default=None, help='Only the runs of this sitemap domain.')
+def runs(history_path, domain):
+    """
+    List the runs recorded in a history file
+    """
+    history = HistoryStore(history_path)
+    table = PrettyTable()
+    table.field_names = ['run', 'domain', 'label', 'started', 'pages']
+    try:
+        for recorded_run in history.runs(domain):
+            started = datetime.fromtimestamp(recorded_run.started_at).strftime('%Y-%m-%d %H:%M')
+            table.add_row([recorded_run.run_id, recorded_run.sitemap_domain, recorded_run.label or '', started,
+                           recorded_run.num_pages])
+    finally:
+        history.close()
+    print(table)
+
+
+@cli.command()
+@click.option('--history', 'history_path', required=True, help='SQLite file of the runs, recorded by run --history.')
+@click.option('--baseline', default=None, type=int, help='Run to compare with. The run before --run if not given.')
+@click.option('--run', 'run_id', default=None, type=int, help='Run to check. The last run if not given.')
+@click.option('--threshold', default=0.1,
+              help='Fraction a metric of a page may grow over the baseline before it is reported, 0.1 is 10 %.')
+def diff(history_path, baseline, run_id, threshold):
+    """
+    Show the pages whose total size, number of requests or load time grew since a baseline run
+    """
+    history = HistoryStore(history_path)
+    try:
+        run_id = run_id or history.last_run()
+        baseline = baseline or (history.previous_run(run_id) if run_id else None)
+        if run_id is None or baseline is None:
+            raise click.UsageError("There are not two runs to compare in \"{}\"".format(history_path))
+        regressions = history.diff(baseline, run_id, threshold)
+        new, removed = history.count_changed_pages(baseline, run_id)
+    finally:
+        history.close()
+    logger.info("Pages new in run {}: {}, removed since run {}: {}".format(run_id, new, baseline, removed))
+    print_regressions(regressions, baseline, run_id, threshold)
 
 
 if __name__ == '__main__':
-    run()
+    cli()
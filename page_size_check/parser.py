@@ -1,44 +1,303 @@
+import calendar
 import csv
-from datetime import datetime, timedelta
-from haralyzer import HarPage
+import re
+import sys
+from array import array
+from time import gmtime, strftime
 from urllib.parse import urlparse
 from prettytable import from_csv, PrettyTable
 
+from page_size_check.harstream import HarStreamReader
+from page_size_check.stats import PageStatistics
+from page_size_check.tracing import span
+
+ISO_DATETIME_RE = re.compile(r'(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2})'  # minute
+                             r'(?::(\d{2})(?:[.,](\d+))?)?'  # seconds and fraction
+                             r'\s*(Z|[+-]\d{2}(?::?\d{2})?)?$')  # offset
+# Epoch ms of the minutes and offsets already seen. HarFiles are captured in a few minutes, so they stay small
+_MINUTES_MS = {}
+_OFFSETS_MS = {'Z': 0, None: 0}
+
+
+def _minute_to_epoch_ms(minute):
+    """
+    Epoch ms of a 'YYYY-MM-DDTHH:MM' string in UTC
+    """
+    minute_ms = _MINUTES_MS.get(minute)
+    if minute_ms is None:
+        if len(_MINUTES_MS) > 4096:
+            _MINUTES_MS.clear()
+        minute_ms = calendar.timegm((int(minute[0:4]), int(minute[5:7]), int(minute[8:10]), int(minute[11:13]),
+                                     int(minute[14:16]), 0, 0, 0, 0)) * 1000
+        _MINUTES_MS[minute] = minute_ms
+    return minute_ms
+
+
+def _offset_to_ms(offset):
+    """
+    Milliseconds of a '+HH:MM', '-HHMM', '+HH' or 'Z' UTC offset
+    """
+    offset_ms = _OFFSETS_MS.get(offset)
+    if offset_ms is None:
+        digits = offset[1:].replace(':', '')
+        offset_ms = (int(digits[:2]) * 60 + int(digits[2:4] or 0)) * 60000
+        if offset[0] == '-':
+            offset_ms = -offset_ms
+        _OFFSETS_MS[offset] = offset_ms
+    return offset_ms
+
+
+def iso_to_epoch_ms(value):
+    """
+    Convert an ISO 8601 datetime of the HarFile ('2018-10-18T17:16:16.219+02:00') to UTC epoch milliseconds.
+    Datetimes without offset are taken as UTC.
+
+    :param str value:
+    :return int:
+    """
+    if len(value) == 29 and value[19] == '.' and value[23] in '+-':
+        # Fast path for the format written by BrowserMob and Firefox: 'YYYY-MM-DDTHH:MM:SS.mmm+HH:MM'
+        return (_minute_to_epoch_ms(value[:16]) - _offset_to_ms(value[23:]) + int(value[17:19]) * 1000 +
+                int(value[20:23]))
+    match = ISO_DATETIME_RE.match(value)
+    if match is None:
+        raise ValueError("Invalid ISO 8601 datetime: \"{}\"".format(value))
+    minute, seconds, fraction, offset = match.groups()
+    epoch_ms = _minute_to_epoch_ms(minute) - _offset_to_ms(offset)
+    if seconds:
+        epoch_ms += int(seconds) * 1000
+    if fraction:
+        epoch_ms += int(fraction[:3].ljust(3, '0'))
+    return epoch_ms
+
+
+def epoch_ms_to_iso(epoch_ms):
+    """
+    Convert UTC epoch milliseconds to an ISO 8601 datetime in the format of the HarFile, the inverse of
+    iso_to_epoch_ms ('2018-10-18T15:16:16.219+00:00')
+
+    :param float epoch_ms:
+    :return str:
+    """
+    seconds, milliseconds = divmod(int(epoch_ms), 1000)
+    return '{}.{:03d}+00:00'.format(strftime('%Y-%m-%dT%H:%M:%S', gmtime(seconds)), milliseconds)
+
+
+def _number(value):
+    """
+    Times are stored as floats, give them back as int when they have no decimals as they were in the HarFile
+    """
+    return int(value) if value.is_integer() else value
+
+
+def _round_timing(value):
+    """
+    Page timing for the CSV, empty when it is not available
+    """
+    return round(value, 1) if value is not None else None
+
+
+def get_timeline_length(intervals):
+    """
+    Number of milliseconds where at least one of the resources was loading, the same value that haralyzer's
+    HarPage.get_load_time() computes, without building a key per millisecond
+
+    :param list intervals: (start, time) of the resources in ms, every resource takes at least 1 ms
+    :return int:
+    """
+    length = 0
+    current_start = current_end = None
+    for start, time in sorted(intervals):
+        end = start + max(int(time), 1)
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                length += current_end - current_start
+            current_start, current_end = start, end
+        elif end > current_end:
+            current_end = end
+    if current_end is not None:
+        length += current_end - current_start
+    return length
+
 
 class HarFileData:
     """
     Data Structure of the information extracted from the HarFile
+
+    The resources are kept in typed arrays (one item per resource) instead of a dict per resource. Urls and mime types
+    are stored once per page in the `urls` and `mime_types` tables and referenced by id.
     """
-    page_url = ""
-    log_entries = []
-    har_page = None
-    lower_datetime = None
-    higher_datetime = None
-    sitemap_domain = ""
-    entries_resume = {}
-    total_page_size = 0
-    dom_content_loaded = 0
+    __slots__ = ('page_url', 'sitemap_domain', 'lower_timestamp', 'higher_timestamp', 'total_page_size',
+                 'dom_content_loaded', 'ttfb', 'dns_time', 'connect_time', 'tls_time', 'onload_time', 'first_paint',
+                 'first_contentful_paint', 'largest_contentful_paint', '_load_time', 'urls', 'mime_types',
+                 '_url_ids_by_url', '_mime_ids_by_type', 'url_ids', 'mime_ids', 'statuses', 'times', 'body_sizes',
+                 'headers_sizes', 'mime_counts', 'mime_total_sizes', 'mime_total_times')
+    _LOOKUP_SLOTS = ('_url_ids_by_url', '_mime_ids_by_type')
+
+    def __init__(self):
+        self.page_url = ""
+        self.sitemap_domain = ""
+        self.lower_timestamp = None  # epoch ms of the first entry
+        self.higher_timestamp = None  # epoch ms of the last entry
+        self.total_page_size = 0
+        self.dom_content_loaded = 0
+        # Page timings read from the browser (see PAGE_TIMING_SCRIPT), float ms or None when they are not available
+        self.ttfb = None  # since the navigation start
+        self.dns_time = None  # duration
+        self.connect_time = None  # duration, TLS included
+        self.tls_time = None  # duration
+        self.onload_time = None  # since the navigation start
+        self.first_paint = None  # since the navigation start
+        self.first_contentful_paint = None  # since the navigation start
+        self.largest_contentful_paint = None  # since the navigation start
+        self._load_time = None
+        self.urls = []
+        self.mime_types = []
+        self._url_ids_by_url = {}
+        self._mime_ids_by_type = {}
+        self.url_ids = array('I')
+        self.mime_ids = array('H')
+        self.statuses = array('H')
+        self.times = array('d')  # time in ms
+        self.body_sizes = array('d')  # size in bytes
+        self.headers_sizes = array('d')  # size in bytes
+        self.mime_counts = array('I')  # number of resources
+        self.mime_total_sizes = array('d')  # size in KB
+        self.mime_total_times = array('d')  # time in ms
+
+    def __getstate__(self):
+        # The lookup dicts of the tables are not pickled, they are rebuilt from the tables
+        return {slot: getattr(self, slot) for slot in self.__slots__ if slot not in self._LOOKUP_SLOTS}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self._url_ids_by_url = {url: url_id for url_id, url in enumerate(self.urls)}
+        self._mime_ids_by_type = {mime_type: mime_id for mime_id, mime_type in enumerate(self.mime_types)}
+
+    def _intern(self, table, ids_by_value, value):
+        value_id = ids_by_value.get(value)
+        if value_id is None:
+            value_id = ids_by_value[value] = len(table)
+            table.append(sys.intern(value))
+        return value_id
+
+    def set_page_timings(self, timings):
+        """
+        Set the page timings collected by PAGE_TIMING_SCRIPT
+
+        :param dict timings: ms by field of PAGE_TIMING_FIELDS, None for the ones not available
+        """
+        for field in PAGE_TIMING_FIELDS:
+            value = timings.get(field)
+            setattr(self, field, float(value) if value is not None else None)
+        if self.dom_content_loaded is None:
+            self.dom_content_loaded = 0
+
+    def add_entry(self, url, mime_type, status, time, body_size, headers_size):
+        """
+        Add a resource of the page
+
+        :param str url:
+        :param str mime_type: mime type without parameters
+        :param int status: status code of the response
+        :param float time: time in ms
+        :param int body_size: size in bytes
+        :param int headers_size: size in bytes
+        :return float: size of the resource in KB
+        """
+        mime_id = self._intern(self.mime_types, self._mime_ids_by_type, mime_type)
+        if mime_id == len(self.mime_total_sizes):
+            self.mime_counts.append(0)
+            self.mime_total_sizes.append(0)
+            self.mime_total_times.append(0)
+        self.url_ids.append(self._intern(self.urls, self._url_ids_by_url, url))
+        self.mime_ids.append(mime_id)
+        self.statuses.append(status)
+        self.times.append(time)
+        self.body_sizes.append(body_size)
+        self.headers_sizes.append(headers_size)
+        total_size = body_size / 1024 + headers_size / 1024  # size in KB
+        self.mime_counts[mime_id] += 1
+        self.mime_total_sizes[mime_id] += total_size
+        self.mime_total_times[mime_id] += time
+        return total_size
+
+    def resource_size(self, index):
+        """
+        Size of a resource (body and headers) in KB
+        """
+        return self.body_sizes[index] / 1024 + self.headers_sizes[index] / 1024
+
+    def mime_resources(self):
+        """
+        Indexes of the resources grouped by mime type, in the order the mime types were found
+
+        :return: list of (mime_type, list of indexes)
+        """
+        groups = [[] for _ in self.mime_types]
+        for index, mime_id in enumerate(self.mime_ids):
+            groups[mime_id].append(index)
+        return list(zip(self.mime_types, groups))
+
+    def mime_resume(self, mime_type):
+        """
+        Aggregation of the resources of a mime type
+
+        :param str mime_type:
+        :return tuple: number of entries, total size in KB and total time in ms, zeros if there is no such resource
+        """
+        mime_id = self._mime_ids_by_type.get(mime_type)
+        if mime_id is None:
+            return 0, 0.0, 0
+        return (self.mime_counts[mime_id], self.mime_total_sizes[mime_id],
+                _number(self.mime_total_times[mime_id]))
+
+    @property
+    def entries_resume(self):
+        """
+        Resources grouped by mime type with their aggregated size and time, built from the arrays for compatibility
+        """
+        entries_resume = {}
+        for mime_id, (mime_type, indexes) in enumerate(self.mime_resources()):
+            entries_resume[mime_type] = {
+                'entries': [{
+                    'url': self.urls[self.url_ids[index]],
+                    'time': _number(self.times[index]),
+                    'status': self.statuses[index],
+                    'body_size': self.body_sizes[index] / 1024,
+                    'headers_size': self.headers_sizes[index] / 1024,
+                    'total_size': self.resource_size(index),
+                } for index in indexes],
+                'total_size': self.mime_total_sizes[mime_id],
+                'total_time': _number(self.mime_total_times[mime_id]),
+            }
+        return entries_resume
 
     @property
     def num_entries(self):
         """
         Provides the number of entries on the HarFile
         """
-        return len(self.log_entries)
+        return len(self.times)
 
     @property
     def finish_time(self):
         """
         Time between the first and the last entry of the page
         """
-        return (self.higher_datetime-self.lower_datetime).total_seconds() * 1000
+        if self.lower_timestamp is None:
+            return 0.0
+        return float(self.higher_timestamp - self.lower_timestamp)
 
     @property
     def load_time(self):
         """
         T​ime that takes to download and display the entire content of a web page in the browser window
         """
-        return self.har_page.get_load_time()
+        if self._load_time is None:
+            raise ValueError("The HarFile of \"{}\" has no page to compute its load time".format(self.page_url))
+        return self._load_time
 
 
 class HarFileParser:
@@ -46,24 +305,16 @@ class HarFileParser:
     Parser of the HarFile
     """
 
-    def _pre_parse(self, har_file_data, har_file, page_url, sitemap_url):
+    def _pre_parse(self, har_file_data, page_url, sitemap_url):
         """
         Prepare the data to be parsed
 
         :param HarFileData har_file_data:
-        :param dict har_file:
         :param str page_url:
         :param str sitemap_url:
         :return:
         """
         har_file_data.page_url = page_url
-        if har_file['log']['entries']:
-            har_file_data.log_entries = har_file['log']['entries']
-        page_id = har_file['log']['pages'][0].get('id')
-        if page_id:
-            har_file_data.har_page = HarPage(page_id, har_data=har_file)
-        har_file_data.lower_datetime = datetime.now() + timedelta(hours=1)
-        har_file_data.higher_datetime = datetime.now() - timedelta(hours=1)
         har_file_data.sitemap_domain = urlparse(sitemap_url).netloc
 
     def parse(self, har_file, page_url, sitemap_url, driver=None):
@@ -76,113 +327,171 @@ class HarFileParser:
         :param webdriver.Firefox driver:
         :return HarFileData:
         """
+        return self.parse_entries(har_file['log']['entries'], lambda: har_file['log']['pages'], page_url,
+                                  sitemap_url, driver)
+
+    def parse_stream(self, har_fp, page_url, sitemap_url, driver=None):
+        """
+        Parse a HarFile reading its entries one at a time from a file, without loading the whole document nor the
+        bodies of the responses
+
+        :param har_fp: HarFile opened in text mode
+        :param str page_url:
+        :param str sitemap_url:
+        :param webdriver.Firefox driver:
+        :return HarFileData:
+        """
+        reader = HarStreamReader(har_fp)
+        return self.parse_entries(reader.iter_entries(), lambda: reader.pages, page_url, sitemap_url, driver)
+
+    def parse_entries(self, entries, get_pages, page_url, sitemap_url, driver=None):
+        """
+        Parse the entries of a HarFile to a HarFileData structure
+
+        :param entries: iterable of the entries of the HarFile
+        :param get_pages: function that returns the pages of the HarFile, called once the entries have been read
+        :param str page_url:
+        :param str sitemap_url:
+        :param webdriver.Firefox driver:
+        :return HarFileData:
+        """
         har_file_data = HarFileData()
-        self._pre_parse(har_file_data, har_file, page_url, sitemap_url)
-        entries_resume = {}
+        self._pre_parse(har_file_data, page_url, sitemap_url)
+        intervals_by_page = {}
         total_page_size = 0
 
-        for entry in har_file_data.log_entries:
+        for entry in entries:
             mime_type = entry['response']['content']['mimeType'].split(";")[0]
+            started_timestamp = iso_to_epoch_ms(entry['startedDateTime'])
+            if har_file_data.lower_timestamp is None or started_timestamp < har_file_data.lower_timestamp:
+                har_file_data.lower_timestamp = started_timestamp
+            if har_file_data.higher_timestamp is None or started_timestamp > har_file_data.higher_timestamp:
+                har_file_data.higher_timestamp = started_timestamp
+            # The pages may come after the entries, so the intervals of every page are kept for the load time
+            intervals_by_page.setdefault(entry.get('pageref'), []).append((started_timestamp, entry['time']))
 
-            if mime_type not in entries_resume:
-                entries_resume[mime_type] = {}
-                entries_resume[mime_type]['entries'] = []
-                entries_resume[mime_type]['total_size'] = 0
-                entries_resume[mime_type]['total_time'] = 0
-            started_date_time = datetime.strptime(entry['startedDateTime'].rsplit("+", 1)[0], "%Y-%m-%dT%H:%M:%S.%f")
-
-            if started_date_time < har_file_data.lower_datetime:
-                har_file_data.lower_datetime = started_date_time
-            if started_date_time > har_file_data.higher_datetime:
-                har_file_data.higher_datetime = started_date_time
-
-            entry_info = {
-                'url': entry['request']['url'],
-                'time': entry['time'],  # time in ms
-                'status': entry['response']['status'],
-                'body_size': entry['response']['bodySize'] / 1024,  # size in KB
-                'headers_size': entry['response']['headersSize'] / 1024,  # size in KB
-            }
-            entry_info['total_size'] = entry_info['body_size'] + entry_info['headers_size']
-
-            # entries aggregation
-            entries_resume[mime_type]['entries'].append(entry_info)
-            entries_resume[mime_type]['total_size'] += entry_info['total_size']  # size in MB
-            entries_resume[mime_type]['total_time'] += entry_info['time']  # time in ms
             # More detailed times can be included:
             # blocked', 'ssl', 'connect', 'receive', 'send', 'comment', 'wait', 'dns'
-            total_page_size += entry_info['total_size']
-        har_file_data.entries_resume = entries_resume
+            total_page_size += har_file_data.add_entry(
+                entry['request']['url'], mime_type, entry['response']['status'], entry['time'],  # time in ms
+                entry['response']['bodySize'], entry['response']['headersSize'])
+        page_id = get_pages()[0].get('id')
+        if page_id:
+            har_file_data._load_time = get_timeline_length(intervals_by_page.get(page_id, []))
         har_file_data.total_page_size = total_page_size / 1024  # size in MB
         if driver:
-            har_file_data.dom_content_loaded = self._get_dom_content_loaded_time(driver)
+            with span('page_timings', page_url):
+                har_file_data.set_page_timings(self._get_page_timings(driver))
         return har_file_data
 
-    def _get_dom_content_loaded_time(self, driver):
+    def _get_page_timings(self, driver):
         """
-        Method to get the dom content loaded time using JS at the browser
+        Method to get the navigation and paint timings of the page using JS at the browser, in one call
         :param driver: Browser which the webpage that is beig analized
-        :return:
+        :return: dict with the fields of PAGE_TIMING_FIELDS
         """
-        script = 'return window.performance.timing.domContentLoadedEventStart' \
-                 ' - window.performance.timing.navigationStart;'
-        return driver.execute_script(script)
+        return driver.execute_async_script(PAGE_TIMING_SCRIPT)
 
     @staticmethod
-    def mimetype_resources_to_csv(results):
+    def mimetype_rows(result):
+        """
+        Rows of the mimetype resources CSV for a page
+
+        :param HarFileData result:
+        :return: generator of dict
+        """
+        total_page_size = round(result.mime_resume('text/html')[1], 3)
+        for mime_type, indexes in result.mime_resources():
+            n_entries, total_size, total_time = result.mime_resume(mime_type)
+
+            average_size = round(total_size/n_entries, 3)
+            average_time = round(total_time/n_entries, 3)
+            # Empty when the page has no HTML document to compare with
+            percentage_size = round((total_size/total_page_size) * 100, 3) if total_page_size else None
+            yield {
+                'page_url': result.page_url,
+                'mime_type': mime_type,
+                'n_entries': n_entries,
+                'total_size': round(total_size, 3),
+                'average_size': average_size,
+                'percentage_size': percentage_size,
+                'total_time': total_time,
+                'average_time': average_time
+            }
+
+    @staticmethod
+    def resource_rows(result):
+        """
+        Rows of the resources list CSV for a page
+
+        :param HarFileData result:
+        :return: generator of dict
+        """
+        for mime_type, indexes in result.mime_resources():
+            for index in indexes:
+                yield {
+                    'page_url': result.page_url,
+                    'mime_type': mime_type,
+                    'resource_url': result.urls[result.url_ids[index]],
+                    'size': round(result.resource_size(index), 3),
+                    'time': round(_number(result.times[index]), 3)
+                }
+
+    @staticmethod
+    def summary_row(result):
+        """
+        Row of the resume urls CSV for a page
+
+        :param HarFileData result:
+        :return dict:
+        """
+        _, html_size, html_time = result.mime_resume('text/html')
+        return {
+            'page_url': result.page_url,
+            'num_entries': result.num_entries,
+            'page_size (KB)': round(html_size, 3),
+            'page_load_time (ms)': html_time,
+            'total_size (MB)': round(result.total_page_size, 3),
+            'total_load_time (ms)': result.load_time,
+            'finish_time (ms)': result.finish_time,
+            'dom_load_time (ms)': result.dom_content_loaded,
+            'ttfb (ms)': _round_timing(result.ttfb),
+            'dns_time (ms)': _round_timing(result.dns_time),
+            'connect_time (ms)': _round_timing(result.connect_time),
+            'tls_time (ms)': _round_timing(result.tls_time),
+            'onload_time (ms)': _round_timing(result.onload_time),
+            'first_paint (ms)': _round_timing(result.first_paint),
+            'first_contentful_paint (ms)': _round_timing(result.first_contentful_paint),
+            'largest_contentful_paint (ms)': _round_timing(result.largest_contentful_paint),
+        }
+
+    @classmethod
+    def mimetype_resources_to_csv(cls, results):
         """
         Generate a CSV with a resume of the resources by mimetype used by the webpage
 
         :param list results: list of HarFileData
         """
-        file_path = '{}-mimetype-resources.csv'.format(results[0].sitemap_domain)
+        file_path = MIMETYPE_FILE_PATH.format(results[0].sitemap_domain)
         with open(file_path, 'a+', newline='') as csv_file:
-            field_names = ['page_url', 'mime_type', 'n_entries', 'total_size', 'average_size', 'percentage_size',
-                           'total_time', 'average_time']
-            writer = csv.DictWriter(csv_file, fieldnames=field_names)
-            writer.writeheader()
-
+            writer = csv.DictWriter(csv_file, fieldnames=MIMETYPE_FIELD_NAMES)
+            write_header_if_empty(csv_file, writer)
             for result in results:
-                for mime_type, entries in result.entries_resume.items():
-                    total_page_size = round(result.entries_resume['text/html']['total_size'], 3)
-
-                    average_size = round(entries['total_size']/len(entries['entries']), 3)
-                    average_time = round(entries['total_time']/len(entries['entries']), 3)
-                    percentage_size = round((entries['total_size']/total_page_size) * 100, 3)
-                    writer.writerow({
-                        'page_url': result.page_url,
-                        'mime_type': mime_type,
-                        'n_entries': len(entries['entries']),
-                        'total_size': round(entries['total_size'], 3),
-                        'average_size': average_size,
-                        'percentage_size': percentage_size,
-                        'total_time': entries['total_time'],
-                        'average_time': average_time
-                    })
+                writer.writerows(cls.mimetype_rows(result))
 
-    @staticmethod
-    def resources_to_csv(results):
+    @classmethod
+    def resources_to_csv(cls, results):
         """
         Generate a CSV with a list of the resources used by the webpage
 
         :param list results: list of HarFileData
         """
-        file_path = '{}-resources-list.csv'.format(results[0].sitemap_domain)
+        file_path = RESOURCES_FILE_PATH.format(results[0].sitemap_domain)
         with open(file_path, 'a+', newline='') as csv_file:
-            field_names = ['page_url', 'resource_url', 'mime_type', 'size', 'time']
-            writer = csv.DictWriter(csv_file, fieldnames=field_names)
-            writer.writeheader()
-
+            writer = csv.DictWriter(csv_file, fieldnames=RESOURCES_FIELD_NAMES)
+            write_header_if_empty(csv_file, writer)
             for result in results:
-                for mime_type, entries in result.entries_resume.items():
-                    for entry in entries['entries']:
-                        writer.writerow({
-                            'page_url': result.page_url,
-                            'mime_type': mime_type,
-                            'resource_url': entry['url'],
-                            'size': round(entry['total_size'], 3),
-                            'time': round(entry['time'], 3)}
-                        )
+                writer.writerows(cls.resource_rows(result))
 
     def get_summary(self, results, display_summary):
         """
@@ -192,47 +501,140 @@ class HarFileParser:
         :param list results: list of HarFileData
         :param bool display_summary: If true displays the results summary to the stdout
         """
-        file_path = '{}-resume-urls.csv'.format(results[0].sitemap_domain)
+        file_path = SUMMARY_FILE_PATH.format(results[0].sitemap_domain)
+        totals = SummaryTotals()
+        statistics = PageStatistics()
         with open(file_path, 'w') as csv_file:
-            # Prepare CSV file
-            field_names = ['page_url', 'num_entries', 'page_size (KB)', 'page_load_time (ms)',
-                           'total_size (MB)', 'total_load_time (ms)', 'finish_time (ms)', 'dom_load_time (ms)']
-            writer = csv.DictWriter(csv_file, fieldnames=field_names)
+            writer = csv.DictWriter(csv_file, fieldnames=SUMMARY_FIELD_NAMES)
             writer.writeheader()
-
-            # Totals
-            page_size_sum = 0
-            page_load_time_avg = 0
-            total_size_sum = 0
-            total_load_time_avg = 0
             for result in results:
-                page_size = round(result.entries_resume['text/html']['total_size'], 3)
-                writer.writerow({
-                    'page_url': result.page_url,
-                    'num_entries': result.num_entries,
-                    'page_size (KB)': page_size,
-                    'page_load_time (ms)': result.entries_resume['text/html']['total_time'],
-                    'total_size (MB)': round(result.total_page_size, 3),
-                    'total_load_time (ms)': result.load_time,
-                    'finish_time (ms)': result.finish_time,
-                    'dom_load_time (ms)': result.dom_content_loaded,
-                })
-                page_size_sum += page_size
-                page_load_time_avg += result.entries_resume['text/html']['total_time']
-                total_size_sum += round(result.total_page_size, 3)
-                total_load_time_avg += result.load_time
-            page_size_sum = round(page_size_sum, 3)
-            page_load_time_avg = round(page_load_time_avg / len(results), 3)
-            total_load_time_avg = round(total_load_time_avg / len(results), 3)
+                row = self.summary_row(result)
+                writer.writerow(row)
+                totals.add(row)
+                statistics.add(result)
         if display_summary:
-            # Print the CSV in table format (prettytables don't allow the use of sys.stdout.write)
-            with open(file_path, 'r') as csv_file:
-                summary_table = from_csv(csv_file, delimiter=',')
-                print(summary_table)
-
-            # Print the totals in table format
-            totals_table = PrettyTable()
-            totals_table.field_names = ["page_size_sum (KB)", "page_load_time_avg (ms)", "total_size_sum (MB)",
-                                        "total_load_time_avg (ms)"]
-            totals_table.add_row([page_size_sum, page_load_time_avg, total_size_sum, total_load_time_avg])
-            print(totals_table)
+            print_summary(file_path, totals, statistics)
+
+
+# Navigation and paint timings of the page in ms, collected in one WebDriver call. It is an async script because the
+# largest contentful paint is only given to a PerformanceObserver; the buffered entries arrive right away, the timeout
+# covers the browsers without it. Paint times are relative to the navigation start like the navigation ones. When a
+# resourceTiming function is defined before it (see PAGE_RESOURCE_TIMING_SCRIPT) its result is added as
+# 'resource_timing'.
+PAGE_TIMING_SCRIPT = '''
+var done = arguments[arguments.length - 1];
+var timing = window.performance.timing;
+function since(value) { return value > 0 ? value - timing.navigationStart : null; }
+function duration(start, end) { return start > 0 && end >= start ? end - start : null; }
+var timings = {
+    ttfb: since(timing.responseStart),
+    dns_time: duration(timing.domainLookupStart, timing.domainLookupEnd),
+    connect_time: duration(timing.connectStart, timing.connectEnd),
+    tls_time: duration(timing.secureConnectionStart, timing.connectEnd),
+    dom_content_loaded: since(timing.domContentLoadedEventStart),
+    onload_time: since(timing.loadEventStart),
+    first_paint: since(timing.timeToNonBlankPaint || 0),
+    first_contentful_paint: null,
+    largest_contentful_paint: null
+};
+window.performance.getEntriesByType('paint').forEach(function (entry) {
+    if (entry.name === 'first-paint') { timings.first_paint = entry.startTime; }
+    if (entry.name === 'first-contentful-paint') { timings.first_contentful_paint = entry.startTime; }
+});
+var finished = false;
+function finish() {
+    if (finished) { return; }
+    finished = true;
+    if (typeof resourceTiming === 'function') { timings.resource_timing = resourceTiming(); }
+    done(timings);
+}
+try {
+    new PerformanceObserver(function (list) {
+        var entries = list.getEntries();
+        if (entries.length) { timings.largest_contentful_paint = entries[entries.length - 1].startTime; }
+        finish();
+    }).observe({type: 'largest-contentful-paint', buffered: true});
+} catch (error) {}
+setTimeout(finish, 100);
+'''
+PAGE_TIMING_FIELDS = ('ttfb', 'dns_time', 'connect_time', 'tls_time', 'dom_content_loaded', 'onload_time',
+                      'first_paint', 'first_contentful_paint', 'largest_contentful_paint')
+SUMMARY_FILE_PATH = '{}-resume-urls.csv'
+RESOURCES_FILE_PATH = '{}-resources-list.csv'
+MIMETYPE_FILE_PATH = '{}-mimetype-resources.csv'
+
+SUMMARY_FIELD_NAMES = ['page_url', 'num_entries', 'page_size (KB)', 'page_load_time (ms)', 'total_size (MB)',
+                       'total_load_time (ms)', 'finish_time (ms)', 'dom_load_time (ms)', 'ttfb (ms)', 'dns_time (ms)',
+                       'connect_time (ms)', 'tls_time (ms)', 'onload_time (ms)', 'first_paint (ms)',
+                       'first_contentful_paint (ms)', 'largest_contentful_paint (ms)']
+RESOURCES_FIELD_NAMES = ['page_url', 'resource_url', 'mime_type', 'size', 'time']
+MIMETYPE_FIELD_NAMES = ['page_url', 'mime_type', 'n_entries', 'total_size', 'average_size', 'percentage_size',
+                        'total_time', 'average_time']
+
+
+def write_header_if_empty(csv_file, writer):
+    """
+    Write the header of a CSV opened in append mode only when the file is new, so appending the results of several
+    executions does not repeat it
+
+    :param csv_file: file opened with 'a+'
+    :param csv.DictWriter writer:
+    """
+    csv_file.seek(0, 2)
+    if csv_file.tell() == 0:
+        writer.writeheader()
+
+
+class SummaryTotals:
+    """
+    Totals of the resume urls CSV, accumulated row by row
+    """
+
+    def __init__(self):
+        self.num_pages = 0
+        self.page_size_sum = 0
+        self.page_load_time_sum = 0
+        self.total_size_sum = 0
+        self.total_load_time_sum = 0
+
+    def add(self, row):
+        """
+        :param dict row: row generated by HarFileParser.summary_row
+        """
+        self.num_pages += 1
+        self.page_size_sum += row['page_size (KB)']
+        self.page_load_time_sum += row['page_load_time (ms)']
+        self.total_size_sum += row['total_size (MB)']
+        self.total_load_time_sum += row['total_load_time (ms)']
+
+    def row(self):
+        """
+        :return list: page_size_sum (KB), page_load_time_avg (ms), total_size_sum (MB), total_load_time_avg (ms)
+        """
+        num_pages = self.num_pages or 1
+        return [round(self.page_size_sum, 3), round(self.page_load_time_sum / num_pages, 3),
+                round(self.total_size_sum, 3), round(self.total_load_time_sum / num_pages, 3)]
+
+
+def print_summary(file_path, totals, statistics=None):
+    """
+    Print the resume urls CSV, its totals and the percentiles of the pages to the stdout in table format
+
+    :param str file_path: path of the resume urls CSV
+    :param SummaryTotals totals:
+    :param PageStatistics statistics: percentiles of the pages, not printed if None
+    """
+    # Print the CSV in table format (prettytables don't allow the use of sys.stdout.write)
+    with open(file_path, 'r') as csv_file:
+        summary_table = from_csv(csv_file, delimiter=',')
+        print(summary_table)
+
+    # Print the totals in table format
+    totals_table = PrettyTable()
+    totals_table.field_names = ["page_size_sum (KB)", "page_load_time_avg (ms)", "total_size_sum (MB)",
+                                "total_load_time_avg (ms)"]
+    totals_table.add_row(totals.row())
+    print(totals_table)
+
+    if statistics is not None:
+        print(statistics.table())
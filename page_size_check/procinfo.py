@@ -0,0 +1,108 @@
+import os
+import signal
+
+# Memory is read from /proc, so it is only available on Linux
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def process_rss(pid):
+    """
+    Resident memory of a process
+
+    :param int pid:
+    :return int: bytes, 0 if the process does not exist
+    """
+    try:
+        with open('/proc/{}/statm'.format(pid)) as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _parent_pids():
+    """
+    :return dict: pid -> parent pid of every process
+    """
+    parents = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open('/proc/{}/stat'.format(name)) as stat:
+                # The name of the command is between parentheses and may contain spaces
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        parents[int(name)] = int(fields[1])
+    return parents
+
+
+def process_tree(pid):
+    """
+    A process and all its descendants
+
+    :param int pid:
+    :return list: pids
+    """
+    children = {}
+    for child, parent in _parent_pids().items():
+        children.setdefault(parent, []).append(child)
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(children.get(current, []))
+    return pids
+
+
+def tree_rss(*pids):
+    """
+    Resident memory of some processes and all their descendants, every process counted once
+
+    :return int: bytes
+    """
+    tree = set()
+    for pid in pids:
+        if pid:
+            tree.update(process_tree(pid))
+    return sum(process_rss(pid) for pid in tree)
+
+
+def kill_tree(pid):
+    """
+    Kill a process and all its descendants with SIGKILL, ignoring the ones that already exited
+
+    :param int pid:
+    """
+    for current in process_tree(pid):
+        try:
+            os.kill(current, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def cpu_times():
+    """
+    Time spent by all the CPUs of the host since boot
+
+    :return tuple: busy and total time, in clock ticks
+    """
+    with open('/proc/stat') as stat:
+        # user nice system idle iowait irq softirq steal, guest time is already counted in user
+        ticks = [int(value) for value in stat.readline().split()[1:9]]
+    idle = sum(ticks[3:5])
+    return sum(ticks) - idle, sum(ticks)
+
+
+def memory_available():
+    """
+    Memory that can be used by new processes without swapping
+
+    :return float: fraction of the total memory of the host
+    """
+    values = {}
+    with open('/proc/meminfo') as meminfo:
+        for line in meminfo:
+            name, _, value = line.partition(':')
+            values[name] = int(value.split()[0])
+    return values['MemAvailable'] / values['MemTotal']
@@ -0,0 +1,116 @@
+import logging
+import mimetypes
+from urllib.parse import urlparse
+
+from page_size_check.parser import PAGE_TIMING_SCRIPT, epoch_ms_to_iso
+
+logger = logging.getLogger(__name__)
+
+# Collects the navigation and the resources of the page. Sizes of cross-origin resources are 0 unless they are served
+# with Timing-Allow-Origin, and the status is 0 on browsers without responseStatus.
+RESOURCE_TIMING_FUNCTION = '''
+function resourceTiming() {
+    var timing = window.performance.timing;
+    function entry(item) {
+        return {name: item.name, initiatorType: item.initiatorType, startTime: item.startTime, duration: item.duration,
+                transferSize: item.transferSize || 0, encodedBodySize: item.encodedBodySize || 0,
+                decodedBodySize: item.decodedBodySize || 0, responseStatus: item.responseStatus || 0};
+    }
+    var navigation = window.performance.getEntriesByType('navigation')[0];
+    return {
+        timeOrigin: window.performance.timeOrigin || timing.navigationStart,
+        navigation: navigation ? entry(navigation) : null,
+        resources: window.performance.getEntriesByType('resource').map(entry),
+        onContentLoad: timing.domContentLoadedEventStart - timing.navigationStart,
+        onLoad: timing.loadEventStart - timing.navigationStart
+    };
+}
+'''
+# Page timings of PAGE_TIMING_SCRIPT with the resources under 'resource_timing', in one call to the browser
+PAGE_RESOURCE_TIMING_SCRIPT = RESOURCE_TIMING_FUNCTION + PAGE_TIMING_SCRIPT
+# Default size of the resource timing buffer of the browsers. The buffer is reset on every navigation, so it cannot be
+# enlarged with performance.setResourceTimingBufferSize before the page loads, and the resources after the first 250
+# are dropped.
+RESOURCE_TIMING_BUFFER_SIZE = 250
+PAGE_ID = 'page_1'
+# Mime type of the resources whose url has no known extension, by the element that loaded them
+INITIATOR_MIME_TYPES = {
+    'navigation': 'text/html',
+    'iframe': 'text/html',
+    'frame': 'text/html',
+    'css': 'text/css',
+    'link': 'text/css',
+    'script': 'application/javascript',
+    'img': 'image/*',
+    'image': 'image/*',
+    'video': 'video/*',
+    'audio': 'audio/*',
+    'xmlhttprequest': 'application/json',
+    'fetch': 'application/json',
+    'beacon': 'text/plain',
+}
+
+
+def guess_mime_type(url, initiator_type):
+    """
+    The Resource Timing API has no content type, so it is guessed from the extension of the url or, without it, from
+    the element that loaded the resource
+
+    :param str url:
+    :param str initiator_type:
+    :return str:
+    """
+    mime_type = mimetypes.guess_type(urlparse(url).path)[0]
+    return mime_type or INITIATOR_MIME_TYPES.get(initiator_type, 'application/octet-stream')
+
+
+def _har_entry(item, time_origin, mime_type):
+    body_size = item['encodedBodySize']
+    # transferSize includes the headers, it is 0 for resources taken from the cache or cross-origin
+    headers_size = max(item['transferSize'] - body_size, 0) if item['transferSize'] else 0
+    return {
+        'pageref': PAGE_ID,
+        'startedDateTime': epoch_ms_to_iso(time_origin + item['startTime']),
+        'time': item['duration'],
+        'request': {'method': 'GET', 'url': item['name'], 'headers': []},
+        'response': {
+            'status': item['responseStatus'] or 200,
+            'headers': [],
+            'content': {'mimeType': mime_type, 'size': item['decodedBodySize']},
+            'bodySize': body_size,
+            'headersSize': headers_size,
+        },
+        'comment': item['initiatorType'],
+    }
+
+
+def resource_timing_har(timing):
+    """
+    Build a HarFile with the entries of the Resource Timing API, so it can be parsed by HarFileParser without a proxy.
+    Only the fields read by the parser are filled.
+
+    :param dict timing: 'resource_timing' of the result of PAGE_RESOURCE_TIMING_SCRIPT
+    :return dict:
+    """
+    time_origin = timing['timeOrigin']
+    navigation = timing.get('navigation')
+    if len(timing['resources']) >= RESOURCE_TIMING_BUFFER_SIZE:
+        logger.warning("The resource timing buffer of \"{}\" is full, the resources after the first {} are missing. "
+                       "Use --capture har to record all of them".format(
+                           navigation['name'] if navigation else '', RESOURCE_TIMING_BUFFER_SIZE))
+    entries = []
+    if navigation:
+        entries.append(_har_entry(navigation, time_origin, 'text/html'))
+    for item in timing['resources']:
+        entries.append(_har_entry(item, time_origin, guess_mime_type(item['name'], item['initiatorType'])))
+    return {'log': {
+        'version': '1.2',
+        'creator': {'name': 'page_size_check', 'version': '', 'comment': 'Resource Timing API'},
+        'pages': [{
+            'id': PAGE_ID,
+            'title': navigation['name'] if navigation else '',
+            'startedDateTime': epoch_ms_to_iso(time_origin),
+            'pageTimings': {'onContentLoad': timing['onContentLoad'], 'onLoad': timing['onLoad']},
+        }],
+        'entries': entries,
+    }}
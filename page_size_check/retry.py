@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import random
+from urllib.parse import urlparse
+from selenium.common.exceptions import TimeoutException
+
+from page_size_check.sink import PageFailure
+
+logger = logging.getLogger(__name__)
+
+# Errors of the parser, the page would fail the same way on every attempt
+NON_RETRYABLE_ERRORS = (ValueError, KeyError, TypeError)
+
+
+class RetryPolicy:
+    """
+    Retries of a page that failed, waiting an exponential backoff between attempts and giving up when the page has
+    been tried `retries` more times or the next attempt would start after its total deadline
+    """
+
+    def __init__(self, retries=2, backoff=2.0, deadline=None, max_delay=60, jitter=0.1):
+        """
+        :param int retries: attempts after the first one
+        :param float backoff: seconds to wait before the first retry, doubled on every retry
+        :param float deadline: seconds since the first attempt after which the page is not tried again, no limit
+            if None
+        :param float max_delay: maximum seconds to wait between attempts
+        :param float jitter: fraction of the delay added or removed at random, so the retries of pages that failed
+            together do not hit the site at the same time
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def delay(self, attempt, elapsed, error):
+        """
+        Seconds to wait before trying again a page that failed
+
+        :param int attempt: number of the attempt that failed, starting at 1
+        :param float elapsed: seconds since the first attempt
+        :param Exception error: error of the attempt
+        :return float: the delay, None to give up
+        """
+        if attempt > self.retries or isinstance(error, NON_RETRYABLE_ERRORS):
+            return None
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_delay)
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        if self.deadline is not None and elapsed + delay >= self.deadline:
+            return None
+        return delay
+
+
+def describe_error(error):
+    """
+    :param Exception error:
+    :return str: short description of an error for the logs and the failed urls report
+    """
+    if isinstance(error, (TimeoutException, asyncio.TimeoutError)):
+        return 'Timeout loading the page'
+    message = str(error).strip().splitlines()
+    return '{}: {}'.format(type(error).__name__, message[0]) if message else type(error).__name__
+
+
+def report_failure(sink, url_info, attempts, error, elapsed):
+    """
+    Method to log a page that failed on every attempt and hand it to the sink, if it reports failures
+    """
+    page_url = url_info['page_url']
+    logger.error("Error processing \"{}\" url after {} attempts".format(page_url, attempts), exc_info=error)
+    if hasattr(sink, 'add_failure'):
+        sitemap_domain = urlparse(url_info['sitemap_url']).netloc
+        sink.add_failure(PageFailure(page_url, sitemap_domain, attempts, describe_error(error), elapsed))
@@ -0,0 +1,192 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+
+from page_size_check.autoscale import max_threads
+from page_size_check.crawler import crawl
+from page_size_check.sink import PageFailure
+from page_size_check.tracing import get_tracer, start_tracing
+
+logger = logging.getLogger(__name__)
+
+# Keys of the url information sent to the worker processes, the BrowserPool and the cache are added by each worker
+TASK_KEYS = ('page_url', 'lastmod', 'sitemap_url')
+POLL_TIMEOUT = 1
+
+
+def shard_trace_path(trace_path, index):
+    """
+    Trace file of a worker process, next to the trace of the main process: trace.jsonl -> trace.1.jsonl
+
+    :param str trace_path: trace file of the main process
+    :param int index: index of the worker process
+    :return str:
+    """
+    root, extension = os.path.splitext(trace_path)
+    return '{}.{}{}'.format(root, index, extension)
+
+
+def shard_ports(browsermob_server_port, index, threads):
+    """
+    Ports of the BrowserMob server of a worker process: every worker takes a block of ports after the previous one,
+    the first for the REST API and the rest for its proxies, twice the threads so discarded proxies can be replaced
+    while their port is released.
+
+    :param int browsermob_server_port: first port of all the workers
+    :param int index: index of the worker process
+    :param int threads: maximum number of browsers of every worker
+    :return tuple: port of the server and (first, last) ports of its proxies
+    """
+    block_size = threads * 2 + 1
+    server_port = browsermob_server_port + index * block_size
+    return server_port, (server_port + 1, server_port + block_size - 1)
+
+
+class QueueSink:
+    """
+    Sink of a worker process that sends the parsed pages and the failures to the main process, where they are written
+    to the reports
+    """
+
+    def __init__(self, results):
+        self.results = results
+
+    def add(self, har_file_data):
+        self.results.put(har_file_data)
+
+    def add_failure(self, failure):
+        self.results.put(failure)
+
+    def close(self):
+        pass
+
+
+def iter_tasks(tasks, stop):
+    """
+    Urls sent by the main process to a worker, until a None or until the crawl is stopped
+
+    :return: generator of url information
+    """
+    while not stop.is_set():
+        try:
+            url_info = tasks.get(timeout=POLL_TIMEOUT)
+        except queue.Empty:
+            continue
+        if url_info is None:
+            return
+        yield url_info
+
+
+def crawl_shard(index, options, tasks, results, stop):
+    """
+    Entry point of a worker process: its own display and BrowserMob server load the urls taken from the tasks queue.
+    A None is sent to the results queue when the worker finishes. Ctrl+C is handled by the main process, that stops
+    the workers once they finish the pages they are loading.
+
+    :param int index: index of the worker process
+    :param dict options: options of crawl
+    :param tasks: queue of url information
+    :param results: queue of HarFileData
+    :param stop: event set by the main process to stop taking urls
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tracer = start_tracing(options.get('trace_path') and shard_trace_path(options['trace_path'], index),
+                           options.get('trace_format', 'jsonl'))
+    server_port, proxy_port_range = shard_ports(options['browsermob_server_port'], index, max_threads(options))
+    logger.info("Worker {} using BrowserMob port {} and proxy ports {}-{}".format(
+        index, server_port, proxy_port_range[0], proxy_port_range[1]))
+    try:
+        crawl(QueueSink(results), iter_tasks(tasks, stop), dict(options, browsermob_server_port=server_port),
+              proxy_port_range)
+    except Exception as ex:
+        logger.exception(ex)
+    finally:
+        tracer.close()
+        results.put(None)
+
+
+def feed_tasks(url_infos, tasks, processes, stop):
+    """
+    Send the urls to the worker processes as they take them, and a None to every worker at the end
+    """
+    try:
+        for url_info in url_infos:
+            task = {key: url_info.get(key) for key in TASK_KEYS}
+            while not stop.is_set():
+                try:
+                    tasks.put(task, timeout=POLL_TIMEOUT)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+    except Exception as ex:
+        logger.exception(ex)
+    for _ in range(processes):
+        tasks.put(None)
+
+
+def drain_results(results, workers, sink):
+    """
+    Write the pages parsed by the workers to the sink until every worker has finished. A worker that dies without
+    sending its None is detected when no worker is alive and the queue is empty.
+
+    :param results: queue of HarFileData and PageFailure, None when a worker finishes
+    :param workers: worker processes
+    :param sink: Sink where the parsed data is written
+    """
+    finished = 0
+    while finished < len(workers):
+        try:
+            har_file_data = results.get(timeout=POLL_TIMEOUT)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                logger.error("Worker processes finished unexpectedly")
+                return
+            continue
+        if har_file_data is None:
+            finished += 1
+        elif isinstance(har_file_data, PageFailure):
+            if hasattr(sink, 'add_failure'):
+                sink.add_failure(har_file_data)
+        else:
+            sink.add(har_file_data)
+
+
+def crawl_sharded(sink, url_infos, processes, options):
+    """
+    Crawl the urls with several worker processes, each one with its own display, BrowserMob server (see shard_ports)
+    and pool of browsers. The urls are handed out on demand through a bounded queue, so the workers stay balanced,
+    and the parsed pages are written to the sink by this process.
+
+    :param sink: Sink where the parsed data is written
+    :param url_infos: Information of the urls to be analyzed
+    :param int processes: number of worker processes
+    :param dict options: options of crawl
+    """
+    tasks = multiprocessing.Queue(maxsize=processes * max_threads(options) * 2)
+    results = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=crawl_shard, args=(index, options, tasks, results, stop),
+                                       name='page_size_check-{}'.format(index))
+               for index in range(processes)]
+    get_tracer().flush()  # so the forked workers do not inherit pending spans and write them again
+    for worker in workers:
+        worker.start()
+    feeder = threading.Thread(target=feed_tasks, args=(url_infos, tasks, processes, stop), daemon=True)
+    feeder.start()
+    try:
+        drain_results(results, workers, sink)
+    except KeyboardInterrupt:
+        logger.info("Interrupted, waiting for the workers to finish their pages...")
+        stop.set()
+        drain_results(results, workers, sink)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(POLL_TIMEOUT * 10)
+            if worker.is_alive():
+                worker.terminate()
@@ -0,0 +1,182 @@
+import csv
+import logging
+import threading
+from collections import namedtuple
+
+from page_size_check.parser import (
+    HarFileParser, SummaryTotals, print_summary, write_header_if_empty, MIMETYPE_FIELD_NAMES, MIMETYPE_FILE_PATH,
+    RESOURCES_FIELD_NAMES, RESOURCES_FILE_PATH, SUMMARY_FIELD_NAMES, SUMMARY_FILE_PATH
+)
+from page_size_check.stats import PageStatistics
+
+logger = logging.getLogger(__name__)
+
+FAILED_FILE_PATH = '{}-failed-urls.csv'
+FAILED_FIELD_NAMES = ['page_url', 'attempts', 'error', 'elapsed (s)']
+
+# Page that could not be parsed after all its attempts
+PageFailure = namedtuple('PageFailure', ['page_url', 'sitemap_domain', 'attempts', 'error', 'elapsed'])
+
+
+class CsvReport:
+    """
+    CSV file of a report with the rows waiting to be written
+    """
+
+    def __init__(self, file_path, field_names, mode):
+        self.file_path = file_path
+        self.csv_file = open(file_path, mode, newline='')
+        self.writer = csv.DictWriter(self.csv_file, fieldnames=field_names)
+        if mode == 'w':
+            self.writer.writeheader()
+        else:
+            write_header_if_empty(self.csv_file, self.writer)
+        self.csv_file.flush()
+        self.rows = []
+
+    def flush(self):
+        self.writer.writerows(self.rows)
+        self.rows = []
+        self.csv_file.flush()
+
+    def close(self):
+        self.flush()
+        self.csv_file.close()
+
+
+class CsvResultSink:
+    """
+    Thread-safe sink that appends the rows of every page to the CSV reports as soon as the page is parsed, writing
+    them in batches. Pages are not kept in memory and a crash only loses the last batch. The pages that failed are
+    written to their own report.
+    """
+
+    def __init__(self, generate_extra_csv=True, display_summary=False, append=True, batch_size=50):
+        """
+        :param bool generate_extra_csv: If true the resources and mimetype CSVs are written too
+        :param bool display_summary: If true displays the results summary to the stdout when the sink is closed
+        :param bool append: If false the resources and mimetype CSVs are rewritten instead of appended to
+        :param int batch_size: number of pages buffered before writing them to disk
+        """
+        self.generate_extra_csv = generate_extra_csv
+        self.display_summary = display_summary
+        self.append = append
+        self.batch_size = batch_size
+        self.totals = SummaryTotals()
+        # Only needed for the summary printed at the end
+        self.statistics = PageStatistics() if display_summary else None
+        self.reports = {}
+        self.failures = None
+        self.num_failures = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def num_pages(self):
+        return self.totals.num_pages
+
+    def _open_reports(self, sitemap_domain):
+        """
+        Open the reports once the domain of the first page is known. As before, the resume is rewritten on every
+        execution and the extra CSVs are appended to unless append is false.
+        """
+        extra_mode = 'a+' if self.append else 'w'
+        self.reports['summary'] = CsvReport(SUMMARY_FILE_PATH.format(sitemap_domain), SUMMARY_FIELD_NAMES, 'w')
+        if self.generate_extra_csv:
+            self.reports['resources'] = CsvReport(RESOURCES_FILE_PATH.format(sitemap_domain),
+                                                  RESOURCES_FIELD_NAMES, extra_mode)
+            self.reports['mimetype'] = CsvReport(MIMETYPE_FILE_PATH.format(sitemap_domain),
+                                                 MIMETYPE_FIELD_NAMES, extra_mode)
+
+    def add(self, har_file_data):
+        """
+        Add the rows of a parsed page to the reports
+
+        :param HarFileData har_file_data:
+        """
+        rows = {'summary': [HarFileParser.summary_row(har_file_data)]}
+        if self.generate_extra_csv:
+            rows['resources'] = list(HarFileParser.resource_rows(har_file_data))
+            rows['mimetype'] = list(HarFileParser.mimetype_rows(har_file_data))
+        with self._lock:
+            if not self.reports:
+                self._open_reports(har_file_data.sitemap_domain)
+            for name, report_rows in rows.items():
+                self.reports[name].rows.extend(report_rows)
+            self.totals.add(rows['summary'][0])
+            if self.statistics is not None:
+                self.statistics.add(har_file_data)
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self._flush()
+
+    def add_failure(self, failure):
+        """
+        Add a page that failed to the failed urls report, written at once
+
+        :param PageFailure failure:
+        """
+        with self._lock:
+            if self.failures is None:
+                self.failures = CsvReport(FAILED_FILE_PATH.format(failure.sitemap_domain), FAILED_FIELD_NAMES, 'w')
+            self.failures.rows.append({'page_url': failure.page_url, 'attempts': failure.attempts,
+                                       'error': failure.error, 'elapsed (s)': round(failure.elapsed, 3)})
+            self.failures.flush()
+            self.num_failures += 1
+
+    def _flush(self):
+        for report in self.reports.values():
+            report.flush()
+        self._pending = 0
+
+    def flush(self):
+        """
+        Write the buffered rows to disk
+        """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """
+        Write the pending rows, close the reports and print the summary if display_summary is true
+        """
+        with self._lock:
+            for report in self.reports.values():
+                report.close()
+            if self.failures is not None:
+                self.failures.close()
+                logger.info("URLs failed: {}, see \"{}\"".format(self.num_failures, self.failures.file_path))
+        logger.info("URLs processed: {}".format(self.num_pages))
+        if self.display_summary and self.reports:
+            print_summary(self.reports['summary'].file_path, self.totals, self.statistics)
+
+
+class MultiSink:
+    """
+    Sink that hands every parsed page to several sinks (CSV reports, checkpoint...), in order
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = [sink for sink in sinks if sink is not None]
+
+    def add(self, har_file_data):
+        for sink in self.sinks:
+            sink.add(har_file_data)
+
+    def add_failure(self, failure):
+        """
+        Hand a failed page to the sinks that report failures
+        """
+        for sink in self.sinks:
+            if hasattr(sink, 'add_failure'):
+                sink.add_failure(failure)
+
+    def close(self):
+        """
+        Close every sink, even if closing one of them fails
+        """
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as ex:
+                logger.exception(ex)
@@ -0,0 +1,116 @@
+import gzip
+import io
+import logging
+from collections import namedtuple
+from xml.etree import ElementTree
+
+import requests
+
+from page_size_check.tracing import span
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+SitemapEntry = namedtuple('SitemapEntry', ['loc', 'lastmod'])
+
+
+def _local_name(tag):
+    """
+    Tag name without the XML namespace: '{http://www.sitemaps.org/schemas/sitemap/0.9}loc' -> 'loc'
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+def open_sitemap_stream(raw):
+    """
+    Wrap a binary stream with the sitemap, decompressing it on the fly when it is gzipped (.xml.gz files are usually
+    served as application/x-gzip without Content-Encoding, so the magic number is checked instead of the headers)
+
+    :param raw: file-like object with the sitemap bytes
+    :return: buffered file-like object with the XML
+    """
+    stream = raw if isinstance(raw, io.BufferedReader) else io.BufferedReader(raw)
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def parse_sitemap(stream):
+    """
+    Incrementally parse a sitemap or a sitemap index, yielding its entries as soon as they are read. Parsed elements
+    are cleared so memory does not grow with the size of the sitemap.
+
+    :param stream: file-like object with the XML of the sitemap
+    :return: generator of (kind, SitemapEntry) where kind is 'url' for pages and 'sitemap' for sitemap index children
+    """
+    root = None
+    loc = lastmod = None
+    for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            continue
+        name = _local_name(element.tag)
+        if name == 'loc':
+            loc = (element.text or '').strip()
+        elif name == 'lastmod':
+            lastmod = (element.text or '').strip() or None
+        elif name in ('url', 'sitemap'):
+            if loc:
+                yield name, SitemapEntry(loc, lastmod)
+            loc = lastmod = None
+            root.clear()
+
+
+# Errors downloading, decompressing or parsing a sitemap
+SITEMAP_ERRORS = (requests.RequestException, ElementTree.ParseError, OSError, EOFError)
+
+
+def _read_sitemap(session, url, timeout, children):
+    """
+    Stream the page entries of one sitemap, appending the children of a sitemap index to children
+    """
+    with span('sitemap_request', url):
+        response = session.get(url, stream=True, timeout=timeout)
+    try:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        response.raw.auto_close = False  # Let io.BufferedReader detect the end of the stream by itself
+        for kind, entry in parse_sitemap(open_sitemap_stream(response.raw)):
+            if kind == 'url':
+                yield entry
+            else:
+                children.append(entry.loc)
+    finally:
+        response.close()
+
+
+def iter_sitemap_urls(sitemap_url, session=None, timeout=60):
+    """
+    Stream the page entries of a sitemap, following the children of sitemap indexes. A child sitemap that can not be
+    downloaded or parsed is logged and skipped, the pages of the other ones are still crawled.
+
+    :param str sitemap_url: url of the sitemap or of the sitemap index
+    :param requests.Session session: session used to download the sitemaps
+    :param int timeout: timeout in seconds of every request
+    :return: generator of SitemapEntry
+    """
+    session = session or requests.Session()
+    pending, seen = [sitemap_url], set()
+    while pending:
+        url = pending.pop(0)
+        if url in seen:
+            continue
+        seen.add(url)
+        children = []
+        try:
+            yield from _read_sitemap(session, url, timeout, children)
+        except SITEMAP_ERRORS as ex:
+            if url == sitemap_url:
+                raise
+            logger.error("Error reading the sitemap \"{}\", its pages are skipped: {}".format(url, ex))
+            continue
+        if children:
+            logger.info("Sitemap index \"{}\" has {} sitemaps".format(url, len(children)))
+        pending.extend(children)
@@ -0,0 +1,113 @@
+import numpy
+from prettytable import PrettyTable
+
+PERCENTILES = (50, 90, 95, 99)
+# Metrics of every page, columns of PageStatistics.pages
+PAGE_METRICS = ('total_size (MB)', 'num_entries', 'total_load_time (ms)', 'dom_load_time (ms)')
+# Metrics of the resources of a mime type in every page, columns of PageStatistics.mime_types after the mime id
+MIME_METRICS = ('size (KB)', 'num_entries', 'load_time (ms)')
+STATISTICS_FIELD_NAMES = ['mime_type', 'metric', 'pages'] + ['p{}'.format(p) for p in PERCENTILES] + ['max']
+
+
+class GrowableArray:
+    """
+    Two-dimensional float array that grows by rows, doubling its capacity so appending is amortized O(1)
+    """
+
+    def __init__(self, num_columns, capacity=1024):
+        self._data = numpy.empty((capacity, num_columns))
+        self.size = 0
+
+    def append(self, rows):
+        """
+        :param rows: array or list of rows of num_columns values
+        """
+        rows = numpy.asarray(rows, dtype=float)
+        end = self.size + len(rows)
+        if end > len(self._data):
+            data = numpy.empty((max(end, len(self._data) * 2), self._data.shape[1]))
+            data[:self.size] = self._data[:self.size]
+            self._data = data
+        self._data[self.size:end] = rows
+        self.size = end
+
+    @property
+    def values(self):
+        return self._data[:self.size]
+
+
+def distribution(values):
+    """
+    :param numpy.ndarray values: NaN for the missing values
+    :return list: number of values, the PERCENTILES and the max, None if there are no values
+    """
+    values = values[~numpy.isnan(values)]
+    if not len(values):
+        return None
+    return [len(values)] + numpy.percentile(values, PERCENTILES).tolist() + [float(values.max())]
+
+
+class PageStatistics:
+    """
+    Percentiles of the size, number of requests, load time and DOM content loaded time of the pages, overall and by
+    mime type. The metrics are accumulated in NumPy arrays, a row per page and a row per page and mime type, so the
+    percentiles of hundreds of thousands of pages are computed at once.
+    """
+
+    def __init__(self):
+        self.pages = GrowableArray(len(PAGE_METRICS))
+        self.mime_types = GrowableArray(1 + len(MIME_METRICS))
+        self.mime_type_names = []
+        self._mime_ids = {}
+
+    def add(self, har_file_data):
+        """
+        :param HarFileData har_file_data:
+        """
+        dom_content_loaded = har_file_data.dom_content_loaded or numpy.nan  # 0 when it was not measured
+        self.pages.append([[har_file_data.total_page_size, har_file_data.num_entries, har_file_data.load_time,
+                            dom_content_loaded]])
+        if not har_file_data.mime_types:
+            return
+        mime_ids = [self._mime_id(mime_type) for mime_type in har_file_data.mime_types]
+        self.mime_types.append(numpy.column_stack((mime_ids, numpy.asarray(har_file_data.mime_total_sizes),
+                                                   numpy.asarray(har_file_data.mime_counts),
+                                                   numpy.asarray(har_file_data.mime_total_times))))
+
+    def _mime_id(self, mime_type):
+        mime_id = self._mime_ids.get(mime_type)
+        if mime_id is None:
+            mime_id = self._mime_ids[mime_type] = len(self.mime_type_names)
+            self.mime_type_names.append(mime_type)
+        return mime_id
+
+    def rows(self):
+        """
+        :return list: rows of STATISTICS_FIELD_NAMES, first the metrics of the pages ('*' as mime type) and then the
+            ones of every mime type in alphabetical order
+        """
+        rows = []
+        pages = self.pages.values
+        for column, metric in enumerate(PAGE_METRICS):
+            values = distribution(pages[:, column])
+            if values is not None:
+                rows.append(['*', metric] + values)
+        mime_types = self.mime_types.values
+        # Sort the rows by mime type and split them in a group per mime type
+        mime_types = mime_types[numpy.argsort(mime_types[:, 0], kind='mergesort')]
+        groups = numpy.split(mime_types, numpy.flatnonzero(numpy.diff(mime_types[:, 0])) + 1)
+        by_name = {self.mime_type_names[int(group[0, 0])]: group for group in groups if len(group)}
+        for mime_type in sorted(by_name):
+            for column, metric in enumerate(MIME_METRICS, 1):
+                rows.append([mime_type, metric] + distribution(by_name[mime_type][:, column]))
+        return rows
+
+    def table(self):
+        """
+        :return PrettyTable: the percentiles of every metric
+        """
+        table = PrettyTable()
+        table.field_names = STATISTICS_FIELD_NAMES
+        for row in self.rows():
+            table.add_row(row[:3] + [round(value, 3) for value in row[3:]])
+        return table
@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from prettytable import PrettyTable
+
+logger = logging.getLogger(__name__)
+
+TRACE_FORMATS = ('jsonl', 'chrome')
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile
+
+    :param list sorted_values: values in ascending order, not empty
+    :param float fraction: between 0 and 1
+    :return:
+    """
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class PhaseDurations:
+    """
+    Number and total of the durations of a phase, with a uniform sample of at most `size` of them (reservoir
+    sampling) for the percentiles, so memory does not grow with the number of pages
+    """
+
+    __slots__ = ('count', 'total', 'sample', 'size', '_random')
+
+    def __init__(self, size, seed=0):
+        self.count = 0
+        self.total = 0.0
+        self.sample = []
+        self.size = size
+        self._random = random.Random(seed)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if len(self.sample) < self.size:
+            self.sample.append(duration)
+            return
+        index = self._random.randrange(self.count)
+        if index < self.size:
+            self.sample[index] = duration
+
+
+class Span:
+    """
+    Context manager that measures a phase and adds it to the tracer when it ends, even if it raises
+    """
+
+    __slots__ = ('tracer', 'phase', 'page_url', 'start')
+
+    def __init__(self, tracer, phase, page_url):
+        self.tracer = tracer
+        self.phase = phase
+        self.page_url = page_url
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.add(self.phase, self.start, time.perf_counter() - self.start, self.page_url)
+
+
+class NullSpan:
+    """
+    Span of a disabled tracer, it does nothing
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    """
+    Thread-safe recorder of the duration of every phase of the crawl. Each span is written at once to a JSON-lines
+    file or to a Chrome trace (chrome://tracing, Perfetto) with a row per thread, and a bounded sample of the
+    durations is kept to log the p50 / p95 of every phase at the end. The observers are called with every span too.
+    Without file path nor observers the tracer is disabled and its spans do nothing.
+    """
+
+    def __init__(self, file_path=None, trace_format='jsonl', sample_size=10000):
+        """
+        :param str file_path: trace file, None to disable the tracer
+        :param str trace_format: 'jsonl' (one span per line) or 'chrome' (Trace Event Format, JSON array)
+        :param int sample_size: durations of every phase kept for its percentiles
+        """
+        self.file_path = file_path
+        self.trace_format = trace_format
+        self.sample_size = sample_size
+        self.enabled = bool(file_path)
+        self.observers = []
+        self.durations = {}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._file = None
+        if self.enabled:
+            self._file = open(file_path, 'w')
+            if trace_format == 'chrome':
+                # The closing bracket is optional in the array format, so the trace is valid even if interrupted
+                self._file.write('[\n')
+
+    def add_observer(self, observer):
+        """
+        Enable the tracer and call observer(phase, duration) with every span, from the thread that measured it
+
+        :param observer: function
+        """
+        self.observers.append(observer)
+        self.enabled = True
+
+    def span(self, phase, page_url=None):
+        """
+        :param str phase: name of the phase
+        :param str page_url: page the phase belongs to, if any
+        :return: context manager that measures the phase
+        """
+        return Span(self, phase, page_url) if self.enabled else NULL_SPAN
+
+    def add(self, phase, start, duration, page_url=None):
+        """
+        Record a phase measured by the caller
+
+        :param str phase:
+        :param float start: time.perf_counter() at the start of the phase
+        :param float duration: seconds
+        :param str page_url:
+        """
+        if not self.enabled:
+            return
+        for observer in self.observers:
+            observer(phase, duration)
+        if self._file is None:
+            return
+        if self.trace_format == 'chrome':
+            event = {'name': phase, 'ph': 'X', 'ts': round((start - self._origin) * 1e6),
+                     'dur': round(duration * 1e6), 'pid': os.getpid(), 'tid': threading.get_ident()}
+            if page_url:
+                event['args'] = {'page_url': page_url}
+            line = json.dumps(event) + ',\n'
+        else:
+            line = json.dumps({'phase': phase, 'page_url': page_url, 'start': round(start - self._origin, 6),
+                               'duration': round(duration, 6), 'pid': os.getpid(),
+                               'thread': threading.current_thread().name}) + '\n'
+        with self._lock:
+            if self._file is not None:  # not closed meanwhile
+                durations = self.durations.get(phase)
+                if durations is None:
+                    durations = self.durations[phase] = PhaseDurations(self.sample_size)
+                durations.add(duration)
+                self._file.write(line)
+
+    def summary(self):
+        """
+        :return list: phase, count, p50, p95 and total seconds of every phase, the longest total first
+        """
+        with self._lock:
+            durations = [(phase, durations.count, sorted(durations.sample), durations.total)
+                         for phase, durations in self.durations.items()]
+        rows = [(phase, count, percentile(sample, 0.5), percentile(sample, 0.95), total)
+                for phase, count, sample, total in durations]
+        return sorted(rows, key=lambda row: row[4], reverse=True)
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def close(self):
+        """
+        Close the trace file and log the summary of the phases
+        """
+        if self._file is None:
+            return
+        with self._lock:
+            if self.trace_format == 'chrome':
+                # A metadata event ends the array, so the finished trace is also valid JSON
+                self._file.write(json.dumps({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+                                             'args': {'name': 'page_size_check'}}) + '\n]\n')
+            self._file.close()
+            self._file = None
+            self.enabled = bool(self.observers)
+        table = PrettyTable()
+        table.field_names = ['phase', 'count', 'p50 (ms)', 'p95 (ms)', 'total (s)']
+        for phase, count, p50, p95, total in self.summary():
+            table.add_row([phase, count, round(p50 * 1000, 1), round(p95 * 1000, 1), round(total, 1)])
+        logger.info("Trace written to \"{}\", time per phase:\n{}".format(self.file_path, table))
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    """
+    :return Tracer: the tracer of this process, disabled unless start_tracing was called
+    """
+    return _tracer
+
+
+def start_tracing(file_path, trace_format='jsonl'):
+    """
+    Replace the tracer of this process
+
+    :return Tracer: the new tracer
+    """
+    global _tracer
+    _tracer = Tracer(file_path, trace_format)
+    return _tracer
+
+
+def span(phase, page_url=None):
+    """
+    Measure a phase with the tracer of this process
+
+        with span('driver_get', page_url):
+            driver.get(page_url)
+    """
+    return _tracer.span(phase, page_url)
@@ -45,14 +45,16 @@ setup(
     url='https://github.com/APSL/page-size-check',
     packages=find_packages(),
     install_requires=[
-        'beautifulsoup4==4.6.3',
         'browsermob-proxy==0.8.0',
         'click==6.7',
-        'haralyzer==1.5.0',
         'selenium==3.14.0',
         'xvfbwrapper==0.2.9',
-        'PTable==0.9.2'
+        'PTable==0.9.2',
+        'numpy>=1.13',
     ],
+    extras_require={
+        'columnar': ['pyarrow>=0.15'],
+    },
     classifiers=[
         'Environment :: Console',
         'Intended Audience :: Developers',
@@ -66,7 +68,7 @@ setup(
     ],
     entry_points={
         'console_scripts': [
-            'page_size_check = page_size_check.pagesize_check:run',
+            'page_size_check = page_size_check.pagesize_check:cli',
         ]
     }
 )
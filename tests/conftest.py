@@ -761,3 +761,26 @@ def fix_numentries():
 @pytest.fixture()
 def fix_load_time():
     return 2874
+
+
+@pytest.fixture()
+def fix_sitemap_xml():
+    return b'''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://apsl.net/</loc><lastmod>2018-10-18</lastmod></url>
+  <url><loc>https://apsl.net/blog/</loc></url>
+</urlset>'''
+
+
+@pytest.fixture()
+def fix_sitemap_index_xml():
+    return b'''<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://apsl.net/sitemap-pages.xml.gz</loc></sitemap>
+  <sitemap><loc>https://apsl.net/sitemap.xml</loc></sitemap>
+</sitemapindex>'''
+
+
+@pytest.fixture()
+def fix_finish_time():
+    return 2025.0
@@ -0,0 +1,160 @@
+"""
+Fakes of the browsers, pools, sinks and processes shared by the unit tests
+"""
+import asyncio
+import json
+import sqlite3
+
+from selenium.common.exceptions import TimeoutException
+
+from page_size_check.async_crawler import AsyncBrowserPool
+from page_size_check.browser import BrowserPool
+from page_size_check.parser import PAGE_TIMING_SCRIPT
+
+
+class ListSink:
+    """
+    Sink that keeps the pages and the failures in lists
+    """
+
+    def __init__(self):
+        self.pages = []
+        self.failures = []
+
+    def add(self, har_file_data):
+        self.pages.append(har_file_data)
+
+    def add_failure(self, failure):
+        self.failures.append(failure)
+
+
+class LockedCache:
+    """
+    PageCache without any page that fails to store them, like a SQLite file locked by another process
+    """
+
+    def validate(self, page_url, lastmod):
+        return None
+
+    def put(self, har_file_data, lastmod, etag=None, last_modified=None):
+        raise sqlite3.OperationalError('database is locked')
+
+
+class FakeProcess:
+
+    def __init__(self, alive):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+class FakeDriver:
+    """
+    WebDriver whose page loads time out while there are failures left
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def get(self, url):
+        if self.failures:
+            self.failures.pop(0)
+            raise TimeoutException('Timed out')
+
+    def execute_async_script(self, script):
+        return {'dom_content_loaded': 1200}
+
+
+class FakeWorker:
+    """
+    BrowserWorker that returns `har_file` and fails to load a page once per item of `failures`
+    """
+    failures = []
+    har_file = None
+
+    def __init__(self, server, firefox_driver_path, headless=False, page_timeout=None):
+        self.driver = FakeDriver(FakeWorker.failures)
+        self.busy_since = None
+        self.resets = 0
+        self.pages = 0
+        self.killed = False
+        self.closed = False
+
+    def new_page(self, capture_headers=False):
+        pass
+
+    def page_timings(self):
+        return self.driver.execute_async_script(PAGE_TIMING_SCRIPT)
+
+    def har(self):
+        return FakeWorker.har_file
+
+    def reset(self):
+        self.resets += 1
+
+    def kill(self):
+        self.killed = True
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeBrowserPool(BrowserPool):
+    worker_class = FakeWorker
+
+
+class FakeAsyncDriver:
+    """
+    AsyncWebDriver that fails the urls ending with /broken/ and counts the pages loading at the same time
+    """
+
+    def __init__(self, worker):
+        self.worker = worker
+
+    async def get(self, url, timeout=None):
+        if url.endswith('/broken/'):
+            raise RuntimeError('broken page')
+        FakeAsyncWorker.loading += 1
+        FakeAsyncWorker.max_loading = max(FakeAsyncWorker.max_loading, FakeAsyncWorker.loading)
+        await asyncio.sleep(0.01)
+        FakeAsyncWorker.loading -= 1
+
+    async def execute_async_script(self, script):
+        return {'ttfb': 180, 'dom_content_loaded': 1200, 'first_contentful_paint': 950.5}
+
+
+class FakeAsyncWorker:
+    """
+    AsyncBrowserWorker that returns `har` as the HarFile of every page
+    """
+    har = None
+    loading = max_loading = 0
+
+    def __init__(self, browsermob, firefox_driver_path, capture_headers=False, headless=False, page_timeout=None):
+        self.driver = FakeAsyncDriver(self)
+        self.closed = False
+        self.pages = 0
+        self.busy_since = None
+
+    async def start(self):
+        pass
+
+    async def new_page(self):
+        pass
+
+    async def page_timings(self):
+        return await self.driver.execute_async_script(PAGE_TIMING_SCRIPT)
+
+    async def take_har(self):
+        return json.dumps(FakeAsyncWorker.har).encode('utf-8')
+
+    async def reset(self):
+        pass
+
+    async def quit(self):
+        self.closed = True
+
+
+class FakeAsyncBrowserPool(AsyncBrowserPool):
+    worker_class = FakeAsyncWorker
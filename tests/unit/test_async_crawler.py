@@ -0,0 +1,75 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from page_size_check.async_crawler import AsyncCrawler
+from page_size_check.retry import RetryPolicy
+from tests.fakes import FakeAsyncBrowserPool, FakeAsyncWorker, ListSink, LockedCache
+
+
+class TestAsyncCrawler:
+
+    def test_crawler_loads_pages_concurrently(self, fix_har_file, sitemap_url, fix_entries_resume):
+        FakeAsyncWorker.har = fix_har_file
+        page_urls = ['https://apsl.net/{}/'.format(page) for page in range(10)] + ['https://apsl.net/broken/']
+        sink = ListSink()
+
+        async def crawl():
+            pool = FakeAsyncBrowserPool(None, None, size=3)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                await AsyncCrawler(sink, pool, executor, max_pending=6).crawl(
+                    {'page_url': page_url, 'sitemap_url': sitemap_url} for page_url in page_urls)
+            await pool.close()
+            return pool
+
+        loop = asyncio.new_event_loop()
+        try:
+            pool = loop.run_until_complete(crawl())
+        finally:
+            loop.close()
+        assert sorted(page.page_url for page in sink.pages) == page_urls[:-1]
+        assert all(page.dom_content_loaded == 1200 for page in sink.pages)
+        assert all(page.largest_contentful_paint is None for page in sink.pages)
+        assert sink.pages[0].entries_resume == fix_entries_resume
+        assert FakeAsyncWorker.max_loading == 3
+        assert pool._started == 0
+
+    def test_pages_are_stored_once(self, page_url, fix_har_file, sitemap_url):
+        FakeAsyncWorker.har = fix_har_file
+        sink = ListSink()
+
+        async def crawl():
+            pool = FakeAsyncBrowserPool(None, None, size=1)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                await AsyncCrawler(sink, pool, executor, cache=LockedCache(),
+                                   retry_policy=RetryPolicy(retries=2, backoff=0.01)).crawl(
+                    [{'page_url': page_url, 'sitemap_url': sitemap_url}])
+            await pool.close()
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(crawl())
+        finally:
+            loop.close()
+        assert [page.page_url for page in sink.pages] == [page_url]
+        assert [failure.attempts for failure in sink.failures] == [1]
+
+
+class TestAsyncBrowserPool:
+
+    def test_released_workers_are_not_busy(self):
+        async def lend():
+            pool = FakeAsyncBrowserPool(None, None, size=2)
+            worker = await pool.acquire()
+            busy = [pool.busy()]
+            await pool.release(worker)
+            busy.append(pool.busy())
+            await pool.acquire()
+            await pool.recycle(await pool.acquire(), 'test')
+            busy.append(pool.busy())
+            return busy
+
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(lend()) == [1, 0, 1]
+        finally:
+            loop.close()
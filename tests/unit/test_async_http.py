@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+
+from page_size_check.async_http import AsyncHttpClient, HttpError
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        JsonHandler.connections.add(self.client_address)
+        length = int(self.headers['Content-Length'])
+        body = json.dumps({'path': self.path, 'body': json.loads(self.rfile.read(length).decode('utf-8'))})
+        self.send_response(404 if self.path == '/missing' else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in (b'{"log": ', b'{"entries": []}', b'}'):
+            self.wfile.write('{:x}\r\n'.format(len(chunk)).encode('ascii') + chunk + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture()
+def http_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), JsonHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncHttpClient:
+
+    def test_client_reuses_connections(self, http_server):
+        async def requests():
+            client = AsyncHttpClient('127.0.0.1', http_server.server_port, max_connections=1)
+            responses = [await client.request_json('POST', '/proxy/{}'.format(i), {'i': i}) for i in range(3)]
+            client.close()
+            return responses
+
+        JsonHandler.connections.clear()
+        assert run(requests()) == [{'path': '/proxy/{}'.format(i), 'body': {'i': i}} for i in range(3)]
+        assert len(JsonHandler.connections) == 1
+
+    def test_client_reads_chunked_responses(self, http_server):
+        async def request():
+            client = AsyncHttpClient('127.0.0.1', http_server.server_port)
+            try:
+                return await client.request_json('PUT', '/proxy/8081/har', form={'captureHeaders': 'true'})
+            finally:
+                client.close()
+
+        assert run(request()) == {'log': {'entries': []}}
+
+    def test_client_raises_error_status(self, http_server):
+        async def request():
+            client = AsyncHttpClient('127.0.0.1', http_server.server_port)
+            try:
+                return await client.request_json('POST', '/missing', {})
+            finally:
+                client.close()
+
+        with pytest.raises(HttpError) as error:
+            run(request())
+        assert error.value.status == 404
@@ -0,0 +1,36 @@
+from page_size_check.autoscale import ConcurrencyController, max_threads
+
+
+class FakePool:
+    size = 4
+    latencies = ()
+
+    def resize(self, size):
+        self.size = size
+
+
+class TestConcurrencyController:
+
+    def _controller(self):
+        return ConcurrencyController(FakePool(), min_size=2, max_size=6)
+
+    def test_grows_while_the_host_has_room(self):
+        controller = self._controller()
+        assert controller.decide(4, cpu=0.5, memory=0.6, latency=2.0) == 5
+        assert controller.decide(6, cpu=0.5, memory=0.6, latency=2.0) == 6
+
+    def test_shrinks_when_the_host_is_saturated(self):
+        controller = self._controller()
+        assert controller.decide(6, cpu=0.95, memory=0.6, latency=None) == 5
+        assert controller.decide(6, cpu=0.5, memory=0.05, latency=None) == 5
+        assert controller.decide(2, cpu=0.95, memory=0.05, latency=None) == 2
+
+    def test_shrinks_when_the_pages_get_slower(self):
+        controller = self._controller()
+        assert controller.decide(4, cpu=0.8, memory=0.6, latency=2.0) == 4
+        assert controller.decide(4, cpu=0.5, memory=0.6, latency=4.0) == 3
+
+    def test_max_threads(self):
+        assert max_threads({'threads': 4}) == 4
+        assert max_threads({'threads': 4, 'adaptive': True}) == 8
+        assert max_threads({'threads': 4, 'adaptive': True, 'max_threads': 6}) == 6
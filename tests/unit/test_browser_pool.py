@@ -0,0 +1,64 @@
+from tests.fakes import FakeBrowserPool
+
+
+class TestBrowserPool:
+
+    def test_browserpool_reuses_workers(self):
+        pool = FakeBrowserPool(None, None, size=2)
+        with pool.worker() as first:
+            pass
+        with pool.worker() as second:
+            pass
+        assert first is second
+        assert first.resets == 2
+
+    def test_browserpool_discards_broken_workers(self):
+        pool = FakeBrowserPool(None, None, size=1)
+        try:
+            with pool.worker() as broken:
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        with pool.worker() as worker:
+            pass
+        assert broken.closed
+        assert worker is not broken
+
+    def test_browserpool_close(self):
+        pool = FakeBrowserPool(None, None, size=2)
+        first, second = pool.acquire(), pool.acquire()
+        pool.close()
+        assert first.closed and second.closed
+
+    def test_browserpool_shrinks_and_grows(self):
+        pool = FakeBrowserPool(None, None, size=2)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.resize(1)
+        assert first.closed
+        pool.release(second)
+        assert not second.closed
+        pool.resize(2)
+        assert pool.acquire() is second
+        assert pool.acquire() not in (first, second)
+        assert len(pool.latencies) == 2
+
+    def test_browserpool_recycles_workers_after_their_page_limit(self):
+        pool = FakeBrowserPool(None, None, size=1, recycle_pages=2)
+        worker = pool.acquire()
+        worker.pages = 2
+        pool.release(worker)
+        assert worker.closed
+        assert pool.acquire() is not worker
+        assert pool.recycled == 1
+
+    def test_browserpool_recycles_workers_above_the_memory_limit(self):
+        pool = FakeBrowserPool(None, None, size=1, max_rss=100 * 2 ** 20)
+        worker = pool.acquire()
+        worker.rss = lambda: 50 * 2 ** 20
+        pool.release(worker)
+        assert pool.acquire() is worker
+        worker.rss = lambda: 150 * 2 ** 20
+        pool.release(worker)
+        assert worker.closed
+        assert pool.recycled == 1
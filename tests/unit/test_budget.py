@@ -0,0 +1,90 @@
+import csv
+import json
+
+import click
+import pytest
+from click.testing import CliRunner
+
+from page_size_check.budget import Budget, BudgetSink, load_budgets
+from page_size_check.pagesize_check import cli
+from page_size_check.parser import HarFileParser
+
+
+class TestBudget:
+
+    def test_limits_exceeded_are_reported(self, page_url, fix_har_file, sitemap_url):
+        har_file_data = HarFileParser().parse(fix_har_file, page_url, sitemap_url)
+        budget = Budget(max_requests=har_file_data.num_entries - 1, max_load_time=har_file_data.load_time,
+                        max_mime_bytes={'text/css': 1000, 'application/javascript': 10 ** 9})
+        violations = budget.check(har_file_data)
+        assert [(violation.metric, violation.limit) for violation in violations] == [
+            ('requests', har_file_data.num_entries - 1), ('text/css bytes', 1000)]
+        assert violations[1].value == 83986 + 505
+
+    def test_budgets_match_by_url_pattern(self, tmpdir):
+        path = tmpdir.join('budget.json')
+        path.write(json.dumps([{'match': 'https://apsl.net/blog/*', 'max_requests': 10}]))
+        budget, = load_budgets(str(path))
+        assert budget.matches('https://apsl.net/blog/post/')
+        assert not budget.matches('https://apsl.net/')
+
+    def test_unknown_limits_are_rejected(self, tmpdir):
+        path = tmpdir.join('budget.json')
+        path.write(json.dumps([{'max_size': 10}]))
+        with pytest.raises(click.BadParameter):
+            load_budgets(str(path))
+
+    @pytest.mark.parametrize('budget, key', [
+        ({'max_requests': '120'}, 'max_requests'),
+        ({'max_load_time': -1}, 'max_load_time'),
+        ({'max_total_bytes': True}, 'max_total_bytes'),
+        ({'match': 3}, 'match'),
+        ({'max_mime_bytes': 500000}, 'max_mime_bytes'),
+        ({'max_mime_bytes': {'text/css': None, 'image/png': '1MB'}}, 'max_mime_bytes.image/png'),
+    ])
+    def test_limits_that_are_not_numbers_are_rejected(self, tmpdir, budget, key):
+        path = tmpdir.join('budget.json')
+        path.write(json.dumps([{'max_requests': 10}, budget]))
+        with pytest.raises(click.BadParameter) as error:
+            load_budgets(str(path))
+        assert '"{}" of a budget'.format(key) in error.value.format_message()
+
+    def test_violations_are_written_to_their_report(self, tmpdir, page_url, fix_har_file, sitemap_url):
+        har_file_data = HarFileParser().parse(fix_har_file, page_url, sitemap_url)
+        with tmpdir.as_cwd():
+            sink = BudgetSink([Budget(max_requests=1), Budget(match='https://example.com/*', max_requests=1)])
+            sink.add(har_file_data)
+            sink.close()
+            with open('apsl.net-budget-violations.csv') as csv_file:
+                rows = list(csv.DictReader(csv_file))
+        assert rows == [{'page_url': page_url, 'budget': '*', 'metric': 'requests', 'limit': '1',
+                         'value': str(har_file_data.num_entries)}]
+        assert sink.failed
+
+
+class TestBudgetExitCode:
+
+    def test_parse_har_exits_with_1_over_budget(self, tmpdir, fix_har_file):
+        tmpdir.join('page.har').write(json.dumps(fix_har_file))
+        tmpdir.join('budget.json').write(json.dumps([{'max_requests': 1}]))
+        with tmpdir.as_cwd():
+            result = CliRunner().invoke(cli, ['parse_har', 'page.har', '--sitemap_url', 'https://apsl.net/',
+                                              '--processes', '1', '--budget', 'budget.json'])
+        assert result.exit_code == 1, result.output
+
+    def test_parse_har_exits_with_0_within_budget(self, tmpdir, fix_har_file):
+        tmpdir.join('page.har').write(json.dumps(fix_har_file))
+        tmpdir.join('budget.json').write(json.dumps([{'max_requests': 1000}]))
+        with tmpdir.as_cwd():
+            result = CliRunner().invoke(cli, ['parse_har', 'page.har', '--sitemap_url', 'https://apsl.net/',
+                                              '--processes', '1', '--budget', 'budget.json'])
+        assert result.exit_code == 0, result.output
+
+    def test_parse_har_rejects_a_wrong_limit(self, tmpdir, fix_har_file):
+        tmpdir.join('page.har').write(json.dumps(fix_har_file))
+        tmpdir.join('budget.json').write(json.dumps([{'max_requests': '1'}]))
+        with tmpdir.as_cwd():
+            result = CliRunner().invoke(cli, ['parse_har', 'page.har', '--sitemap_url', 'https://apsl.net/',
+                                              '--processes', '1', '--budget', 'budget.json'])
+        assert result.exit_code == 2
+        assert '"max_requests" of a budget of "budget.json" must be a number >= 0, not "1"' in result.output
@@ -0,0 +1,60 @@
+from page_size_check.cache import PageCache, get_document_validators
+from page_size_check.parser import HarFileParser
+
+
+def _har_entry(url, status, mime_type, headers):
+    return {'request': {'url': url},
+            'response': {'status': status, 'content': {'mimeType': mime_type}, 'headers': headers}}
+
+
+class TestPageCache:
+
+    def test_cache_stores_pages(self, tmpdir, page_url, fix_har_file, sitemap_url, fix_entries_resume):
+        path = str(tmpdir.join('cache.sqlite3'))
+        cache = PageCache(path)
+        cache.put(HarFileParser().parse(fix_har_file, page_url, sitemap_url), '2018-10-18', '"abc"')
+        cache.close()
+
+        cache = PageCache(path)
+        entry = cache.get(page_url)
+        assert entry.lastmod == '2018-10-18'
+        assert entry.etag == '"abc"'
+        assert entry.last_modified is None
+        assert entry.har_file_data.entries_resume == fix_entries_resume
+        assert cache.get('https://apsl.net/blog/') is None
+
+    def test_cache_validates_lastmod(self, tmpdir, page_url, fix_har_file, sitemap_url):
+        cache = PageCache(str(tmpdir.join('cache.sqlite3')))
+        cache.put(HarFileParser().parse(fix_har_file, page_url, sitemap_url), '2018-10-18')
+        assert cache.validate(page_url, '2018-10-18').page_url == page_url
+        assert cache.validate(page_url, '2018-10-19') is None
+        assert cache.validate('https://apsl.net/blog/', '2018-10-18') is None
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_cache_evicts_least_recently_used(self, tmpdir, fix_har_file, sitemap_url):
+        cache = PageCache(str(tmpdir.join('cache.sqlite3')))
+        page_urls = ['https://apsl.net/{}/'.format(page) for page in range(3)]
+        for page_url in page_urls:
+            cache.put(HarFileParser().parse(fix_har_file, page_url, sitemap_url), '2018-10-18')
+        cache.validate(page_urls[0], '2018-10-18')
+        cache.max_size = cache.size * 2 // 3
+        cache.put(HarFileParser().parse(fix_har_file, page_urls[2], sitemap_url), '2018-10-19')
+        assert cache.get(page_urls[0]) is not None
+        assert cache.get(page_urls[1]) is None
+        assert cache.get(page_urls[2]).lastmod == '2018-10-19'
+
+
+class TestDocumentValidators:
+
+    def test_validators_of_the_page_url(self, page_url):
+        har_file = {'log': {'entries': [
+            _har_entry('https://apsl.net/', 301, 'text/html', [{'name': 'ETag', 'value': '"redirect"'}]),
+            _har_entry(page_url, 200, 'text/html; charset=UTF-8',
+                       [{'name': 'ETag', 'value': '"abc"'},
+                        {'name': 'last-modified', 'value': 'Thu, 18 Oct 2018 15:16:16 GMT'}]),
+        ]}}
+        assert get_document_validators(har_file, page_url) == ('"abc"', 'Thu, 18 Oct 2018 15:16:16 GMT')
+
+    def test_validators_of_the_redirected_page(self, fix_har_file, page_url):
+        assert get_document_validators(fix_har_file, page_url) == (None, None)
+        assert get_document_validators({'log': {'entries': []}}, page_url) == (None, None)
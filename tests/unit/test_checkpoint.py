@@ -0,0 +1,27 @@
+from page_size_check.checkpoint import CheckpointStore
+from page_size_check.parser import HarFileParser
+
+
+class TestCheckpointStore:
+
+    def test_checkpoint_records_pages(self, tmpdir, page_url, fix_har_file, sitemap_url, fix_entries_resume):
+        path = str(tmpdir.join('checkpoint.sqlite3'))
+        checkpoint = CheckpointStore(path)
+        checkpoint.add(HarFileParser().parse(fix_har_file, page_url, sitemap_url))
+        checkpoint.close()
+
+        checkpoint = CheckpointStore(path)
+        assert page_url in checkpoint
+        assert 'https://apsl.net/blog/' not in checkpoint
+        results = list(checkpoint.iter_results())
+        assert len(results) == 1
+        assert results[0].entries_resume == fix_entries_resume
+
+    def test_checkpoint_iter_results_in_batches(self, tmpdir, fix_har_file, sitemap_url):
+        checkpoint = CheckpointStore(str(tmpdir.join('checkpoint.sqlite3')))
+        page_urls = ['https://apsl.net/{}/'.format(page) for page in range(5)]
+        for page_url in page_urls:
+            checkpoint.add(HarFileParser().parse(fix_har_file, page_url, sitemap_url))
+        assert [result.page_url for result in checkpoint.iter_results(batch_size=2)] == page_urls
+        checkpoint.clear()
+        assert len(checkpoint) == 0
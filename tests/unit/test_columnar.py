@@ -0,0 +1,50 @@
+import pytest
+
+from page_size_check.columnar import ColumnarSink, column_name, resource_host
+from page_size_check.parser import HarFileParser
+
+pyarrow = pytest.importorskip('pyarrow')
+parquet = pytest.importorskip('pyarrow.parquet')
+
+
+class TestColumnarSink:
+
+    def _add_pages(self, tmpdir, file_format, fix_har_file, sitemap_url, num_pages=3):
+        with tmpdir.as_cwd():
+            sink = ColumnarSink(file_format, row_group_size=10)
+            for page in range(num_pages):
+                sink.add(HarFileParser().parse(fix_har_file, 'https://apsl.net/{}/'.format(page), sitemap_url))
+            sink.close()
+
+    def test_parquet_tables_in_row_groups(self, tmpdir, fix_har_file, sitemap_url, fix_numentries):
+        self._add_pages(tmpdir, 'parquet', fix_har_file, sitemap_url)
+        resources_file = parquet.ParquetFile(str(tmpdir.join('apsl.net-resources-list.parquet')))
+        resources = resources_file.read()
+        assert resources.num_rows == 3 * fix_numentries
+        assert resources_file.num_row_groups > 1
+        assert pyarrow.types.is_dictionary(resources.schema.field('mime_type').type)
+        assert pyarrow.types.is_dictionary(resources.schema.field('host').type)
+        assert 'www.apsl.net' in resources.column('host').to_pylist()
+        summary = parquet.read_table(str(tmpdir.join('apsl.net-resume-urls.parquet')))
+        assert summary.column('page_url').to_pylist() == ['https://apsl.net/{}/'.format(page) for page in range(3)]
+        assert summary.column('num_entries').to_pylist() == [fix_numentries] * 3
+
+    def test_arrow_stream(self, tmpdir, fix_har_file, sitemap_url):
+        self._add_pages(tmpdir, 'arrow', fix_har_file, sitemap_url)
+        with pyarrow.OSFile(str(tmpdir.join('apsl.net-mimetype-resources.arrows'))) as source:
+            mimetype = pyarrow.ipc.open_stream(source).read_all()
+        assert 'text/css' in mimetype.column('mime_type').to_pylist()
+        assert 'total_size_kb' in mimetype.schema.names
+
+
+class TestColumns:
+
+    def test_column_name(self):
+        assert column_name('page_size (KB)') == 'page_size_kb'
+        assert column_name('page_url') == 'page_url'
+
+    def test_resource_host(self):
+        assert resource_host('https://WWW.apsl.net:8443/a.css') == 'www.apsl.net'
+        assert resource_host('http://user:pass@[::1]:8080/?a=b') == '::1'
+        assert resource_host('https://apsl.net?page=2') == 'apsl.net'
+        assert resource_host('data:image/png;base64,AAAA') == ''
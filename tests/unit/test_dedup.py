@@ -0,0 +1,74 @@
+import csv
+
+from page_size_check.dedup import (
+    ResourceIndex, SpaceSaving, UniqueSizeSketch, hash_key, normalize_resource_url, resource_key
+)
+from page_size_check.parser import HarFileParser
+
+
+class TestResourceKey:
+
+    def test_normalize_resource_url(self):
+        assert normalize_resource_url('HTTPS://WWW.apsl.net:443/static/app.js?b=2&a=1#top') == \
+            'https://www.apsl.net/static/app.js?a=1&b=2'
+        assert normalize_resource_url('http://apsl.net:8080') == 'http://apsl.net:8080/'
+
+    def test_resource_key_ignores_cache_busting_query(self):
+        assert resource_key('https://apsl.net/app.js?v=1', 1000) == resource_key('https://apsl.net/app.js?v=2', 1000)
+        assert resource_key('https://apsl.net/app.js?v=1', 1000) != resource_key('https://apsl.net/app.js?v=2', 999)
+        assert resource_key('data:image/png;base64,AAAA', 4).startswith('data:')
+
+    def test_resource_key_keeps_other_queries_apart(self):
+        assert resource_key('https://apsl.net/image?id=1', 1000) != resource_key('https://apsl.net/image?id=2', 1000)
+        assert resource_key('https://apsl.net/api?page=1', 0) != resource_key('https://apsl.net/api?page=2', 0)
+        assert (resource_key('https://apsl.net/image?id=1&ver=3', 1000) ==
+                resource_key('https://apsl.net/image?ver=4&id=1', 1000))
+        assert (resource_key('https://apsl.net/app.css?3f2a9c8e1b', 500) ==
+                resource_key('https://apsl.net/app.css?77aa01bc93', 500))
+
+
+class TestSketches:
+
+    def test_space_saving_keeps_the_most_frequent_keys(self):
+        counter = SpaceSaving(3)
+        for key in ['a'] * 10 + ['b'] * 5 + ['c', 'd', 'e', 'f'] + ['b'] * 2:
+            counter.add(key, key.upper())
+        top = counter.top(2)
+        assert [(key, count, value) for key, count, _, value in top] == [('a', 10, 'A'), ('b', 7, 'B')]
+        assert all(error == 0 for _, _, error, _ in top)
+
+    def test_unique_size_is_exact_below_k_and_estimated_above(self):
+        sketch = UniqueSizeSketch(1000)
+        for _ in range(3):
+            for key in range(500):
+                sketch.add(hash_key(str(key)), 2)
+        assert sketch.exact
+        assert sketch.total_size() == 1000
+
+        sketch = UniqueSizeSketch(256)
+        for key in range(10000):
+            sketch.add(hash_key(str(key)), 2)
+        assert not sketch.exact
+        assert 16000 < sketch.total_size() < 24000
+
+
+class TestResourceIndex:
+
+    def test_index_counts_shared_resources_once(self, tmpdir, fix_har_file, sitemap_url, fix_numentries):
+        index = ResourceIndex()
+        har_file_data = HarFileParser().parse(fix_har_file, 'https://apsl.net/', sitemap_url)
+        page_size = sum(har_file_data.resource_size(i) for i in range(har_file_data.num_entries))
+        for page in range(3):
+            index.add(HarFileParser().parse(fix_har_file, 'https://apsl.net/{}/'.format(page), sitemap_url))
+        total_size, unique_size, num_resources, exact = index.summary_row()
+        assert exact
+        assert total_size > unique_size
+        assert round(unique_size, 2) <= round(page_size / 1024, 2)
+        assert num_resources <= fix_numentries
+        rows = list(index.rows())
+        assert all(row['pages'] == 3 for row in rows)
+
+        with tmpdir.as_cwd():
+            index.close()
+            with open('{}-shared-resources.csv'.format(har_file_data.sitemap_domain)) as csv_file:
+                assert len(list(csv.DictReader(csv_file))) == len(rows)
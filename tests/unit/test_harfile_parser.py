@@ -1,5 +1,8 @@
+import pickle
 
-from page_size_check.parser import HarFileParser
+import pytest
+
+from page_size_check.parser import HarFileParser, get_timeline_length, iso_to_epoch_ms
 
 
 class TestHarFileParser:
@@ -20,3 +23,53 @@ class TestHarFileParser:
     def test_harfileparser_total_page_size(self, page_url, fix_har_file, sitemap_url, fix_total_page_size):
         har_file_data = HarFileParser().parse(fix_har_file, page_url, sitemap_url)
         assert har_file_data.total_page_size == fix_total_page_size
+
+    def test_harfileparser_finish_time(self, page_url, fix_har_file, sitemap_url, fix_finish_time):
+        har_file_data = HarFileParser().parse(fix_har_file, page_url, sitemap_url)
+        assert har_file_data.finish_time == fix_finish_time
+
+    def test_harfileparser_pickle(self, page_url, fix_har_file, sitemap_url, fix_entries_resume):
+        har_file_data = pickle.loads(pickle.dumps(HarFileParser().parse(fix_har_file, page_url, sitemap_url)))
+        assert har_file_data.entries_resume == fix_entries_resume
+        assert har_file_data.mime_resume('text/html')[0] == len(fix_entries_resume['text/html']['entries'])
+
+    def test_harfileparser_mime_resume(self, page_url, fix_har_file, sitemap_url, fix_entries_resume):
+        har_file_data = HarFileParser().parse(fix_har_file, page_url, sitemap_url)
+        for mime_type, resume in fix_entries_resume.items():
+            assert har_file_data.mime_resume(mime_type)[:2] == (len(resume['entries']), resume['total_size'])
+        assert har_file_data.mime_resume('image/webp') == (0, 0.0, 0)
+
+    def test_harfileparser_page_timings(self, page_url, fix_har_file, sitemap_url):
+        class TimingDriver:
+            def execute_async_script(self, script):
+                return {'ttfb': 180, 'dns_time': 12, 'connect_time': 40, 'tls_time': 25, 'dom_content_loaded': 1200,
+                        'onload_time': 2300, 'first_paint': 900.25, 'first_contentful_paint': 950.75,
+                        'largest_contentful_paint': None}
+
+        har_file_data = HarFileParser().parse(fix_har_file, page_url, sitemap_url, driver=TimingDriver())
+        assert har_file_data.ttfb == 180.0 and isinstance(har_file_data.ttfb, float)
+        assert har_file_data.largest_contentful_paint is None
+        row = HarFileParser.summary_row(har_file_data)
+        assert row['dom_load_time (ms)'] == 1200
+        assert row['first_contentful_paint (ms)'] == 950.8
+        assert row['largest_contentful_paint (ms)'] is None
+
+
+class TestTimeline:
+
+    def test_timeline_length_merges_overlaps(self):
+        assert get_timeline_length([(0, 10), (5, 10), (30, 0), (31, 4)]) == 20
+
+
+class TestIsoToEpochMs:
+
+    def test_iso_to_epoch_ms_offsets(self):
+        utc = iso_to_epoch_ms('2018-10-18T15:16:16.219Z')
+        assert utc == 1539875776219
+        assert iso_to_epoch_ms('2018-10-18T17:16:16.219+02:00') == utc
+        assert iso_to_epoch_ms('2018-10-18T10:16:16.219-0500') == utc
+        assert iso_to_epoch_ms('2018-10-18T15:16:16.219456') == utc
+
+    def test_iso_to_epoch_ms_invalid(self):
+        with pytest.raises(ValueError):
+            iso_to_epoch_ms('18/10/2018 15:16')
@@ -0,0 +1,38 @@
+import io
+import json
+
+from page_size_check.harstream import HarStreamReader
+from page_size_check.parser import HarFileParser
+
+
+class TestHarStreamReader:
+
+    def test_harstream_entries(self, fix_har_file):
+        reader = HarStreamReader(io.StringIO(json.dumps(fix_har_file)), chunk_size=7)
+        entries = list(reader.iter_entries())
+        assert entries == fix_har_file['log']['entries']
+        assert reader.pages == fix_har_file['log']['pages']
+
+    def test_harstream_numbers_cut_by_the_chunks(self):
+        entries = [{'time': 12345.678, 'x': 1.5e10, 'y': -2.5e-3, 'z': 120} for _ in range(5)]
+        har_text = json.dumps({'log': {'pages': [{'onLoad': 9876.543}], 'entries': entries}})
+        for chunk_size in range(1, 40):
+            reader = HarStreamReader(io.StringIO(har_text), chunk_size=chunk_size)
+            assert list(reader.iter_entries()) == entries, chunk_size
+            assert reader.pages == [{'onLoad': 9876.543}], chunk_size
+
+    def test_harstream_skips_bodies(self, fix_har_file):
+        entry = fix_har_file['log']['entries'][0]
+        entry['response']['content']['text'] = '{"not": ["decoded" \\" ]}' * 1000
+        for chunk_size in (100, 64 * 1024):  # walked key by key and decoded at once
+            har_fp = io.BytesIO(json.dumps(fix_har_file, indent=2).encode('utf-8'))
+            first_entry = next(HarStreamReader(har_fp, chunk_size=chunk_size).iter_entries())
+            assert 'text' not in first_entry['response']['content']
+            assert first_entry['response']['content']['mimeType'] == entry['response']['content']['mimeType']
+
+    def test_harfileparser_parse_stream(self, page_url, fix_har_file, sitemap_url, fix_entries_resume,
+                                        fix_load_time):
+        har_fp = io.StringIO(json.dumps(fix_har_file))
+        har_file_data = HarFileParser().parse_stream(har_fp, page_url, sitemap_url)
+        assert har_file_data.entries_resume == fix_entries_resume
+        assert har_file_data.load_time == fix_load_time
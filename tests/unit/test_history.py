@@ -0,0 +1,75 @@
+from click.testing import CliRunner
+
+from page_size_check.history import HistoryStore, PageRegression
+from page_size_check.pagesize_check import cli
+from page_size_check.parser import HarFileParser
+
+
+def record_run(path, har_file_datas, label=None):
+    history = HistoryStore(path, batch_size=2)
+    run_id = history.start_run(label)
+    for har_file_data in har_file_datas:
+        history.add(har_file_data)
+    history.close()
+    return run_id
+
+
+class TestHistoryStore:
+
+    def _pages(self, fix_har_file, sitemap_url, num_pages=3):
+        return [HarFileParser().parse(fix_har_file, 'https://apsl.net/{}/'.format(page), sitemap_url)
+                for page in range(num_pages)]
+
+    def test_runs_are_recorded(self, tmpdir, fix_har_file, sitemap_url):
+        path = str(tmpdir.join('history.sqlite3'))
+        record_run(path, self._pages(fix_har_file, sitemap_url), label='v1')
+        record_run(path, self._pages(fix_har_file, sitemap_url, num_pages=2), label='v2')
+        history = HistoryStore(path)
+        runs = history.runs('apsl.net')
+        assert [(run.run_id, run.label, run.num_pages) for run in runs] == [(1, 'v1', 3), (2, 'v2', 2)]
+        assert history.last_run() == 2
+        assert history.previous_run(2) == 1
+        assert history.previous_run(1) is None
+        history.close()
+
+    def test_interrupted_runs_can_be_compared(self, tmpdir, fix_har_file, sitemap_url):
+        path = str(tmpdir.join('history.sqlite3'))
+        pages = self._pages(fix_har_file, sitemap_url)
+        interrupted = HistoryStore(path, batch_size=2)
+        interrupted.start_run('killed')
+        for har_file_data in [pages[0], pages[0], pages[1], pages[2]]:  # the first page is retried
+            interrupted.add(har_file_data)
+        run = record_run(path, pages)
+        history = HistoryStore(path)
+        assert [recorded.num_pages for recorded in history.runs()] == [3, 3]
+        assert history.previous_run(run) == 1
+        history.close()
+        interrupted.connection.close()
+
+    def test_diff_reports_the_pages_that_grew(self, tmpdir, fix_har_file, sitemap_url):
+        path = str(tmpdir.join('history.sqlite3'))
+        baseline_pages = self._pages(fix_har_file, sitemap_url)
+        baseline_run = record_run(path, baseline_pages)
+        pages = self._pages(fix_har_file, sitemap_url)
+        pages[1].total_page_size = baseline_pages[1].total_page_size * 1.5
+        pages[2].total_page_size = baseline_pages[2].total_page_size * 1.05
+        run = record_run(path, pages[1:])
+
+        history = HistoryStore(path)
+        assert history.diff(baseline_run, run, threshold=0.1) == [
+            PageRegression('https://apsl.net/1/', 'total_size (MB)', baseline_pages[1].total_page_size,
+                           pages[1].total_page_size)]
+        assert len(history.diff(baseline_run, run, threshold=0.01)) == 2
+        assert history.count_changed_pages(baseline_run, run) == (0, 1)
+        history.close()
+
+    def test_diff_command(self, tmpdir, fix_har_file, sitemap_url):
+        path = str(tmpdir.join('history.sqlite3'))
+        record_run(path, self._pages(fix_har_file, sitemap_url))
+        pages = self._pages(fix_har_file, sitemap_url)
+        pages[0].total_page_size *= 2
+        record_run(path, pages)
+        result = CliRunner().invoke(cli, ['diff', '--history', path])
+        assert result.exit_code == 0, result.output
+        assert 'https://apsl.net/0/' in result.output
+        assert 'https://apsl.net/1/' not in result.output
@@ -0,0 +1,53 @@
+from urllib.request import urlopen
+
+from page_size_check.metrics import Histogram, Metrics, MetricsServer, MetricsSink
+from page_size_check.parser import HarFileParser
+from page_size_check.sink import PageFailure
+from page_size_check.tracing import Tracer
+
+
+class TestMetrics:
+
+    def test_histogram_is_cumulative(self):
+        histogram = Histogram(buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.7, 3):
+            histogram.observe(value)
+        assert histogram.lines('seconds', 'phase="parse"') == [
+            'seconds_bucket{phase="parse",le="0.1"} 1',
+            'seconds_bucket{phase="parse",le="1"} 3',
+            'seconds_bucket{phase="parse",le="+Inf"} 4',
+            'seconds_sum{phase="parse"} 4.25',
+            'seconds_count{phase="parse"} 4',
+        ]
+
+    def test_metrics_are_updated_by_the_sink_and_the_tracer(self, page_url, sitemap_url, fix_har_file):
+        metrics = Metrics()
+        sink, tracer = MetricsSink(metrics), Tracer()
+        tracer.add_observer(metrics.observe_phase)
+        urls = metrics.track_urls([{'page_url': page_url}] * 5)
+        for _ in range(4):
+            next(urls)
+            with tracer.span('driver_get', page_url):
+                pass
+        sink.add(HarFileParser().parse(fix_har_file, page_url, sitemap_url))
+        sink.add_failure(PageFailure(page_url, 'apsl.net', 3, 'Timeout loading the page', 10.0))
+        metrics.set_gauge('page_size_check_active_workers', 'Browsers loading a page.', lambda: 1)
+        lines = metrics.render().splitlines()
+        assert 'page_size_check_pages_completed_total 1' in lines
+        assert 'page_size_check_pages_failed_total 1' in lines
+        assert 'page_size_check_pages_per_minute 1' in lines
+        assert 'page_size_check_active_workers 1' in lines
+        assert 'page_size_check_queue_depth 1' in lines
+        assert 'page_size_check_phase_seconds_count{phase="driver_get"} 4' in lines
+        assert int(next(line for line in lines if line.startswith('page_size_check_bytes_captured_total ')).split()[1])
+
+    def test_metrics_server(self):
+        metrics = Metrics()
+        server = MetricsServer(metrics, 0)
+        server.start()
+        try:
+            with urlopen('http://127.0.0.1:{}/metrics'.format(server.port), timeout=10) as response:
+                assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+                assert b'page_size_check_pages_completed_total 0' in response.read()
+        finally:
+            server.stop()
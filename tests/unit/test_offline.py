@@ -0,0 +1,57 @@
+import copy
+import csv
+import json
+
+from click.testing import CliRunner
+
+from page_size_check.offline import find_har_files, get_har_page_url, parse_har_files
+from page_size_check.pagesize_check import cli
+from page_size_check.parser import HarFileParser
+
+
+class TestOffline:
+
+    def test_find_har_files(self, tmpdir):
+        tmpdir.ensure('a.har')
+        tmpdir.ensure('nested', 'b.har')
+        tmpdir.ensure('c.json')
+        found = find_har_files([str(tmpdir)])
+        assert [path.rsplit('/', 1)[-1] for path in found] == ['a.har', 'b.har']
+
+    def test_get_har_page_url(self, fix_har_file, page_url, sitemap_url):
+        har_file_data = HarFileParser().parse(fix_har_file, page_url, sitemap_url)
+        assert get_har_page_url(fix_har_file['log']['pages'], har_file_data) == 'https://www.apsl.net/'
+
+    def test_parse_har_files(self, tmpdir, fix_har_file, sitemap_url, fix_numentries):
+        har_paths = []
+        for name in ('a.har', 'b.har', 'broken.har'):
+            har_path = tmpdir.join(name)
+            har_path.write(json.dumps(fix_har_file) if name != 'broken.har' else '{')
+            har_paths.append(str(har_path))
+        results = list(parse_har_files(har_paths, sitemap_url, processes=2))
+        assert len(results) == 2
+        assert all(result.num_entries == fix_numentries for result in results)
+        assert results[0].sitemap_domain == 'apsl.net'
+
+    def test_parse_har_files_skips_har_without_page(self, tmpdir, fix_har_file, sitemap_url):
+        har_file = copy.deepcopy(fix_har_file)
+        har_file['log']['pages'] = [{}]
+        har_path = tmpdir.join('no-page.har')
+        har_path.write(json.dumps(har_file))
+        assert list(parse_har_files([str(har_path)], sitemap_url, processes=1)) == []
+
+    def test_parse_har_without_html(self, tmpdir, fix_har_file):
+        images_only = copy.deepcopy(fix_har_file)
+        images_only['log']['entries'] = [entry for entry in images_only['log']['entries']
+                                         if not entry['response']['content']['mimeType'].startswith('text/html')]
+        images_only['log']['pages'][0]['title'] = 'https://apsl.net/images/'
+        tmpdir.join('page.har').write(json.dumps(fix_har_file))
+        tmpdir.join('images.har').write(json.dumps(images_only))
+        with tmpdir.as_cwd():
+            result = CliRunner().invoke(cli, ['parse_har', '.', '--sitemap_url', 'https://apsl.net/',
+                                              '--processes', '1', '--display_summary', 'false'])
+            with open('apsl.net-resume-urls.csv') as csv_file:
+                rows = list(csv.DictReader(csv_file))
+        assert result.exit_code == 0, result.output
+        assert len(rows) == 2
+        assert [row['page_size (KB)'] for row in rows if row['page_url'] == 'https://apsl.net/images/'] == ['0.0']
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from page_size_check.procinfo import cpu_times, memory_available, process_rss, process_tree, tree_rss
+
+pytestmark = pytest.mark.skipif(not os.path.isdir('/proc/self'), reason='/proc is only available on Linux')
+
+
+class TestProcinfo:
+
+    def test_process_rss(self):
+        assert process_rss(os.getpid()) > 0
+        assert process_rss(2 ** 22 + 1) == 0
+
+    def test_tree_rss_includes_the_children(self):
+        child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+        try:
+            assert child.pid in process_tree(os.getpid())
+            assert tree_rss(os.getpid()) >= process_rss(os.getpid()) + process_rss(child.pid)
+        finally:
+            child.kill()
+            child.wait()
+
+    def test_host_cpu_and_memory(self):
+        busy, total = cpu_times()
+        assert 0 <= busy <= total
+        assert 0 < memory_available() <= 1
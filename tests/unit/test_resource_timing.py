@@ -0,0 +1,76 @@
+from page_size_check.browser import BrowserWorker
+from page_size_check.parser import HarFileParser, epoch_ms_to_iso, iso_to_epoch_ms
+from page_size_check.resource_timing import RESOURCE_TIMING_BUFFER_SIZE, guess_mime_type, resource_timing_har
+
+
+def _timing_entry(name, initiator_type, start_time, duration, transfer_size, encoded_body_size, status=0):
+    return {'name': name, 'initiatorType': initiator_type, 'startTime': start_time, 'duration': duration,
+            'transferSize': transfer_size, 'encodedBodySize': encoded_body_size,
+            'decodedBodySize': encoded_body_size * 3, 'responseStatus': status}
+
+
+def fix_timing(page_url):
+    return {
+        'timeOrigin': 1539875776219.5,
+        'navigation': _timing_entry(page_url, 'navigation', 0, 350.7, 10540, 10240, 200),
+        'resources': [
+            _timing_entry(page_url + 'static/app.css', 'link', 360.2, 80.1, 5420, 5120),
+            _timing_entry(page_url + 'static/app.js?v=3', 'script', 361.0, 120.9, 20780, 20480),
+            _timing_entry(page_url + 'api/menu', 'fetch', 500.4, 30.0, 0, 0),
+            _timing_entry('https://cdn.example.com/logo', 'img', 400.0, 60.0, 0, 0),
+        ],
+        'onContentLoad': 420,
+        'onLoad': 610,
+    }
+
+
+class TestResourceTiming:
+
+    def test_epoch_ms_to_iso(self):
+        assert epoch_ms_to_iso(1539875776219.5) == '2018-10-18T15:16:16.219+00:00'
+        assert iso_to_epoch_ms(epoch_ms_to_iso(1539875776219)) == 1539875776219
+
+    def test_guess_mime_type(self):
+        assert guess_mime_type('https://apsl.net/static/app.css?v=1', 'link') == 'text/css'
+        assert guess_mime_type('https://apsl.net/api/menu', 'fetch') == 'application/json'
+        assert guess_mime_type('https://apsl.net/track', 'other') == 'application/octet-stream'
+
+    def test_resource_timing_har_is_parsed(self, sitemap_url):
+        page_url = 'https://apsl.net/'
+        har_file = resource_timing_har(fix_timing(page_url))
+        assert har_file['log']['pages'][0]['title'] == page_url
+        assert har_file['log']['entries'][0]['startedDateTime'] == '2018-10-18T15:16:16.219+00:00'
+
+        har_file_data = HarFileParser().parse(har_file, page_url, sitemap_url)
+        assert har_file_data.num_entries == 5
+        assert round(har_file_data.total_page_size, 3) == round((10540 + 5420 + 20780) / 1024 / 1024, 3)
+        assert har_file_data.mime_resume('text/html')[0] == 1
+        assert har_file_data.mime_resume('image/*')[0] == 1
+        assert har_file_data.load_time == 501
+
+    def test_full_buffer_is_logged(self, caplog):
+        page_url = 'https://apsl.net/'
+        timing = fix_timing(page_url)
+        resource_timing_har(timing)
+        assert 'buffer' not in caplog.text
+        timing['resources'] = [_timing_entry('{}static/{}.png'.format(page_url, index), 'img', 400.0, 60.0, 100, 100)
+                               for index in range(RESOURCE_TIMING_BUFFER_SIZE)]
+        har_file = resource_timing_har(timing)
+        assert len(har_file['log']['entries']) == RESOURCE_TIMING_BUFFER_SIZE + 1
+        assert 'resource timing buffer of "https://apsl.net/" is full' in caplog.text
+
+    def test_timings_and_resources_are_read_in_one_call(self):
+        page_url = 'https://apsl.net/'
+
+        class TimingDriver:
+            calls = 0
+
+            def execute_async_script(self, script):
+                TimingDriver.calls += 1
+                return {'ttfb': 180, 'dom_content_loaded': 420, 'resource_timing': fix_timing(page_url)}
+
+        worker = BrowserWorker.__new__(BrowserWorker)
+        worker.proxy, worker.driver, worker.resource_timing = None, TimingDriver(), None
+        assert worker.page_timings() == {'ttfb': 180, 'dom_content_loaded': 420}
+        assert worker.har()['log']['pages'][0]['title'] == page_url
+        assert TimingDriver.calls == 1
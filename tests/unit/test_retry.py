@@ -0,0 +1,101 @@
+import csv
+import time
+
+from selenium.common.exceptions import TimeoutException
+
+from page_size_check.crawler import execute_parser
+from page_size_check.retry import RetryPolicy, describe_error
+from page_size_check.sink import CsvResultSink, PageFailure
+from tests.fakes import FakeBrowserPool, FakeWorker, ListSink, LockedCache
+
+
+class TestRetryPolicy:
+
+    def test_delay_doubles_until_the_retries_run_out(self):
+        policy = RetryPolicy(retries=3, backoff=1, jitter=0)
+        assert [policy.delay(attempt, 0, OSError()) for attempt in range(1, 5)] == [1, 2, 4, None]
+
+    def test_no_retry_past_the_deadline(self):
+        policy = RetryPolicy(retries=3, backoff=10, deadline=30, jitter=0)
+        assert policy.delay(1, 15, OSError()) == 10
+        assert policy.delay(2, 15, OSError()) is None
+
+    def test_parser_errors_are_not_retried(self):
+        assert RetryPolicy(retries=3).delay(1, 0, KeyError('log')) is None
+
+    def test_describe_error(self):
+        assert describe_error(TimeoutException('Timed out')) == 'Timeout loading the page'
+        assert describe_error(OSError('Connection refused\nmore')) == 'OSError: Connection refused'
+
+
+class TestExecuteParser:
+
+    def _url_info(self, page_url, sitemap_url, retries):
+        return {'page_url': page_url, 'sitemap_url': sitemap_url, 'pool': FakeBrowserPool(None, None, size=1),
+                'retry_policy': RetryPolicy(retries=retries, backoff=0.01)}
+
+    def test_page_is_retried_with_a_new_worker(self, monkeypatch, page_url, sitemap_url, fix_har_file):
+        monkeypatch.setattr(FakeWorker, 'failures', ['timeout'])
+        monkeypatch.setattr(FakeWorker, 'har_file', fix_har_file)
+        url_info, sink = self._url_info(page_url, sitemap_url, retries=1), ListSink()
+        execute_parser(sink, url_info)
+        assert [page.page_url for page in sink.pages] == [page_url]
+        assert sink.failures == []
+
+    def test_failure_is_reported_after_the_last_attempt(self, monkeypatch, page_url, sitemap_url):
+        monkeypatch.setattr(FakeWorker, 'failures', ['timeout'] * 3)
+        url_info, sink = self._url_info(page_url, sitemap_url, retries=2), ListSink()
+        execute_parser(sink, url_info)
+        assert sink.pages == []
+        assert [(failure.page_url, failure.attempts, failure.error) for failure in sink.failures] == [
+            (page_url, 3, 'Timeout loading the page')]
+
+    def test_report_errors_do_not_discard_the_worker(self, monkeypatch, page_url, sitemap_url, fix_har_file):
+        class BrokenSink(ListSink):
+            def add(self, har_file_data):
+                raise ValueError('broken report')
+
+        monkeypatch.setattr(FakeWorker, 'failures', [])
+        monkeypatch.setattr(FakeWorker, 'har_file', fix_har_file)
+        url_info, sink = self._url_info(page_url, sitemap_url, retries=2), BrokenSink()
+        execute_parser(sink, url_info)
+        assert [failure.attempts for failure in sink.failures] == [1]
+        worker = url_info['pool']._idle.get_nowait()  # a discarded worker would leave None
+        assert worker is not None and not worker.closed
+
+    def test_pages_are_stored_once(self, monkeypatch, page_url, sitemap_url, fix_har_file):
+        monkeypatch.setattr(FakeWorker, 'failures', [])
+        monkeypatch.setattr(FakeWorker, 'har_file', fix_har_file)
+        url_info, sink = self._url_info(page_url, sitemap_url, retries=2), ListSink()
+        url_info['cache'] = LockedCache()
+        execute_parser(sink, url_info)
+        assert [page.page_url for page in sink.pages] == [page_url]
+        assert [(failure.attempts, failure.error) for failure in sink.failures] == [
+            (1, 'OperationalError: database is locked')]
+
+
+class TestWatchdog:
+
+    def test_watchdog_kills_stuck_workers(self):
+        pool = FakeBrowserPool(None, None, size=1)
+        pool.start_watchdog(0.05, interval=0.01)
+        try:
+            worker = pool.acquire()
+            time.sleep(0.2)
+            assert worker.killed
+        finally:
+            pool.close()
+
+
+class TestFailuresReport:
+
+    def test_failures_are_written_to_their_report(self, tmpdir, page_url):
+        with tmpdir.as_cwd():
+            sink = CsvResultSink()
+            sink.add_failure(PageFailure(page_url, 'apsl.net', 3, 'Timeout loading the page', 181.5))
+            sink.close()
+            with open('apsl.net-failed-urls.csv') as csv_file:
+                rows = list(csv.DictReader(csv_file))
+        assert rows == [{'page_url': page_url, 'attempts': '3', 'error': 'Timeout loading the page',
+                         'elapsed (s)': '181.5'}]
+        assert sink.num_failures == 1
@@ -0,0 +1,53 @@
+import multiprocessing
+import queue
+import threading
+
+import pytest
+
+from page_size_check import shard
+from page_size_check.parser import HarFileParser
+from page_size_check.sink import PageFailure
+from page_size_check.shard import crawl_sharded, drain_results, feed_tasks, iter_tasks, shard_ports
+from tests.fakes import FakeProcess, ListSink
+
+
+class TestShard:
+
+    def test_shard_ports_do_not_overlap(self):
+        assert shard_ports(8090, 0, 4) == (8090, (8091, 8098))
+        assert shard_ports(8090, 1, 4) == (8099, (8100, 8107))
+
+    def test_tasks_are_fed_until_none(self, page_url, sitemap_url):
+        tasks, stop = queue.Queue(), threading.Event()
+        url_infos = [{'page_url': page_url, 'lastmod': None, 'sitemap_url': sitemap_url, 'pool': object()}]
+        feed_tasks(iter(url_infos), tasks, 2, stop)
+        assert list(iter_tasks(tasks, stop)) == [{'page_url': page_url, 'lastmod': None, 'sitemap_url': sitemap_url}]
+        assert list(iter_tasks(tasks, stop)) == []
+
+    def test_drain_results_stops_when_workers_die(self):
+        results, sink = queue.Queue(), ListSink()
+        results.put('page')
+        drain_results(results, [FakeProcess(False)], sink)
+        assert sink.pages == ['page']
+
+    @pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='the fake crawl is inherited by fork')
+    def test_crawl_sharded_merges_the_results(self, monkeypatch, fix_har_file):
+        def fake_crawl(sink, url_infos, options, proxy_port_range=None):
+            for url_info in url_infos:
+                sink.add(HarFileParser().parse(fix_har_file, url_info['page_url'], url_info['sitemap_url']))
+
+        monkeypatch.setattr(shard, 'crawl', fake_crawl)
+        page_urls = ['https://apsl.net/{}/'.format(page) for page in range(10)]
+        url_infos = ({'page_url': page_url, 'sitemap_url': 'https://apsl.net/sitemap.xml'} for page_url in page_urls)
+        sink = ListSink()
+        crawl_sharded(sink, url_infos, 2, {'browsermob_server_port': 8090, 'threads': 1})
+        assert sorted(page.page_url for page in sink.pages) == page_urls
+
+    def test_drain_results_routes_failures(self):
+        failure = PageFailure('https://apsl.net/', 'apsl.net', 3, 'Timeout loading the page', 10.0)
+        results, sink = queue.Queue(), ListSink()
+        for result in ('page', failure, None):
+            results.put(result)
+        drain_results(results, [FakeProcess(True)], sink)
+        assert sink.pages == ['page']
+        assert sink.failures == [failure]
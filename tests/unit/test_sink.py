@@ -0,0 +1,32 @@
+import csv
+
+from page_size_check.parser import HarFileParser
+from page_size_check.sink import CsvResultSink
+
+
+class TestCsvResultSink:
+
+    def test_sink_writes_in_batches(self, tmpdir, page_url, fix_har_file, sitemap_url, fix_numentries):
+        har_file_data = HarFileParser().parse(fix_har_file, page_url, sitemap_url)
+        with tmpdir.as_cwd():
+            sink = CsvResultSink(batch_size=2)
+            sink.add(har_file_data)
+            assert len(tmpdir.join('apsl.net-resume-urls.csv').readlines()) == 1
+            sink.add(har_file_data)
+            assert len(tmpdir.join('apsl.net-resume-urls.csv').readlines()) == 3
+            sink.add(har_file_data)
+            sink.close()
+            with open('apsl.net-resources-list.csv') as csv_file:
+                rows = list(csv.DictReader(csv_file))
+        assert sink.num_pages == 3
+        assert len(rows) == 3 * fix_numentries
+
+    def test_sink_appends_header_once(self, tmpdir, page_url, fix_har_file, sitemap_url):
+        har_file_data = HarFileParser().parse(fix_har_file, page_url, sitemap_url)
+        with tmpdir.as_cwd():
+            for _ in range(2):
+                sink = CsvResultSink()
+                sink.add(har_file_data)
+                sink.close()
+        lines = tmpdir.join('apsl.net-mimetype-resources.csv').readlines()
+        assert sum(line.startswith('page_url,') for line in lines) == 1
@@ -0,0 +1,71 @@
+import gzip
+import io
+
+import pytest
+import requests
+
+from page_size_check.sitemap import SitemapEntry, iter_sitemap_urls, open_sitemap_stream, parse_sitemap
+
+
+class FakeResponse:
+
+    def __init__(self, content):
+        self.raw = io.BytesIO(content or b'')
+        self.status_code = 200 if content is not None else 404
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError('{} Client Error'.format(self.status_code))
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+
+    def __init__(self, sitemaps):
+        self.sitemaps = sitemaps
+        self.requested = []
+
+    def get(self, url, **kwargs):
+        self.requested.append(url)
+        return FakeResponse(self.sitemaps.get(url))
+
+
+class TestSitemap:
+
+    def test_parse_sitemap(self, fix_sitemap_xml):
+        entries = list(parse_sitemap(open_sitemap_stream(io.BytesIO(fix_sitemap_xml))))
+        assert entries == [('url', SitemapEntry('https://apsl.net/', '2018-10-18')),
+                           ('url', SitemapEntry('https://apsl.net/blog/', None))]
+
+    def test_parse_gzipped_sitemap(self, fix_sitemap_xml):
+        stream = open_sitemap_stream(io.BytesIO(gzip.compress(fix_sitemap_xml)))
+        assert len(list(parse_sitemap(stream))) == 2
+
+    def test_iter_sitemap_index(self, sitemap_url, fix_sitemap_xml, fix_sitemap_index_xml):
+        session = FakeSession({
+            'https://apsl.net/sitemap_index.xml': fix_sitemap_index_xml,
+            'https://apsl.net/sitemap-pages.xml.gz': gzip.compress(fix_sitemap_xml),
+            sitemap_url: fix_sitemap_xml,
+        })
+        urls = [entry.loc for entry in iter_sitemap_urls('https://apsl.net/sitemap_index.xml', session)]
+        assert urls == ['https://apsl.net/', 'https://apsl.net/blog/'] * 2
+        assert len(session.requested) == 3
+
+    def test_broken_child_sitemaps_are_skipped(self, sitemap_url, fix_sitemap_xml, fix_sitemap_index_xml):
+        session = FakeSession({
+            'https://apsl.net/sitemap_index.xml': fix_sitemap_index_xml,
+            'https://apsl.net/sitemap-pages.xml.gz': b'<urlset><url><loc>https://apsl.net/broken',
+            sitemap_url: None,  # 404
+        })
+        urls = [entry.loc for entry in iter_sitemap_urls('https://apsl.net/sitemap_index.xml', session)]
+        assert urls == []
+        assert len(session.requested) == 3
+        session.sitemaps[sitemap_url] = fix_sitemap_xml
+        urls = [entry.loc for entry in iter_sitemap_urls('https://apsl.net/sitemap_index.xml', session)]
+        assert urls == ['https://apsl.net/', 'https://apsl.net/blog/']
+
+    def test_broken_sitemap_is_raised(self, sitemap_url):
+        with pytest.raises(requests.HTTPError):
+            list(iter_sitemap_urls(sitemap_url, FakeSession({})))
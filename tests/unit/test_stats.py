@@ -0,0 +1,37 @@
+import numpy
+
+from page_size_check.parser import HarFileParser
+from page_size_check.stats import GrowableArray, PageStatistics
+
+
+class TestGrowableArray:
+
+    def test_append_grows_the_capacity(self):
+        values = GrowableArray(2, capacity=2)
+        for row in range(5):
+            values.append([[row, row * 10]])
+        values.append(numpy.zeros((3, 2)))
+        assert values.values.shape == (8, 2)
+        assert values.values[4].tolist() == [4, 40]
+
+
+class TestPageStatistics:
+
+    def test_percentiles_of_the_pages_and_mime_types(self, fix_har_file, sitemap_url, fix_numentries):
+        statistics = PageStatistics()
+        for page in range(100):
+            har_file_data = HarFileParser().parse(fix_har_file, 'https://apsl.net/{}/'.format(page), sitemap_url)
+            har_file_data.dom_content_loaded = page + 1
+            statistics.add(har_file_data)
+        rows = {(row[0], row[1]): row[2:] for row in statistics.rows()}
+        assert rows[('*', 'num_entries')] == [100] + [fix_numentries] * 5
+        assert numpy.allclose(rows[('*', 'dom_load_time (ms)')], [100, 50.5, 90.1, 95.05, 99.01, 100])
+        _, css_size, _ = har_file_data.mime_resume('text/css')
+        assert rows[('text/css', 'size (KB)')][-1] == css_size
+        assert [mime_type for mime_type, _ in rows][4::3] == sorted(har_file_data.mime_types)
+
+    def test_dom_content_loaded_not_measured_is_left_out(self, page_url, fix_har_file, sitemap_url):
+        statistics = PageStatistics()
+        statistics.add(HarFileParser().parse(fix_har_file, page_url, sitemap_url))
+        metrics = [row[1] for row in statistics.rows() if row[0] == '*']
+        assert metrics == ['total_size (MB)', 'num_entries', 'total_load_time (ms)']
@@ -0,0 +1,65 @@
+import json
+import time
+
+from page_size_check.shard import shard_trace_path
+from page_size_check.tracing import NULL_SPAN, PhaseDurations, Tracer, percentile
+
+
+class TestTracer:
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert percentile(values, 0.5) == 50
+        assert percentile(values, 0.95) == 95
+        assert percentile([7], 0.95) == 7
+
+    def test_phase_durations_keep_a_bounded_sample(self):
+        durations = PhaseDurations(size=100)
+        for duration in range(10000):
+            durations.add(duration)
+        assert durations.count == 10000
+        assert durations.total == sum(range(10000))
+        assert len(durations.sample) == 100
+        assert 3000 < percentile(sorted(durations.sample), 0.5) < 7000
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer()
+        assert tracer.span('driver_get') is NULL_SPAN
+        with tracer.span('driver_get'):
+            pass
+        assert tracer.summary() == []
+
+    def test_jsonl_trace(self, tmpdir, page_url):
+        trace_path = str(tmpdir.join('trace.jsonl'))
+        tracer = Tracer(trace_path)
+        for _ in range(3):
+            with tracer.span('driver_get', page_url):
+                time.sleep(0.001)
+        try:
+            with tracer.span('parse', page_url):
+                raise ValueError()
+        except ValueError:
+            pass
+        summary = tracer.summary()
+        tracer.close()
+        with open(trace_path) as trace_file:
+            spans = [json.loads(line) for line in trace_file]
+        assert [span['phase'] for span in spans] == ['driver_get'] * 3 + ['parse']
+        assert all(span['page_url'] == page_url for span in spans)
+        assert [(phase, count) for phase, count, _, _, _ in summary] == [('driver_get', 3), ('parse', 1)]
+        assert summary[0][2] >= 0.001
+
+    def test_chrome_trace_is_valid_json(self, tmpdir, page_url):
+        trace_path = str(tmpdir.join('trace.json'))
+        tracer = Tracer(trace_path, 'chrome')
+        with tracer.span('driver_get', page_url):
+            pass
+        tracer.close()
+        with open(trace_path) as trace_file:
+            events = json.load(trace_file)
+        assert events[0]['name'] == 'driver_get'
+        assert events[0]['ph'] == 'X'
+        assert events[0]['args'] == {'page_url': page_url}
+
+    def test_shard_trace_path(self):
+        assert shard_trace_path('/tmp/trace.jsonl', 2) == '/tmp/trace.2.jsonl'